@@ -0,0 +1,91 @@
+import ctypes
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from py_ch347_libarary import (CH347_CMD_JTAG_BIT_OP, CH347_CMD_JTAG_DATA_SHIFT, CH347_TCK, CH347_TDI,
+                               CH347_TMS)
+from svf_parse import BitVector, JTAGHardwareInterface
+
+
+class RecordingInterface(JTAGHardwareInterface):
+    """记录硬件调用的接口替身：calls 为 TMS/TCK/移位的调用顺序，shifts 为每次移位的 (is_dr, 位数, TDI 字节)"""
+
+    def __init__(self):
+        self.calls = []
+        self.shifts = []
+
+    def pulse_tms(self, tms: int, count: int):
+        self.calls.append(("tms", tms, count))
+
+    def pulse_tck(self, tms: int, count: int, min_time: float = 0.0):
+        self.calls.append(("tck", count, min_time))
+
+    def shift_data(self, tdi_data_in, w_length: int, is_dr: bool, is_read: bool):
+        self.calls.append(("shift", is_dr, w_length, is_read))
+        self.shifts.append((is_dr, w_length, bytes(tdi_data_in)))
+        return BitVector.zeros(w_length)
+
+
+class FakeCH347:
+    """记录调用的 ch347 替身；回读时返回按位取反的TDI"""
+
+    def __init__(self):
+        self.calls = []
+
+    def open_device(self):
+        return 1
+
+    def jtag_init(self, clock: int) -> bool:
+        self.calls.append(("init", clock))
+        return True
+
+    def jtag_tms_shift(self, tmsvalue, step, skip):
+        self.calls.append(("tms", tmsvalue, step))
+        return True
+
+    def _scan(self, buf, data_bits, is_read):
+        data = bytes(buf)[:(data_bits + 7) // 8]
+        if is_read:
+            ctypes.memmove(buf, bytes(b ^ 0xFF for b in data), len(data))
+        return data
+
+    def jtag_ioscan(self, data_buffer, data_bits, is_read):
+        data = self._scan(data_buffer._obj, data_bits, is_read)
+        self.calls.append(("ioscan", data_bits, is_read, data))
+        return True
+
+    def jtag_ioscan_t(self, data_buffer, data_bits, is_read, is_last_packge):
+        data = self._scan(data_buffer._obj, data_bits, is_read)
+        self.calls.append(("ioscan_t", data_bits, is_read, is_last_packge, data))
+        return True
+
+    def write_data(self, buffer, length):
+        self.calls.append(("write", bytes(buffer)))
+        return True
+
+
+def decode_clocks(stream):
+    """把命令包还原为每个 TCK 上升沿的 (TMS, TDI)"""
+    clocks = []
+    pos = 0
+    while pos < len(stream):
+        cmd = stream[pos]
+        length = stream[pos + 1] | (stream[pos + 2] << 8)
+        payload = stream[pos + 3:pos + 3 + length]
+        assert len(payload) == length
+        if cmd == CH347_CMD_JTAG_BIT_OP:
+            tck = 0
+            for pin in payload:
+                if pin & CH347_TCK and not tck:
+                    clocks.append((int(bool(pin & CH347_TMS)), int(bool(pin & CH347_TDI))))
+                tck = pin & CH347_TCK
+            assert not tck
+        elif cmd == CH347_CMD_JTAG_DATA_SHIFT:
+            for value in payload:
+                clocks.extend((0, (value >> i) & 1) for i in range(8))
+        else:
+            raise AssertionError(f"unexpected command 0x{cmd:02x}")
+        pos += 3 + length
+    return clocks
@@ -0,0 +1,167 @@
+import pytest
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from svf_parse import *
+from conftest import FakeCH347, decode_clocks
+
+
+def test_chunked_shift_round_trip():
+    device = FakeCH347()
+    hw_iface = Ch347_JTAGInterface(verbose=False, device=device)
+    hw_iface.set_chunk_size(1000)
+    length = 5140160 // 100 + 3
+    tdi = BitVector(bytes((i * 7) & 0xFF for i in range((length + 7) // 8)), length)
+
+    tdo = hw_iface.shift_data(tdi, length, True, True)
+
+    scans = [call for call in device.calls if call[0] == "ioscan_t"]
+    assert len(scans) == (length + 7) // 8 // 1000 + 1
+    assert [call[1] for call in scans[:-1]] == [8000] * (len(scans) - 1)
+    assert sum(call[1] for call in scans) == length
+    assert [call[3] for call in scans] == [False] * (len(scans) - 1) + [True]
+    assert b''.join(call[4] for call in scans) == bytes(tdi)
+    assert bytes(tdo) == bytes(b ^ 0xFF for b in bytes(tdi))
+
+
+def test_small_shift_not_chunked():
+    device = FakeCH347()
+    hw_iface = Ch347_JTAGInterface(verbose=False, device=device)
+    tdo = hw_iface.shift_data(BitVector.from_hex("0362d093", 32), 32, True, True)
+    assert device.calls[-1][0] == "ioscan"
+    assert tdo == BitVector.from_hex("fc9d2f6c", 32)
+
+
+def test_scan_buffers_reused_and_tdo_owned():
+    device = FakeCH347()
+    hw_iface = Ch347_JTAGInterface(verbose=False, device=device)
+    hw_iface.set_chunk_size(1000)
+    first = hw_iface.shift_data(BitVector.from_hex("0362d093", 32), 32, True, True)
+    second = hw_iface.shift_data(BitVector.from_hex("ffffffff", 32), 32, True, True)
+    large = BitVector.ones(5000 * 8)
+    for _ in range(3):
+        tdo = hw_iface.shift_data(large, large.length, True, True)
+    # 一个小扫描缓冲区 + 两个分块缓冲区，之后全部复用
+    assert hw_iface.buffers.allocations == 3
+    assert first == BitVector.from_hex("fc9d2f6c", 32)
+    assert second == BitVector.zeros(32)
+    assert tdo == BitVector.zeros(large.length)
+
+
+class IdcodeCH347(FakeCH347):
+    """读取 32 位时返回 IDCODE；时钟档位高于 max_clock 时读回数据出错"""
+
+    def __init__(self, idcode: int, max_clock: int):
+        super().__init__()
+        self.idcode = idcode
+        self.max_clock = max_clock
+        self.clock = None
+
+    def jtag_init(self, clock: int) -> bool:
+        self.clock = clock
+        return super().jtag_init(clock)
+
+    def jtag_ioscan(self, data_buffer, data_bits, is_read):
+        value = self.idcode if self.clock <= self.max_clock else self.idcode ^ 0x100
+        ctypes.memmove(data_buffer._obj, value.to_bytes(4, 'little'), 4)
+        self.calls.append(("ioscan", data_bits, is_read))
+        return True
+
+
+def test_set_frequency_selects_clock_index():
+    device = FakeCH347()
+    hw_iface = Ch347_JTAGInterface(verbose=False, device=device)
+    hw_iface.set_frequency(10e6)
+    assert (hw_iface.clock_index, hw_iface.frequency) == (2, 7.5e6)
+    # 低于最慢档位时使用档位 0 并给出警告
+    with pytest.warns(RuntimeWarning):
+        hw_iface.set_frequency(1e6)
+    assert hw_iface.clock_index == 0
+    # 档位不变时不重新初始化
+    with pytest.warns(RuntimeWarning):
+        hw_iface.set_frequency(1.5e6)
+    assert [call for call in device.calls if call[0] == "init"] == [("init", 1), ("init", 2), ("init", 0)]
+
+
+def test_first_frequency_statement_reinitialises_adapter(tmp_path):
+    svf = tmp_path / "freq.svf"
+    svf.write_text("FREQUENCY 1.00E+06 HZ;\nSTATE RESET;\n")
+    device = FakeCH347()
+    hw_iface = Ch347_JTAGInterface(verbose=False, device=device)
+    controller = JTAGController(verbose=False)
+    controller.set_hardware_interface(hw_iface)
+    with pytest.warns(RuntimeWarning):
+        assert SVFPlayer(controller).play_svf(str(svf))
+    # 构造时为档位 1（3.75 MHz），1 MHz 对应最慢的档位 0
+    assert [call for call in device.calls if call[0] == "init"] == [("init", 1), ("init", 0)]
+    assert hw_iface.frequency == JTAG_CLOCK_RATES[0]
+
+
+def test_auto_max_probes_and_caches(tmp_path):
+    cache_file = str(tmp_path / "clock_cache.json")
+    device = IdcodeCH347(0x0362d093, max_clock=3)
+    hw_iface = Ch347_JTAGInterface(verbose=False, device=device)
+    assert hw_iface.enable_auto_max(cache_file) == 3
+    hw_iface.set_frequency(1e6)
+    assert hw_iface.frequency == JTAG_CLOCK_RATES[3]
+
+    device = IdcodeCH347(0x0362d093, max_clock=3)
+    hw_iface = Ch347_JTAGInterface(verbose=False, device=device)
+    assert hw_iface.enable_auto_max(cache_file) == 3
+    # 命中缓存时只在最低档读取一次 IDCODE
+    assert [call[0] for call in device.calls].count("ioscan") == 1
+
+
+class SessionCH347(FakeCH347):
+    """已由 open_session 打开并初始化的设备"""
+    is_open = True
+    clock_index = 1
+
+    def close_device(self):
+        self.calls.append(("close",))
+        return True
+
+
+def test_interface_reuses_open_session():
+    device = SessionCH347()
+    for _ in range(2):
+        hw_iface = Ch347_JTAGInterface(verbose=False, device=device)
+        hw_iface.close()
+    # 不重复 jtag_init，也不关闭调用方持有的句柄
+    assert device.calls == []
+
+    # 交由接口管理的会话在 close() 时关闭
+    hw_iface = Ch347_JTAGInterface(verbose=False, device=device, owns_device=True)
+    hw_iface.close()
+    assert device.calls == [("close",)]
+
+
+def test_pulse_tck_emits_exact_clocks():
+    device = FakeCH347()
+    hw_iface = Ch347_JTAGInterface(verbose=False, device=device)
+    for count in (5, 8, 19):
+        device.calls.clear()
+        hw_iface.pulse_tck(0, count)
+        stream = b''.join(call[1] for call in device.calls if call[0] == "write")
+        assert decode_clocks(stream) == [(0, 0)] * count
+        assert [call[0] for call in device.calls] == ["write"]
+
+
+def test_runtest_time_runs_as_clocks(monkeypatch):
+    monkeypatch.setattr(time, "sleep", lambda seconds: pytest.fail("RUNTEST slept on the host"))
+    device = FakeCH347()
+    hw_iface = Ch347_JTAGInterface(verbose=False, device=device)
+    hw_iface.enable_batching()
+    controller = JTAGController(verbose=False)
+    controller.set_hardware_interface(hw_iface)
+    controller.current_state = TapState.IDLE
+    device.calls.clear()
+
+    # 1ms 按实际时钟档位（3.75MHz）折算为周期数，而不是 SVF 的 FREQUENCY
+    controller.run_test(0, 1e-3, TapState.IDLE)
+    assert device.calls == []
+    controller.flush()
+    stream = b''.join(call[1] for call in device.calls)
+    assert len(decode_clocks(stream)) == 3750
@@ -0,0 +1,50 @@
+import pytest
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from py_ch347_libarary import *
+from conftest import decode_clocks
+
+
+class FakeWriter:
+    def __init__(self):
+        self.writes = []
+
+    def __call__(self, data, length):
+        assert len(data) == length
+        self.writes.append(bytes(data))
+        return True
+
+
+def test_batch_encodes_tms_shift_and_clocks():
+    writer = FakeWriter()
+    batch = CH347CommandBatch(writer, bulk_size=4096)
+    batch.tms(0b00110, 5)
+    data = bytes([0xA5, 0x1C])
+    batch.shift(data, 13)
+    batch.clock(21)
+    assert writer.writes == []
+    batch.flush()
+    assert len(writer.writes) == 1
+
+    expected = [(0, 0), (1, 0), (1, 0), (0, 0), (0, 0)]
+    expected += [(1 if i == 12 else 0, (int.from_bytes(data, 'little') >> i) & 1) for i in range(13)]
+    expected += [(0, 0)] * 21
+    assert decode_clocks(writer.writes[0]) == expected
+    assert batch.ops == 3
+
+
+def test_batch_splits_on_packet_boundaries():
+    writer = FakeWriter()
+    batch = CH347CommandBatch(writer, bulk_size=1024)
+    data = bytes(range(256)) * 40
+    batch.shift(data, len(data) * 8, exit_on_last=False)
+    batch.flush()
+    assert all(len(chunk) <= 1024 for chunk in writer.writes)
+    clocks = []
+    for chunk in writer.writes:
+        # 每次写出都由完整的命令包组成
+        clocks += decode_clocks(chunk)
+    assert [tdi for _, tdi in clocks] == [(int.from_bytes(data, 'little') >> i) & 1 for i in range(len(data) * 8)]
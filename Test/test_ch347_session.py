@@ -0,0 +1,119 @@
+import pytest
+import sys
+import os
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from py_ch347_libarary import *
+
+
+class FakeCH347DLL:
+    """CH347DLL 替身：按序号模拟已连接的适配器"""
+
+    def __init__(self, serials):
+        self.serials = serials
+        self.opened = set()
+        self.closed = []
+
+    def CH347OpenDevice(self, index):
+        if index >= len(self.serials):
+            return ch347.INVALID_HANDLE_VALUE
+        self.opened.add(index)
+        return index + 1
+
+    def CH347CloseDevice(self, index):
+        self.opened.discard(index)
+        self.closed.append(index)
+        return True
+
+    def CH347GetDeviceInfor(self, index, info_ref):
+        info = info_ref._obj
+        info.DeviceID = self.serials[index].encode()
+        info.BulkOutEndpMaxSize = 512
+        info.UsbSpeedType = 1
+        info.FirewareVer = 0x41
+        return True
+
+    def CH347Jtag_INIT(self, index, clock):
+        return True
+
+
+def fake_ch347(dll, device_index=0):
+    device = ch347.__new__(ch347)
+    device.ch347dll = dll
+    device.device_index = device_index
+    device.handle = None
+    device.clock_index = None
+    return device
+
+
+@pytest.fixture(autouse=True)
+def device_cache():
+    """枚举结果缓存在类属性中，每个测试前后清空"""
+    ch347._device_cache = None
+    yield
+    ch347._device_cache = None
+
+
+def test_enumerate_devices_cached_and_quiet(capsys):
+    dll = FakeCH347DLL(["SN-A", "SN-B"])
+    records = fake_ch347(dll).enumerate_devices()
+    assert [(r.index, r.device_id, r.bulk_out_max, r.firmware_version) for r in records] == \
+        [(0, "SN-A", 512, 0x41), (1, "SN-B", 512, 0x41)]
+    assert capsys.readouterr().out == ""
+    # 缓存命中时不再打开设备
+    dll.serials.append("SN-C")
+    assert len(fake_ch347(dll).enumerate_devices()) == 2
+    assert fake_ch347(dll).find_device("SN-C", refresh=True).index == 2
+
+
+def test_session_keeps_handle_open():
+    dll = FakeCH347DLL(["SN-A"])
+    with fake_ch347(dll) as device:
+        assert device.is_open and device.jtag_init(1)
+        # 会话中枚举不会关闭正在使用的设备
+        device.enumerate_devices(refresh=True)
+        assert 0 in dll.opened and device.clock_index == 1
+    assert not device.is_open and dll.closed[-1] == 0
+
+
+class RacyCH347DLL(FakeCH347DLL):
+    """查询信息时让出 CPU，放大枚举与打开之间的竞争窗口"""
+
+    def __init__(self, serials):
+        super().__init__(serials)
+        self.sessions = set()
+        self.broken = []
+
+    def CH347GetDeviceInfor(self, index, info_ref):
+        time.sleep(0.0005)
+        return super().CH347GetDeviceInfor(index, info_ref)
+
+    def CH347CloseDevice(self, index):
+        if index in self.sessions:
+            self.broken.append(index)
+        return super().CH347CloseDevice(index)
+
+
+def test_gang_threads_share_registry_safely():
+    dll = RacyCH347DLL(["SN-%d" % i for i in range(4)])
+
+    def worker(index):
+        device = fake_ch347(dll, index)
+        for _ in range(50):
+            device.enumerate_devices(refresh=True)
+            device.open_device()
+            dll.sessions.add(index)
+            device.enumerate_devices(refresh=True)
+            dll.sessions.discard(index)
+            device.close_device()
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # 其他线程的枚举不会关闭会话中的适配器
+    assert dll.broken == [] and ch347._open_indices == set()
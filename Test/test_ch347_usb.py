@@ -0,0 +1,71 @@
+import pytest
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from svf_parse import *
+from conftest import decode_clocks
+
+
+def open_fake(record: bool = False):
+    endpoints = FakeUSBEndpoints(record=record)
+    device = ch347_usb(endpoints=endpoints)
+    assert device.open_device()
+    return device, endpoints
+
+
+def test_jtag_init_reads_status():
+    device, endpoints = open_fake()
+    assert device.jtag_init(3)
+    assert device.clock_index == endpoints.clock_index == 3
+
+
+def test_write_scan_exits_on_last_bit():
+    device, endpoints = open_fake(record=True)
+    data = bytearray(b'\xa5\x3c\x0f')
+    assert device.jtag_ioscan_t(data, 21, False, False)
+    assert device.jtag_ioscan(data, 21, False)
+    clocks = decode_clocks(bytes(endpoints.out_data))
+    tdi = [(0xf3ca5 >> i) & 1 for i in range(21)]
+    assert clocks[:21] == [(0, bit) for bit in tdi]
+    assert clocks[21:] == [(0, bit) for bit in tdi[:-1]] + [(1, tdi[-1])]
+    assert endpoints.writes == 2
+
+
+def test_read_scan_in_rounds_returns_tdo_in_place():
+    device, endpoints = open_fake()
+    device.read_chunk = 1000
+    length = 3 * 8000 + 13
+    data = bytes((i * 13) & 0xFF for i in range((length + 7) // 8))
+    buf = (ctypes.c_ubyte * len(data)).from_buffer_copy(data)
+    assert device.jtag_ioscan(ctypes.byref(buf), length, True)
+    # 回环：TDO 等于 TDI，多余的高位清零
+    assert bytes(buf) == data[:-1] + bytes((data[-1] & 0x1F,))
+    assert endpoints.clocks == length
+    assert endpoints.writes == 4
+
+
+def test_interface_plays_through_usb_transport():
+    endpoints = FakeUSBEndpoints()
+    device = ch347_usb(endpoints=endpoints)
+    hw_iface = Ch347_JTAGInterface(verbose=False, device=device)
+    assert endpoints.clock_index == 1
+    tdi = BitVector.from_hex("0362d093", 32)
+    assert hw_iface.shift_data(tdi, 32, True, True) == tdi
+    hw_iface.pulse_tck(0, 100)
+    assert endpoints.clocks == 132
+    hw_iface.close()
+    assert not device.is_open
+
+
+def test_package_exports_only_public_api():
+    import importlib
+    import py_ch347_libarary
+    ch347_protocol = importlib.import_module("py_ch347_libarary.ch347_protocol")
+    # 包属性 ch347_usb 是同名的类，模块从 sys.modules 取得
+    usb_module = importlib.import_module("py_ch347_libarary.ch347_usb")
+    assert not hasattr(py_ch347_libarary, "usb")
+    assert "time" not in ch347_protocol.__all__
+    for name in ch347_protocol.__all__ + usb_module.__all__:
+        assert hasattr(py_ch347_libarary, name)
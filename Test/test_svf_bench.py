@@ -0,0 +1,36 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from svf_bench import bench_goto_state, format_size, generate_svf, parse_size, run_suite
+from svf_parse import SVFCommandType, SVFParser
+
+
+def test_parse_size():
+    assert parse_size("16M") == 16 << 20
+    assert parse_size("1g") == 1 << 30
+    assert format_size(parse_size("64K")) == "64K"
+
+
+def test_generated_svf_parses(tmp_path):
+    filename = generate_svf(str(tmp_path / "gen.svf"), 100000)
+    assert os.path.getsize(filename) >= 100000
+    sdrs = [c for c in SVFParser().iter_file(filename) if c.cmd_type == SVFCommandType.SDR]
+    assert sdrs[0].params['length'] == 32
+    assert sum(c.params['length'] for c in sdrs[1:]) >= 4 * 99000
+
+
+def test_run_suite_reports_all_stages(tmp_path):
+    report = run_suite([50000], str(tmp_path), repeat=1)
+    results = report["results"]
+    assert set(results) == {"parser", "transcode", "goto_state", "verify_tdo", "usb_transport", "playback", "playback_stream"}
+    assert set(results["parser"]) == {"flow_led_bit", "50000"}
+    assert all(r["passed"] for r in results["playback"].values())
+
+
+def test_goto_state_reported_per_count():
+    result = bench_goto_state([1000, 5000], repeat=1, batch=4)
+    assert result["batch"] == 4
+    assert [r["transitions"] for r in result["runs"].values()] == [1000, 5000]
+    assert all(r["transitions_per_s"] > 0 for r in result["runs"].values())
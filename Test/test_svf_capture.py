@@ -0,0 +1,108 @@
+import random
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from svf_capture import CaptureRecord, TDOCapture, iter_capture, read_index
+from svf_parse import *
+from svf_sim import SimDevice, SimulatedJTAGInterface, Xilinx7Device
+from conftest import FakeCH347
+
+SVF_FILE = os.path.join(os.path.dirname(__file__), "..", "TestFile", "flow_led_bit.svf")
+
+
+def play_with_capture(capture, svf_file=SVF_FILE, devices=None):
+    hw_iface = SimulatedJTAGInterface(devices, call_latency=0.0)
+    controller = JTAGController(verbose=False)
+    controller.set_hardware_interface(hw_iface)
+    controller.set_capture(capture)
+    with capture:
+        assert SVFPlayer(controller).play_svf(str(svf_file))
+    return hw_iface
+
+
+def test_captures_every_dr_readback(tmp_path):
+    filename = str(tmp_path / "tdo.bin")
+    play_with_capture(TDOCapture(filename))
+    records = read_index(filename)
+    assert records == [CaptureRecord(13, 'DR', 32, 0), CaptureRecord(5099, 'DR', 32, 4)]
+    assert os.path.getsize(filename) == 8
+    captured = list(iter_capture(filename))
+    assert captured[0][1] == (0x0362d093).to_bytes(4, 'little')
+    # STATUS 寄存器的 DONE 位（bit 27）已置位
+    assert int.from_bytes(captured[1][1], 'little') >> 27 & 1
+
+
+def test_selected_lines_force_readback(tmp_path):
+    filename = str(tmp_path / "tdo.bin")
+    play_with_capture(TDOCapture(filename, lines=[5097, 5092], include_ir=True))
+    records = read_index(filename)
+    # 5097 行的 SDR 没有 TDO，也被回读
+    assert [(r.line, r.kind, r.bits) for r in records] == [(5092, 'IR', 6), (5097, 'DR', 160)]
+    assert records[1].offset == 1
+    assert os.path.getsize(filename) == 1 + 20
+
+
+def test_header_padding_not_captured(tmp_path):
+    with open(SVF_FILE) as f:
+        text = f.read()
+    svf = tmp_path / "chain.svf"
+    svf.write_text(text.replace("HIR 0 ;", "HIR 4 ;").replace("HDR 0 ;", "HDR 1 ;"))
+    filename = str(tmp_path / "tdo.bin")
+    play_with_capture(TDOCapture(filename), svf, [SimDevice(ir_length=4, idcode=None), Xilinx7Device()])
+    record, data = next(iter_capture(filename))
+    assert (record.line, record.bits) == (13, 32)
+    assert data == (0x0362d093).to_bytes(4, 'little')
+
+
+def test_stream_matches_whole_write(tmp_path):
+    rng = random.Random(3)
+    data = bytes(rng.getrandbits(8) for _ in range(300))
+    whole, streamed = str(tmp_path / "whole.bin"), str(tmp_path / "streamed.bin")
+    cases = [(0, 2400), (8, 100), (3, 2000), (13, 1), (5, 2395)]
+    with TDOCapture(whole) as capture:
+        for skip, bits in cases:
+            capture.write(1, 'DR', BitVector(data, 2400).slice(skip, bits).data, bits)
+    with TDOCapture(streamed) as capture:
+        for skip, bits in cases:
+            with capture.begin(1, 'DR', bits, skip) as stream:
+                for start in range(0, len(data), 7):
+                    stream.write(data[start:start + 7])
+    assert read_index(streamed) == read_index(whole)
+    with open(streamed, 'rb') as a, open(whole, 'rb') as b:
+        assert a.read() == b.read()
+
+
+def test_chunked_capture_streams_each_chunk(tmp_path):
+    device = FakeCH347()
+    hw_iface = Ch347_JTAGInterface(verbose=False, device=device)
+    hw_iface.set_chunk_size(1000)
+    controller = JTAGController(verbose=False)
+    controller.set_hardware_interface(hw_iface)
+    filename = str(tmp_path / "tdo.bin")
+    capture = TDOCapture(filename, lines=[3])
+    controller.set_capture(capture)
+    chunks = []
+    begin = capture.begin
+
+    def recording_begin(*args):
+        stream = begin(*args)
+        write = stream.write
+        stream.write = lambda chunk: chunks.append(len(chunk)) or write(chunk)
+        return stream
+
+    capture.begin = recording_begin
+    length = 5000 * 8 - 5
+    tdi = BitVector(bytes((i * 7) & 0xFF for i in range(5000)), length)
+    with capture:
+        controller.current_line = 3
+        controller.set_padding(SVFCommandType.HDR, 3)
+        assert controller.shift_dr(tdi, length) is not None
+    # 每块回读到达即写出，不拼接整段 TDO
+    assert chunks == [1000] * 5
+    record, data = next(iter_capture(filename))
+    assert (record.line, record.bits) == (3, length)
+    padded = BitVector.join([BitVector.zeros(3), tdi])
+    expected = BitVector(bytes(b ^ 0xFF for b in padded.data), padded.length).slice(3, length)
+    assert data == expected.data[:len(data)]
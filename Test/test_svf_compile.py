@@ -0,0 +1,97 @@
+import pytest
+import sys
+import os
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from svf_parse import *
+from svf_compile import *
+from conftest import RecordingInterface
+
+SVF_FILE = os.path.join(os.path.dirname(__file__), "..", "TestFile", "flow_led_bit.svf")
+
+
+def test_compiled_commands_match_parser(tmp_path):
+    output = str(tmp_path / "flow_led.svfc")
+    parsed = [c for c in SVFParser().iter_file(SVF_FILE) if c.cmd_type != SVFCommandType.COMMENT]
+    assert compile_svf(SVF_FILE, output) == len(parsed)
+
+    compiled = CompiledSVF(output)
+    assert compiled.digest == file_digest(SVF_FILE)
+    loaded = list(compiled)
+    assert len(loaded) == len(parsed)
+    for original, command in zip(parsed, loaded):
+        assert (command.cmd_type, command.line_num, command.raw_line) == \
+            (original.cmd_type, original.line_num, original.raw_line)
+        assert command.params == original.params
+
+
+def test_player_uses_cache(tmp_path):
+    def play(cache_dir):
+        hw_iface = RecordingInterface()
+        controller = JTAGController(verbose=False)
+        controller.set_hardware_interface(hw_iface)
+        player = SVFPlayer(controller)
+        player.set_max_errors(0)
+        player.set_cache_dir(cache_dir)
+        player.play_svf(SVF_FILE)
+        return hw_iface.shifts
+
+    cache_dir = str(tmp_path / "cache")
+    expected = play(None)
+    assert play(cache_dir) == expected
+    cached = SVFCache(cache_dir).path_for(file_digest(SVF_FILE))
+    assert os.path.exists(cached)
+    mtime = os.path.getmtime(cached)
+    # 第二次播放直接使用缓存，不重新编译
+    assert play(cache_dir) == expected
+    assert os.path.getmtime(cached) == mtime
+
+
+def test_streaming_bypasses_cache(tmp_path, monkeypatch):
+    # 与 main() 相同：缓存目录默认开启，--stream 时仍应边解析边执行
+    cache_dir = str(tmp_path / "cache")
+    hw_iface = RecordingInterface()
+    controller = JTAGController(verbose=False)
+    controller.set_hardware_interface(hw_iface)
+    player = SVFPlayer(controller)
+    player.set_max_errors(0)
+    player.set_cache_dir(cache_dir)
+    player.set_streaming(True)
+    streamed = []
+    original = player._stream_commands
+    monkeypatch.setattr(player, "_stream_commands", lambda filename: streamed.append(filename) or original(filename))
+    monkeypatch.setattr(SVFCache, "load", lambda *args: pytest.fail("streaming playback loaded the cache"))
+    player.play_svf(SVF_FILE)
+    assert streamed == [SVF_FILE]
+    assert len(hw_iface.shifts) > 0
+    assert not os.path.exists(cache_dir)
+
+
+def test_cache_prunes_by_size_and_age(tmp_path):
+    cache = SVFCache(str(tmp_path), max_bytes=250, max_age=3600)
+    now = time.time()
+    for name, age in (("old", 7200), ("a", 300), ("b", 200), ("c", 100)):
+        path = tmp_path / (name + SVFC_SUFFIX)
+        path.write_bytes(bytes(100))
+        os.utime(path, (now - age, now - age))
+    (tmp_path / "clock_cache.json").write_text("{}")
+    # old 超过 max_age；其余 300 字节超出上限，删除最久未使用的 a
+    assert cache.prune() == 2
+    assert sorted(os.listdir(tmp_path)) == ["b.svfc", "c.svfc", "clock_cache.json"]
+    assert cache.prune(keep=str(tmp_path / "b.svfc")) == 0
+
+
+def test_compiled_svf_closes_mapping(tmp_path):
+    output = str(tmp_path / "flow_led.svfc")
+    compile_svf(SVF_FILE, output)
+    with CompiledSVF(output) as compiled:
+        command = next(iter(compiled))
+    assert compiled._mm is None
+    compiled.close()
+    # 已解码的命令仍可使用，映射在其释放后解除
+    assert command.cmd_type is not None
+    with CompiledSVF(output) as compiled:
+        sdr = next(c for c in compiled if c.cmd_type == SVFCommandType.SDR)
+    assert sdr.tdi.length == sdr.length
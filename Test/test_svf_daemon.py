@@ -0,0 +1,95 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import svf_daemon
+from conftest import FakeCH347
+from svf_client import request
+from svf_daemon import ProgramCache, SVFDaemon
+from svf_parse import Ch347_JTAGInterface
+from svf_sim import SimulatedJTAGInterface
+
+SVF_FILE = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "TestFile", "flow_led_bit.svf"))
+
+
+class ClosingInterface(SimulatedJTAGInterface):
+    def __init__(self, device_index, closed):
+        super().__init__(call_latency=0.0)
+        self.device_index = device_index
+        self.closed = closed
+
+    def close(self):
+        self.closed.append(self.device_index)
+
+
+def test_daemon_keeps_devices_and_programs(tmp_path):
+    opened = []
+    closed = []
+
+    def open_sim(device_index):
+        opened.append(device_index)
+        return ClosingInterface(device_index, closed)
+
+    socket_path = str(tmp_path / "daemon.sock")
+    daemon = SVFDaemon(socket_path, open_sim, ProgramCache(cache_dir=str(tmp_path / "cache")))
+    thread = daemon.start()
+    try:
+        first = request({"cmd": "program", "svf": SVF_FILE, "device": 0}, socket_path, timeout=30)
+        second = request({"cmd": "program", "svf": SVF_FILE, "device": 0}, socket_path, timeout=30)
+        other = request({"cmd": "program", "svf": SVF_FILE, "device": 1}, socket_path, timeout=30)
+        assert first["passed"] and second["passed"] and other["passed"]
+        assert (first["cache_hit"], second["cache_hit"]) == (False, True)
+        # 适配器只打开一次，后续任务复用
+        assert opened == [0, 1]
+        status = request({"cmd": "status"}, socket_path, timeout=30)
+        assert status["jobs"] == 3 and status["cache"]["programs"] == [SVF_FILE]
+        assert not request({"cmd": "program", "svf": str(tmp_path / "missing.svf")}, socket_path)["ok"]
+    finally:
+        request({"cmd": "shutdown"}, socket_path, timeout=30)
+        thread.join(5)
+    assert not thread.is_alive()
+    # 停止服务时关闭全部适配器
+    assert sorted(closed) == [0, 1]
+
+
+def test_each_job_starts_from_default_clock_and_reset(tmp_path):
+    fast = tmp_path / "fast.svf"
+    fast.write_text("FREQUENCY 3E7 HZ;\nSIR 6 TDI (09);\n")
+    plain = tmp_path / "plain.svf"
+    plain.write_text("SIR 6 TDI (09);\n")
+    device = FakeCH347()
+    hw_iface = Ch347_JTAGInterface(verbose=False, device=device)
+    daemon = SVFDaemon(str(tmp_path / "daemon.sock"), lambda device_index: hw_iface,
+                       ProgramCache(cache_dir=str(tmp_path / "cache")))
+    assert daemon.program(str(fast))["passed"] and hw_iface.clock_index == 4
+    del device.calls[:]
+    # 未指定 FREQUENCY 的任务不沿用上一个客户端的时钟，且先把 TAP 复位
+    assert daemon.program(str(plain))["passed"] and hw_iface.clock_index == 1
+    assert device.calls[0] == ("init", 1)
+    assert device.calls[1][0] == "tms" and device.calls[1][1] & 0x1F == 0x1F
+
+
+def test_batching_is_an_option(monkeypatch):
+    opened = []
+    monkeypatch.setattr(svf_daemon, "open_ch347", lambda device_index, batch=False: opened.append(batch))
+    SVFDaemon("unused.sock").open_interface(0)
+    SVFDaemon("unused.sock", batch=True).open_interface(0)
+    assert opened == [False, True]
+
+
+def test_program_cache_evicts_least_recently_used(tmp_path):
+    files = []
+    for i in range(3):
+        path = tmp_path / f"p{i}.svf"
+        path.write_text(f"SIR 6 TDI ({i:02x});\n")
+        files.append(str(path))
+    cache = ProgramCache(max_bytes=1, cache_dir=str(tmp_path / "cache"))
+    for path in files:
+        cache.get(path)
+    assert cache.status()["programs"] == [files[-1]]
+    # 淘汰与清空时关闭 .svfc 映射
+    remaining = [entry[2] for entry in cache._entries.values()]
+    assert all(program._mm is not None for program in remaining)
+    cache.clear()
+    assert all(program._mm is None for program in remaining) and cache.status()["bytes"] == 0
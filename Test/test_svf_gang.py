@@ -0,0 +1,28 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from svf_gang import load_program, run_gang
+from svf_sim import SimulatedJTAGInterface, Xilinx7Device
+
+SVF_FILE = os.path.join(os.path.dirname(__file__), "..", "TestFile", "flow_led_bit.svf")
+
+
+def open_sim(device_index):
+    if device_index == 3:
+        raise RuntimeError("failed to open CH347 device")
+    # 2 号板的 IDCODE 不匹配
+    idcode = 0x0362d094 if device_index == 2 else 0x0362d093
+    return SimulatedJTAGInterface([Xilinx7Device(idcode)], call_latency=0.0)
+
+
+def test_gang_reports_per_adapter(tmp_path):
+    commands = load_program(SVF_FILE, str(tmp_path))
+    results = run_gang(commands, [0, 1, 2, 3], open_sim)
+    assert [r.device_index for r in results] == [0, 1, 2, 3]
+    assert [r.passed for r in results] == [True, True, False, False]
+    assert results[2].errors == 1
+    assert "failed to open" in results[3].message
+    # 命令列表只读共享，可再次使用
+    assert all(r.passed for r in run_gang(commands, [0, 1], open_sim))
@@ -0,0 +1,339 @@
+import pytest
+import io
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from svf_parse import *
+from conftest import RecordingInterface
+
+SVF_FILE = os.path.join(os.path.dirname(__file__), "..", "TestFile", "flow_led_bit.svf")
+
+
+def play(streaming: bool):
+    hw_iface = RecordingInterface()
+    controller = JTAGController(verbose=False)
+    controller.set_hardware_interface(hw_iface)
+    player = SVFPlayer(controller)
+    player.set_max_errors(0)
+    player.set_streaming(streaming, queue_depth=2)
+    player.play_svf(SVF_FILE)
+    return hw_iface.calls, player
+
+
+def test_iter_file_matches_parse_file():
+    parser = SVFParser()
+    assert parser.parse_file(SVF_FILE)
+    streamed = list(SVFParser().iter_file(SVF_FILE))
+    assert [(c.cmd_type, c.line_num) for c in streamed] == \
+        [(c.cmd_type, c.line_num) for c in parser.commands]
+
+
+def test_streaming_playback_matches_parse_first():
+    batch_calls, batch_player = play(streaming=False)
+    stream_calls, stream_player = play(streaming=True)
+    assert stream_calls == batch_calls
+    # 流式模式不在解析器中保留命令
+    assert stream_player.parser.commands == []
+    assert ("shift", True, 5140160, False) in stream_calls
+
+
+def test_streaming_abort_stops_parser():
+    hw_iface = RecordingInterface()
+    controller = JTAGController(verbose=False)
+    controller.set_hardware_interface(hw_iface)
+    player = SVFPlayer(controller)
+    player.set_max_errors(1)
+    player.set_streaming(True, queue_depth=1)
+    # 第一条带 TDO 的 SDR 校验失败后应立即中止
+    assert not player.play_svf(SVF_FILE)
+    assert ("shift", True, 5140160, False) not in hw_iface.calls
+
+
+def test_lexer_block_reads_match_mmap():
+    expected = list(SVFParser().iter_file(SVF_FILE))
+    with open(SVF_FILE, 'rb') as f:
+        data = f.read()
+    for block_size in (7, 4096):
+        parser = SVFParser(block_size=block_size)
+        commands = list(parser._iter_statements(parser.lexer.iter_stream(io.BytesIO(data))))
+        assert [(c.cmd_type, c.line_num, c.params) for c in commands] == \
+            [(c.cmd_type, c.line_num, c.params) for c in expected]
+
+
+class FailingInterface(RecordingInterface):
+    """批量写出在播放结束时失败"""
+
+    def flush(self):
+        raise OSError("USB transfer failed")
+
+
+def test_playback_errors_report_line(capsys, tmp_path):
+    controller = JTAGController(verbose=False)
+    controller.set_hardware_interface(FailingInterface())
+    svf = tmp_path / "short.svf"
+    svf.write_text("STATE RESET;\nSIR 6 TDI (09);\n")
+    assert not SVFPlayer(controller).play_svf(str(svf))
+    out = capsys.readouterr().out
+    assert "Error playing SVF after line 2: USB transfer failed" in out
+    assert "parsing" not in out
+
+    # 流式模式下解析线程的异常仍按解析错误报告
+    controller = JTAGController(verbose=False)
+    controller.set_hardware_interface(RecordingInterface())
+    player = SVFPlayer(controller)
+    player.set_streaming(True)
+    assert not player.play_svf(str(tmp_path / "missing.svf"))
+    assert "Error parsing SVF file" in capsys.readouterr().out
+
+
+def test_lexer_comments_and_multiline_payloads():
+    text = (b"! header\n"
+            b"SIR 8 TDI (a5) ! trailing\n;  // note\n"
+            b"SDR 8\n// inner\n TDI (0\nF) TDO (FF) MASK(0f);\n"
+            b"FREQUENCY 1.00E+07 HZ;\n"
+            b"RUNTEST IDLE 1.0E+02 TCK 1E-3 SEC MAXIMUM 2 SEC ENDSTATE RESET;\n")
+    parser = SVFParser(block_size=2)
+    commands = list(parser._iter_statements(parser.lexer.iter_stream(io.BytesIO(text))))
+    assert [c.cmd_type for c in commands] == [SVFCommandType.SIR, SVFCommandType.COMMENT, SVFCommandType.SDR,
+                                              SVFCommandType.FREQUENCY, SVFCommandType.RUNTEST]
+    assert [c.line_num for c in commands] == [2, 3, 4, 8, 9]
+    assert commands[0].tdi == BitVector.from_hex('a5', 8)
+    assert commands[2].tdi.to_hex() == '0F'
+    assert bytes(commands[2].mask) == b'\x0f'
+    assert commands[2].smask is None
+    assert commands[3].frequency == 1e7
+    runtest = commands[4]
+    assert (runtest.run_count, runtest.min_time, runtest.max_time) == (100, 1e-3, 2.0)
+    assert runtest.end_state == TapState.RESET
+    # 参数直接存为槽位，没有每条命令的字典
+    assert not hasattr(runtest, '__dict__')
+    assert runtest.params == {'run_count': 100, 'min_time': 1e-3, 'max_time': 2.0, 'end_state': TapState.RESET}
+
+
+def test_bitvector_packing():
+    bits = BitVector.from_hex('362d093', 28)
+    assert bytes(bits) == bytes([0x93, 0xd0, 0x62, 0x03])
+    assert bits.to_int() == 0x362d093
+    assert bits.to_hex() == '362D093'
+    assert BitVector.from_hex(b'1', 6) == BitVector.from_int(1, 6)
+    assert BitVector.ones(6).to_hex() == '3F'
+
+
+def test_verify_tdo_masked():
+    controller = JTAGController(verbose=False)
+    expected = BitVector.from_hex('0362d093', 32)
+    mask = BitVector.from_hex('0fffffff', 32)
+    assert controller._verify_tdo(BitVector.from_hex('f362d093', 32), expected, mask, 32)
+    assert not controller._verify_tdo(BitVector.from_hex('0362d092', 32), expected, mask, 32)
+
+
+def test_tap_path_table_reaches_target():
+    for start in TAP_TRANSITIONS:
+        for target in TAP_TRANSITIONS:
+            tms_bits, bit_count = TAP_PATHS[start.value][target.value]
+            state = start
+            for i in range(bit_count):
+                state = TAP_TRANSITIONS[state][(tms_bits >> i) & 1]
+            assert state == target
+
+
+def test_tms_coalesced_between_shifts():
+    hw_iface = RecordingInterface()
+    controller = JTAGController(verbose=False)
+    controller.set_hardware_interface(hw_iface)
+    controller.goto_state(TapState.IDLE)
+    controller.shift_ir("09", 6)
+    controller.shift_dr("00000000", 32)
+    controller.flush()
+    # RESET->IDLE->IRSHIFT 合并；IREXIT1->IDLE->DRSHIFT 合并；DREXIT1->IDLE 在 flush 时发送
+    assert hw_iface.calls == [
+        ("tms", 0b00110, 5),
+        ("shift", False, 6, False),
+        ("tms", 0b00101, 5),
+        ("shift", True, 32, False),
+        ("tms", 0b01, 2),
+    ]
+
+
+def test_long_tms_runs_sent_in_bytes():
+    hw_iface = RecordingInterface()
+    controller = JTAGController(verbose=False)
+    controller.set_hardware_interface(hw_iface)
+    controller.goto_state(TapState.IDLE)
+    for _ in range(1000):
+        controller.goto_state(TapState.DRPAUSE)
+        controller.goto_state(TapState.IDLE)
+        # 满 8 位立即发送，暂存的 TMS 始终不足一个字节
+        assert controller._tms_count < 8
+    controller.flush()
+    state = TapState.RESET
+    for _, tms, count in hw_iface.calls:
+        for i in range(count):
+            state = TAP_TRANSITIONS[state][(tms >> i) & 1]
+    assert state == TapState.IDLE
+    assert all(count == 8 for _, _, count in hw_iface.calls[:-1])
+
+
+@pytest.mark.parametrize("lag", [1, 3])
+def test_deferred_verify_aborts_within_lag(lag):
+    hw_iface = RecordingInterface()
+    controller = JTAGController(verbose=False)
+    controller.set_hardware_interface(hw_iface)
+    controller.set_deferred_verify(True, lag)
+    player = SVFPlayer(controller)
+    player.set_max_errors(1)
+    executed = []
+    player.set_progress_callback(lambda current, total, errors, should_abort: executed.append((current, errors)))
+
+    assert not player.play_svf(SVF_FILE)
+    # 第 13 条命令（line 13 的 SDR）的 TDO 校验失败
+    failing = 13
+    first_error = next(current for current, errors in executed if errors)
+    assert failing <= first_error <= failing + lag
+    assert executed[-1][0] == first_error
+    controller.set_deferred_verify(False)
+
+
+def test_deferred_verify_survives_worker_exception(monkeypatch):
+    controller = JTAGController(verbose=False)
+    controller.set_hardware_interface(RecordingInterface())
+    controller.set_deferred_verify(True, 1)
+    failures = []
+
+    def failing_verify(*args):
+        failures.append(args)
+        raise RuntimeError("verify failed")
+
+    monkeypatch.setattr(controller, "_verify_tdo", failing_verify)
+    # 队列容量为 1，工作线程退出时第二次提交会永远阻塞
+    for _ in range(3):
+        controller.shift_dr("00", 8, "ff", "ff")
+    with pytest.raises(RuntimeError, match="verify failed"):
+        controller.drain_verification()
+    assert len(failures) == 3
+    assert controller.error_count == 3
+    controller.drain_verification()
+    controller.set_deferred_verify(False)
+
+
+class ClockedInterface(RecordingInterface):
+    """按固定档位取不超过请求值的最快时钟，与 CH347 相同"""
+    RATES = (1.875e6, 3.75e6, 7.5e6, 15e6)
+
+    def __init__(self):
+        super().__init__()
+        self.frequency = None
+
+    def tck_rate(self, frequency: float) -> float:
+        return max([r for r in self.RATES if r <= frequency] or self.RATES[:1])
+
+    def set_frequency(self, frequency: float):
+        self.frequency = self.tck_rate(frequency)
+
+
+def test_progress_reporter_weighted_and_throttled():
+    controller = JTAGController(verbose=False)
+    controller.set_hardware_interface(ClockedInterface())
+    player = SVFPlayer(controller)
+    player.set_max_errors(0)
+    reports = []
+    player.set_progress_reporter(lambda p: reports.append((p.work_done, p.total_work, p.eta)), interval=0)
+    player.play_svf(SVF_FILE)
+    # SDR/SIR 位数 + RUNTEST 周期（FREQUENCY 10MHz 实际为 7.5MHz 档，0.1 SEC 折算为 750000 周期）
+    shifts = 32 + 5140160 + 160 + 32 + 6 * 9
+    total = shifts + 750000 + 10000 + 100000 + 100 + 5 + 5
+    assert reports[-1][:2] == (total, total)
+    assert reports[-1][2] == 0
+    assert [r[0] for r in reports] == sorted(r[0] for r in reports)
+
+    reports.clear()
+    player = SVFPlayer(controller)
+    player.set_max_errors(0)
+    player.set_progress_reporter(lambda p: reports.append(p.work_done), interval=3600)
+    player.play_svf(SVF_FILE)
+    assert reports == [total]
+
+    # 超过周期上限的 RUNTEST 与 run_test 一样只计 run_count 个周期
+    reports.clear()
+    controller.MAX_RUNTEST_CYCLES = 500000
+    player = SVFPlayer(controller)
+    player.set_max_errors(0)
+    player.set_progress_reporter(lambda p: reports.append(p.work_done), interval=3600)
+    player.play_svf(SVF_FILE)
+    assert reports == [shifts + 10000 + 100000 + 100 + 5 + 5]
+
+
+def test_bitvector_join_unaligned():
+    parts = [BitVector.from_int(0b101, 3), BitVector.from_int(0x3FF, 10), BitVector.zeros(5), BitVector.ones(13)]
+    joined = BitVector.join(parts)
+    assert joined.length == 31
+    assert joined.to_int() == 0b101 | 0x3FF << 3 | 0x1FFF << 18
+
+
+def test_padding_masks_header_and_trailer():
+    controller = JTAGController(verbose=False)
+    controller.set_padding(SVFCommandType.HIR, 4)
+    controller.set_padding(SVFCommandType.TIR, 2, BitVector.from_int(0b10, 2))
+    tdi, tdo, mask, length = controller._apply_padding(
+        controller.padding[SVFCommandType.HIR], controller.padding[SVFCommandType.TIR],
+        BitVector.from_int(0x09, 6), 6, BitVector.from_int(0x11, 6), None)
+    assert length == 12
+    assert tdi.to_int() == 0xF | 0x09 << 4 | 0b10 << 10
+    assert tdo.to_int() == 0x11 << 4
+    assert mask.to_int() == 0x3F << 4
+
+
+def test_padding_skips_empty_segments_and_reuses_result():
+    controller = JTAGController(verbose=False)
+    tdi = BitVector.from_int(0x09, 6)
+    empty = (0, BitVector.zeros(0), None, None, BitVector.zeros(0))
+    # 长度为 0 的填充不拼接，原样返回
+    assert controller._apply_padding(empty, None, tdi, 6, None, None) == (tdi, None, None, 6)
+    controller.set_padding(SVFCommandType.HDR, 3)
+    header = controller.padding[SVFCommandType.HDR]
+    # 没有 TDO 时不生成 TDO/MASK
+    padded = controller._pad_scan(True, header, None, tdi, 6, None, None)
+    assert padded[1:] == (None, None, 9)
+    assert controller._pad_scan(True, header, None, tdi, 6, None, None) is padded
+    assert controller._pad_scan(True, header, None, BitVector.from_int(0x09, 6), 6, None, None) is not padded
+
+
+def test_sticky_scan_parameters_and_smask():
+    text = (b"SDR 8 TDI (a5) MASK (0f) SMASK (3c);\n"
+            b"SDR 8 TDO (05);\n"
+            b"SDR 16 TDI (1234) TDO (0000);\n"
+            b"SIR 6 TDI (14) TDO (11) MASK (31);\n"
+            b"SIR 6 TDI (14) TDO (11) MASK (31);\n")
+    parser = SVFParser()
+    commands = list(parser._iter_statements(parser.lexer.iter_stream(io.BytesIO(text))))
+    controller = JTAGController(verbose=False)
+    resolved = [controller._resolve_scan(c) for c in commands]
+
+    # SMASK 为 0 的 TDI 位以 0 驱动
+    assert resolved[0][1].to_int() == 0xa5 & 0x3c
+    # 同长度：沿用 TDI/MASK/SMASK，复用同一个已转换的位向量
+    length, tdi, tdo, mask = resolved[1]
+    assert tdi is resolved[0][1]
+    assert (tdo.to_int(), mask.to_int()) == (0x05, 0x0f)
+    # 长度变化：MASK 恢复为全 1
+    assert resolved[2][3] == BitVector.ones(16)
+    # 相同的短数据段只转换一次
+    assert commands[3].params['tdi'] is commands[4].params['tdi']
+
+
+@pytest.mark.parametrize("suffix", [".gz", ".xz"])
+def test_compressed_input_matches_plain(tmp_path, suffix):
+    import gzip
+    import lzma
+    with open(SVF_FILE, 'rb') as f:
+        data = f.read()
+    compressed = tmp_path / ("flow_led_bit.svf" + suffix)
+    compressed.write_bytes(gzip.compress(data) if suffix == ".gz" else lzma.compress(data))
+    expected = list(SVFParser().iter_file(SVF_FILE))
+    parser = SVFParser(block_size=4096)
+    commands = list(parser.iter_file(str(compressed)))
+    assert [(c.cmd_type, c.line_num, c.params) for c in commands] == \
+        [(c.cmd_type, c.line_num, c.params) for c in expected]
+    assert parser.lexer.bytes_scanned == len(data)
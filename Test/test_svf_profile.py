@@ -0,0 +1,79 @@
+import json
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from svf_capture import TDOCapture
+from svf_parse import *
+from svf_profile import PlaybackProfiler
+from conftest import FakeCH347
+
+SVF_FILE = os.path.join(os.path.dirname(__file__), "..", "TestFile", "flow_led_bit.svf")
+
+
+def test_profiler_counts_commands_and_dll_calls(tmp_path):
+    device = FakeCH347()
+    hw_iface = Ch347_JTAGInterface(verbose=False, device=device)
+    controller = JTAGController(verbose=False)
+    controller.set_hardware_interface(hw_iface)
+    profiler = PlaybackProfiler(trace=True).attach(controller)
+    player = SVFPlayer(controller)
+    player.set_max_errors(0)
+    player.play_svf(SVF_FILE)
+
+    summary = profiler.to_dict()
+    assert summary["commands"]["SDR"]["count"] == 4
+    assert summary["api_calls"]["jtag_ioscan"]["count"] + summary["api_calls"]["jtag_ioscan_t"]["count"] >= 4
+    assert summary["api_calls"]["jtag_tms_shift"]["count"] == len([c for c in device.calls if c[0] == "tms"])
+    assert summary["bits_shifted"] >= 5140160
+    assert "shift_data" in summary["hw_methods"]
+    assert "SDR" in profiler.summary_table()
+
+    trace_file = str(tmp_path / "trace.json")
+    profiler.write_trace(trace_file)
+    with open(trace_file) as f:
+        trace = json.load(f)
+    assert {event["cat"] for event in trace["traceEvents"]} == {"command", "hw", "dll"}
+
+    # 卸载后恢复原始方法与设备对象
+    profiler.detach()
+    assert "execute_command" not in vars(controller)
+    assert hw_iface.ch347 is device
+
+
+def test_trace_events_bounded():
+    controller = JTAGController(verbose=False)
+    controller.set_hardware_interface(Ch347_JTAGInterface(verbose=False, device=FakeCH347()))
+    profiler = PlaybackProfiler(trace=True, max_events=100).attach(controller)
+    player = SVFPlayer(controller)
+    player.set_max_errors(0)
+    player.play_svf(SVF_FILE)
+    assert len(profiler.events) == 100
+    assert profiler.dropped_events > 0
+    # 汇总统计不受时间线上限影响
+    assert profiler.to_dict()["commands"]["SDR"]["count"] == 4
+    assert "earlier events dropped" in profiler.summary_table()
+
+
+def test_profiler_covers_chunked_capture_path(tmp_path):
+    device = FakeCH347()
+    hw_iface = Ch347_JTAGInterface(verbose=False, device=device)
+    hw_iface.set_chunk_size(1000)
+    controller = JTAGController(verbose=False)
+    controller.set_hardware_interface(hw_iface)
+    # 26 行是 5 Mbit 的 CFG_IN SDR，强制回读后经 shift_data_stream 分块写入捕获文件
+    capture = TDOCapture(str(tmp_path / "tdo.bin"), lines=[26])
+    controller.set_capture(capture)
+    profiler = PlaybackProfiler().attach(controller)
+    player = SVFPlayer(controller)
+    player.set_max_errors(0)
+    with capture:
+        player.play_svf(SVF_FILE)
+
+    summary = profiler.to_dict()
+    assert summary["hw_methods"]["shift_data_stream"]["count"] == 1
+    chunks = [c for c in device.calls if c[0] == "ioscan_t"]
+    assert len(chunks) == (5140160 // 8 + 999) // 1000 and all(c[2] for c in chunks)
+    assert summary["api_calls"]["jtag_ioscan_t"]["count"] == len(chunks)
+    assert summary["bits_shifted"] >= 5140160
@@ -0,0 +1,68 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from svf_parse import *
+from svf_sim import SimDevice, SimulatedJTAGInterface, Xilinx7Device
+
+SVF_FILE = os.path.join(os.path.dirname(__file__), "..", "TestFile", "flow_led_bit.svf")
+
+
+def play(hw_iface):
+    controller = JTAGController(verbose=False)
+    controller.set_hardware_interface(hw_iface)
+    player = SVFPlayer(controller)
+    player.set_max_errors(1)
+    return player.play_svf(SVF_FILE), controller
+
+
+def test_simulated_flow_led_passes():
+    hw_iface = SimulatedJTAGInterface(call_latency=0.0)
+    success, controller = play(hw_iface)
+    assert success and controller.error_count == 0
+    device = hw_iface.devices[0]
+    assert device.done
+    assert device.bitstream_bits == 5140160 + 160
+    # 所有移位与 RUNTEST 的 TCK 周期都被计入
+    assert hw_iface.tck_cycles >= 5140160 + 100000
+    assert hw_iface.elapsed >= hw_iface.tck_cycles / 1e7
+
+
+def test_simulated_wrong_idcode_fails():
+    hw_iface = SimulatedJTAGInterface([Xilinx7Device(idcode=0x0362d094)])
+    success, controller = play(hw_iface)
+    assert not success
+    assert hw_iface.devices[0].bitstream_bits == 0
+
+
+def test_chain_shifts_through_bypass():
+    hw_iface = SimulatedJTAGInterface([SimDevice(ir_length=4, idcode=0x1234567f), SimDevice(ir_length=6)])
+    controller = JTAGController(verbose=False)
+    controller.set_hardware_interface(hw_iface)
+    # 两个器件的 IR 串接共 10 位，各自捕获 ...01
+    controller.goto_state(TapState.IRSHIFT)
+    controller.flush()
+    tdo = hw_iface.shift_data(BitVector.from_int(0x3F << 4 | 0xF, 10), 10, False, True)
+    assert tdo.to_int() == 0x1 | 0x1 << 4
+    # 复位后两个器件都选择 IDCODE，靠近 TDO 的器件先移出
+    controller.current_state = TapState.IREXIT1
+    controller.goto_state(TapState.RESET)
+    controller.goto_state(TapState.DRSHIFT)
+    controller.flush()
+    tdo = hw_iface.shift_data(BitVector.zeros(64), 64, True, True).to_int()
+    assert (tdo & 0xFFFFFFFF, tdo >> 32) == (0x1234567f, 0x0362d093)
+
+
+def test_header_padding_on_two_device_chain(tmp_path):
+    with open(SVF_FILE) as f:
+        text = f.read()
+    # 目标 FPGA 与 TDO 之间还有一个 4 位 IR 的器件
+    svf = tmp_path / "chain.svf"
+    svf.write_text(text.replace("HIR 0 ;", "HIR 4 ;").replace("HDR 0 ;", "HDR 1 ;"))
+    hw_iface = SimulatedJTAGInterface([SimDevice(ir_length=4, idcode=None), Xilinx7Device()], call_latency=0.0)
+    controller = JTAGController(verbose=False)
+    controller.set_hardware_interface(hw_iface)
+    player = SVFPlayer(controller)
+    assert player.play_svf(str(svf))
+    assert hw_iface.devices[1].done
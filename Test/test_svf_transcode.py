@@ -0,0 +1,58 @@
+import pytest
+import random
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import svf_transcode
+from svf_transcode import *
+
+IMPLEMENTATIONS = {
+    "stdlib": (hex_to_packed, packed_to_hex),
+    "numpy": (hex_to_packed_numpy, packed_to_hex_numpy),
+}
+
+
+@pytest.fixture(params=sorted(IMPLEMENTATIONS))
+def transcoder(request):
+    if request.param == "numpy":
+        pytest.importorskip("numpy")
+    return IMPLEMENTATIONS[request.param]
+
+
+def test_hex_to_packed_orders_bits_lsb_first(transcoder):
+    to_packed, to_hex = transcoder
+    # 最右侧字符为最先移出的位
+    assert to_packed(b"0362d093", 32) == bytes.fromhex("93d06203")
+    # 奇数个字符、位数不足时补 0、多余的高位字节丢弃
+    assert to_packed("abc", 12) == bytes.fromhex("bc0a")
+    assert to_packed(b"3f", 24) == bytes.fromhex("3f0000")
+    assert to_packed(b"123456", 9) == bytes.fromhex("5634")
+    assert to_hex(bytes.fromhex("93d06203"), 32) == "0362D093"
+    assert to_hex(bytes.fromhex("bc0a"), 10) == "ABC"
+
+
+def test_round_trip_matches_integer_reference(transcoder):
+    to_packed, to_hex = transcoder
+    rng = random.Random(5)
+    for _ in range(200):
+        length = rng.randint(1, 300)
+        value = rng.getrandbits(length)
+        text = f"{value:0{(length + 3) // 4}X}"
+        packed = to_packed(text.encode(), length)
+        assert packed == value.to_bytes((length + 7) // 8, 'little')
+        assert to_hex(packed, length) == text
+
+
+def test_invalid_hex_rejected(transcoder):
+    to_packed, _ = transcoder
+    with pytest.raises(ValueError):
+        to_packed(b"12G4", 16)
+
+
+def test_numpy_missing_raises(monkeypatch):
+    monkeypatch.setattr(svf_transcode, "np", None)
+    with pytest.raises(ImportError):
+        hex_to_packed_numpy(b"00", 8)
+    assert hex_to_packed(b"0362d093", 32) == bytes.fromhex("93d06203")
@@ -0,0 +1,44 @@
+import pytest
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import svf_verify
+from svf_verify import *
+
+LENGTH = 5140160
+
+
+def make_buffers():
+    byte_length = (LENGTH + 7) // 8
+    expected = bytes(range(256)) * (byte_length // 256) + bytes(byte_length % 256)
+    received = bytearray(expected)
+    received[10] ^= 0x81   # 位 80 和 87
+    received[5000] ^= 0x04  # 位 40002
+    mask = bytearray(b'\xff' * byte_length)
+    mask[5000] = 0xfb       # 屏蔽位 40002
+    return bytes(received), expected, bytes(mask)
+
+
+@pytest.mark.parametrize("use_numpy", [False, True])
+def test_verify_reports_mismatch_offsets(use_numpy, monkeypatch):
+    if use_numpy:
+        pytest.importorskip("numpy")
+    else:
+        monkeypatch.setattr(svf_verify, "np", None)
+    received, expected, mask = make_buffers()
+
+    result = verify_tdo(received, expected, mask, LENGTH)
+    assert not result
+    assert result.mismatch_count == 2
+    assert result.mismatch_offsets == [80, 87]
+
+    assert verify_tdo(expected, expected, mask, LENGTH)
+    assert verify_tdo(received, expected, bytes(len(mask)), LENGTH)
+
+
+def test_verify_ignores_bits_past_length():
+    assert verify_tdo(b'\x3f', b'\x7f', b'\xff', 6)
+    result = verify_tdo(b'\x3e', b'\x7f', b'\xff', 6, max_offsets=1)
+    assert (result.passed, result.mismatch_count, result.mismatch_offsets) == (False, 1, [0])
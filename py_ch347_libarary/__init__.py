@@ -1 +1,3 @@
-from .pych347 import *
\ No newline at end of file
+from .pych347 import *
+from .ch347_protocol import *
+from .ch347_usb import *
@@ -0,0 +1,188 @@
+# py_ch347_libarary/ch347_protocol.py
+
+import time
+
+__all__ = [
+    'CH347_CMD_JTAG_INIT', 'CH347_CMD_JTAG_BIT_OP', 'CH347_CMD_JTAG_BIT_OP_RD',
+    'CH347_CMD_JTAG_DATA_SHIFT', 'CH347_CMD_JTAG_DATA_SHIFT_RD',
+    'CH347_TCK', 'CH347_TMS', 'CH347_TDI', 'CH347_PACKET_PAYLOAD_MAX', 'CH347_USB_PACKET_SIZE',
+    'encode_packet', 'encode_bit_ops', 'encode_data_shift', 'encode_scan', 'CH347CommandBatch',
+]
+
+# CH347 JTAG command codes (packet = cmd, len_lo, len_hi, payload)
+CH347_CMD_JTAG_INIT = 0xD0
+CH347_CMD_JTAG_BIT_OP = 0xD1
+CH347_CMD_JTAG_BIT_OP_RD = 0xD2
+CH347_CMD_JTAG_DATA_SHIFT = 0xD3
+CH347_CMD_JTAG_DATA_SHIFT_RD = 0xD4
+
+# Pin bits used in CH347_CMD_JTAG_BIT_OP payload bytes
+CH347_TCK = 0x01
+CH347_TMS = 0x02
+CH347_TDI = 0x10
+
+# Largest payload of one command packet on a high-speed (512 byte) endpoint
+CH347_PACKET_PAYLOAD_MAX = 507
+CH347_USB_PACKET_SIZE = 512
+
+
+def encode_packet(cmd: int, payload) -> bytes:
+    """Build a single CH347 command packet."""
+    length = len(payload)
+    return bytes((cmd, length & 0xFF, length >> 8)) + bytes(payload)
+
+
+def encode_bit_ops(tms_bits: int, tdi_bits: int, count: int, payload_max: int = CH347_PACKET_PAYLOAD_MAX,
+                   read: bool = False) -> bytes:
+    """
+    Encode `count` clocks as CH347_CMD_JTAG_BIT_OP packets.
+
+    Bit i of tms_bits/tdi_bits is driven on clock i. Every clock takes two bytes
+    (TCK low, TCK high) and each packet ends with TCK low again. With read=True
+    CH347_CMD_JTAG_BIT_OP_RD is used and the adapter answers with one byte per
+    clock holding TDO in bit 0.
+    """
+    cmd = CH347_CMD_JTAG_BIT_OP_RD if read else CH347_CMD_JTAG_BIT_OP
+    packets = []
+    bits_per_packet = (payload_max - 1) // 2
+    pin = 0
+    while count > 0:
+        step = min(count, bits_per_packet)
+        payload = bytearray()
+        for i in range(step):
+            pin = (CH347_TMS if (tms_bits >> i) & 1 else 0) | (CH347_TDI if (tdi_bits >> i) & 1 else 0)
+            payload.append(pin)
+            payload.append(pin | CH347_TCK)
+        payload.append(pin)
+        packets.append(encode_packet(cmd, payload))
+        tms_bits >>= step
+        tdi_bits >>= step
+        count -= step
+    return b''.join(packets)
+
+
+def encode_data_shift(data, payload_max: int = CH347_PACKET_PAYLOAD_MAX, read: bool = False) -> bytes:
+    """
+    Encode whole TDI bytes (LSB first, TMS low) as CH347_CMD_JTAG_DATA_SHIFT packets.
+
+    With read=True CH347_CMD_JTAG_DATA_SHIFT_RD is used and the adapter answers
+    every packet with the same number of TDO bytes.
+    """
+    cmd = CH347_CMD_JTAG_DATA_SHIFT_RD if read else CH347_CMD_JTAG_DATA_SHIFT
+    view = memoryview(data)
+    packets = []
+    for start in range(0, len(view), payload_max):
+        packets.append(encode_packet(cmd, view[start:start + payload_max]))
+    return b''.join(packets)
+
+
+def encode_scan(data, bit_count: int, exit_on_last: bool = True, read: bool = False,
+                payload_max: int = CH347_PACKET_PAYLOAD_MAX) -> bytes:
+    """
+    Encode a scan of `bit_count` TDI bits from LSB-first `data`.
+
+    Whole bytes go out as data shift packets and the remaining bits as bit
+    operations. With exit_on_last the final bit is clocked with TMS high,
+    leaving the TAP in Exit1 just like jtag_ioscan does.
+    """
+    if bit_count <= 0:
+        return b''
+    body_bits = bit_count - 1 if exit_on_last else bit_count
+    whole = body_bits // 8
+    packets = encode_data_shift(memoryview(data)[:whole], payload_max, read) if whole else b''
+    tail = bit_count - whole * 8
+    if tail:
+        tail_bytes = bytes(data[whole:whole + (tail + 7) // 8])
+        tdi_bits = int.from_bytes(tail_bytes, 'little') & ((1 << tail) - 1)
+        tms_bits = 1 << (tail - 1) if exit_on_last else 0
+        packets += encode_bit_ops(tms_bits, tdi_bits, tail, payload_max, read)
+    return packets
+
+
+class CH347CommandBatch:
+    """
+    Queue CH347 JTAG command packets and send them with as few USB writes as possible.
+
+    Packets are collected into an output buffer and written with `write` (normally
+    ch347.write_data) only when the buffer would exceed `bulk_size` or when
+    flush() is called, e.g. before a scan that needs TDO. A packet is never split
+    across two writes.
+    """
+
+    def __init__(self, write, bulk_size: int = 8 * CH347_USB_PACKET_SIZE, payload_max: int = CH347_PACKET_PAYLOAD_MAX):
+        self.write = write
+        self.bulk_size = max(bulk_size, payload_max + 3)
+        self.payload_max = payload_max
+        self.buffer = bytearray()
+        self.ops = 0
+        self.writes = 0
+        self.bytes_written = 0
+        self.start_time = None
+        self.busy_time = 0.0
+
+    def _append(self, packets: bytes):
+        if self.start_time is None:
+            self.start_time = time.perf_counter()
+        self.ops += 1
+        view = memoryview(packets)
+        pos = 0
+        while pos < len(view):
+            # Split only on packet boundaries
+            length = 3 + (view[pos + 1] | (view[pos + 2] << 8))
+            if len(self.buffer) + length > self.bulk_size:
+                self.flush()
+            self.buffer += view[pos:pos + length]
+            pos += length
+
+    def tms(self, tms_bits: int, count: int, tdi: int = 0):
+        """Clock `count` TMS bits (bit 0 first)."""
+        if count > 0:
+            tdi_bits = (1 << count) - 1 if tdi else 0
+            self._append(encode_bit_ops(tms_bits, tdi_bits, count, self.payload_max))
+
+    def clock(self, count: int, tms: int = 0, tdi: int = 0):
+        """Run `count` TCK cycles with constant TMS/TDI."""
+        if count <= 0:
+            return
+        if tms or tdi:
+            ones = (1 << count) - 1
+            self._append(encode_bit_ops(ones if tms else 0, ones if tdi else 0, count, self.payload_max))
+            return
+        # Whole bytes of zeros take one byte per 8 clocks instead of two bytes per clock
+        packets = encode_data_shift(bytes(count // 8), self.payload_max) if count >= 8 else b''
+        if count % 8:
+            packets += encode_bit_ops(0, 0, count % 8, self.payload_max)
+        self._append(packets)
+
+    def shift(self, data, bit_count: int, exit_on_last: bool = True):
+        """
+        Shift `bit_count` TDI bits from LSB-first `data` without reading TDO.
+
+        With exit_on_last the final bit is clocked with TMS high, leaving the TAP
+        in Exit1 just like jtag_ioscan does.
+        """
+        if bit_count > 0:
+            self._append(encode_scan(data, bit_count, exit_on_last, False, self.payload_max))
+
+    def flush(self) -> bool:
+        """Write everything queued so far."""
+        if not self.buffer:
+            return True
+        t0 = time.perf_counter()
+        data = bytes(self.buffer)
+        self.buffer.clear()
+        result = self.write(data, len(data))
+        self.busy_time += time.perf_counter() - t0
+        self.writes += 1
+        self.bytes_written += len(data)
+        return bool(result)
+
+    def ops_per_second(self) -> float:
+        if self.start_time is None:
+            return 0.0
+        elapsed = time.perf_counter() - self.start_time
+        return self.ops / elapsed if elapsed > 0 else 0.0
+
+    def summary(self) -> str:
+        return (f"{self.ops} ops in {self.writes} USB writes ({self.bytes_written} bytes), "
+                f"{self.ops_per_second():.0f} ops/s")
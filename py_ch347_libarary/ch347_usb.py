@@ -0,0 +1,320 @@
+# py_ch347_libarary/ch347_usb.py
+
+from typing import List, Optional
+
+from .ch347_protocol import (CH347_CMD_JTAG_BIT_OP, CH347_CMD_JTAG_BIT_OP_RD, CH347_CMD_JTAG_DATA_SHIFT,
+                             CH347_CMD_JTAG_DATA_SHIFT_RD, CH347_CMD_JTAG_INIT, CH347_PACKET_PAYLOAD_MAX,
+                             CH347_TCK, CH347_TDI, CH347_USB_PACKET_SIZE, encode_bit_ops, encode_packet,
+                             encode_scan)
+from .pych347 import CH347DeviceRecord
+
+try:
+    import usb.core
+    import usb.util
+except ImportError:
+    usb = None
+
+CH347_USB_VID = 0x1A86
+# Product ID -> number of the interface carrying the JTAG endpoints (CH347T in mode 3, CH347F)
+CH347_USB_JTAG_INTERFACES = {0x55DD: 2, 0x55DE: 4}
+CH347_EP_OUT = 0x06
+CH347_EP_IN = 0x86
+USB_TIMEOUT_MS = 1000
+
+__all__ = [
+    'CH347_USB_VID', 'CH347_USB_JTAG_INTERFACES', 'CH347_EP_OUT', 'CH347_EP_IN', 'USB_TIMEOUT_MS',
+    'PyUSBEndpoints', 'FakeUSBEndpoints', 'ch347_usb',
+]
+
+
+class PyUSBEndpoints:
+    """Bulk OUT/IN endpoint pair of one CH347 opened through pyusb (libusb)."""
+
+    def __init__(self, device):
+        self.device = device
+        self.interface = CH347_USB_JTAG_INTERFACES[device.idProduct]
+        if device.is_kernel_driver_active(self.interface):
+            device.detach_kernel_driver(self.interface)
+        usb.util.claim_interface(device, self.interface)
+
+    @staticmethod
+    def find_all() -> list:
+        """Return every connected CH347 in a JTAG capable mode, in bus order."""
+        if usb is None:
+            raise ImportError("the native CH347 transport requires the 'pyusb' package")
+        return [device for device in usb.core.find(find_all=True, idVendor=CH347_USB_VID)
+                if device.idProduct in CH347_USB_JTAG_INTERFACES]
+
+    def write(self, data, timeout: int = USB_TIMEOUT_MS) -> int:
+        return self.device.write(CH347_EP_OUT, data, timeout)
+
+    def read(self, size: int, timeout: int = USB_TIMEOUT_MS) -> bytes:
+        # Request whole USB packets so a short transfer never overflows the host buffer
+        size = -(-size // CH347_USB_PACKET_SIZE) * CH347_USB_PACKET_SIZE
+        return self.device.read(CH347_EP_IN, size, timeout).tobytes()
+
+    def close(self):
+        usb.util.release_interface(self.device, self.interface)
+        usb.util.dispose_resources(self.device)
+
+
+class FakeUSBEndpoints:
+    """
+    In-memory endpoint pair that answers CH347 JTAG packets like an adapter
+    whose TDO is wired to TDI.
+
+    Used to test and benchmark the protocol encoder without hardware. With
+    record=True every byte written to the OUT endpoint is kept in `out_data`.
+    """
+
+    def __init__(self, record: bool = False):
+        self.record = record
+        self.out_data = bytearray()
+        self.clock_index = None
+        self.clocks = 0
+        self.writes = 0
+        self.reads = 0
+        self.bytes_out = 0
+        self.bytes_in = 0
+        self._partial = bytearray()
+        self._pending = bytearray()
+
+    def write(self, data, timeout: int = USB_TIMEOUT_MS) -> int:
+        data = memoryview(data).cast('B')
+        self.writes += 1
+        self.bytes_out += len(data)
+        if self.record:
+            self.out_data += data
+        self._partial += data
+        pos = 0
+        buf = self._partial
+        while pos + 3 <= len(buf):
+            length = buf[pos + 1] | (buf[pos + 2] << 8)
+            if pos + 3 + length > len(buf):
+                break
+            self._packet(buf[pos], memoryview(buf)[pos + 3:pos + 3 + length])
+            pos += 3 + length
+        del buf[:pos]
+        return len(data)
+
+    def _packet(self, cmd: int, payload):
+        if cmd == CH347_CMD_JTAG_INIT:
+            self.clock_index = payload[1]
+            self._pending += bytes((CH347_CMD_JTAG_INIT, 1, 0, 0))
+        elif cmd in (CH347_CMD_JTAG_BIT_OP, CH347_CMD_JTAG_BIT_OP_RD):
+            tdo = bytearray()
+            tck = 0
+            for pin in payload:
+                if pin & CH347_TCK and not tck:
+                    tdo.append(1 if pin & CH347_TDI else 0)
+                tck = pin & CH347_TCK
+            self.clocks += len(tdo)
+            if cmd == CH347_CMD_JTAG_BIT_OP_RD:
+                self._pending += encode_packet(cmd, tdo)
+        elif cmd in (CH347_CMD_JTAG_DATA_SHIFT, CH347_CMD_JTAG_DATA_SHIFT_RD):
+            self.clocks += 8 * len(payload)
+            if cmd == CH347_CMD_JTAG_DATA_SHIFT_RD:
+                self._pending += encode_packet(cmd, payload)
+        else:
+            raise ValueError(f"unexpected CH347 command 0x{cmd:02x}")
+
+    def read(self, size: int, timeout: int = USB_TIMEOUT_MS) -> bytes:
+        if not self._pending:
+            raise TimeoutError("no data on the IN endpoint")
+        data = bytes(self._pending[:size])
+        del self._pending[:size]
+        self.reads += 1
+        self.bytes_in += len(data)
+        return data
+
+    def close(self):
+        pass
+
+
+def _buffer_view(data_buffer) -> memoryview:
+    """Writable byte view of a ctypes array, ctypes.byref() of one, or a bytearray."""
+    obj = getattr(data_buffer, '_obj', data_buffer)
+    return memoryview(obj).cast('B')
+
+
+def _response_length(packets) -> int:
+    """Number of bytes the adapter sends back for a run of command packets."""
+    total = 0
+    pos = 0
+    while pos < len(packets):
+        cmd = packets[pos]
+        length = packets[pos + 1] | (packets[pos + 2] << 8)
+        if cmd == CH347_CMD_JTAG_DATA_SHIFT_RD:
+            total += 3 + length
+        elif cmd == CH347_CMD_JTAG_BIT_OP_RD:
+            total += 3 + length // 2
+        pos += 3 + length
+    return total
+
+
+class ch347_usb:
+    """
+    CH347 JTAG transport that talks the bulk protocol directly over USB.
+
+    Offers the same operations as the DLL based `ch347` wrapper (open_device,
+    jtag_init, jtag_tms_shift, jtag_ioscan, jtag_ioscan_t, write_data), so it
+    can be passed as `device` to Ch347_JTAGInterface on Linux. Each call is
+    encoded with ch347_protocol and submitted as one bulk write. Scans that
+    read TDO are split into rounds of `read_chunk` bytes so the adapter's
+    reply buffer never overflows.
+
+    `endpoints` selects the USB backend; by default the adapter is opened with
+    pyusb. Pass a FakeUSBEndpoints to run without hardware.
+    """
+
+    def __init__(self, device_index: int = 0, serial: Optional[str] = None, endpoints=None,
+                 timeout: int = USB_TIMEOUT_MS):
+        self.device_index = device_index
+        self.serial = serial
+        self.endpoints = endpoints
+        self.timeout = timeout
+        self.payload_max = CH347_PACKET_PAYLOAD_MAX
+        self.read_chunk = 8 * CH347_PACKET_PAYLOAD_MAX  # TDI bytes per read round trip
+        self.handle = None
+        self.clock_index = None
+        self._rx = bytearray()
+
+    def enumerate_devices(self, refresh: bool = False) -> List[CH347DeviceRecord]:
+        """Return a record for every connected adapter (the serial string is the device_id)."""
+        records = []
+        for index, device in enumerate(PyUSBEndpoints.find_all()):
+            try:
+                serial = usb.util.get_string(device, device.iSerialNumber) or ""
+                product = usb.util.get_string(device, device.iProduct) or ""
+            except (usb.core.USBError, ValueError):
+                serial = product = ""
+            endpoint = CH347_USB_PACKET_SIZE if device.speed is None or device.speed >= 3 else 64
+            records.append(CH347DeviceRecord(index, serial, device.speed or 0, endpoint, endpoint,
+                                             device.bcdDevice, product))
+        return records
+
+    def find_device(self, serial: str, refresh: bool = False) -> Optional[CH347DeviceRecord]:
+        """Look up an adapter by its USB serial string."""
+        for record in self.enumerate_devices(refresh):
+            if record.device_id == serial:
+                return record
+        return None
+
+    @property
+    def is_open(self) -> bool:
+        return self.handle is not None
+
+    def __enter__(self):
+        if not self.is_open and not self.open_device():
+            raise OSError(f"Failed to open CH347 device {self.device_index}")
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close_device()
+        return False
+
+    def open_device(self):
+        """
+        Claim the JTAG interface of the adapter.
+
+        Returns:
+            The endpoint pair if successful, None otherwise.
+        """
+        if self.handle is not None:
+            return self.handle
+        if self.endpoints is None:
+            devices = PyUSBEndpoints.find_all()
+            if self.serial is not None:
+                record = self.find_device(self.serial)
+                if record is None:
+                    return None
+                self.device_index = record.index
+            if self.device_index >= len(devices):
+                return None
+            try:
+                self.endpoints = PyUSBEndpoints(devices[self.device_index])
+            except usb.core.USBError:
+                return None
+        self.handle = self.endpoints
+        self._rx.clear()
+        return self.handle
+
+    def close_device(self):
+        """
+        Release the adapter.
+
+        Returns:
+            bool: True if successful, False otherwise.
+        """
+        if self.handle is not None:
+            self.endpoints.close()
+        self.handle = None
+        self.clock_index = None
+        return True
+
+    def write_data(self, buffer, length: int) -> bool:
+        view = memoryview(buffer).cast('B')[:length]
+        return self.endpoints.write(view, self.timeout) == length
+
+    def _read(self, size: int) -> bytes:
+        while len(self._rx) < size:
+            self._rx += self.endpoints.read(size - len(self._rx), self.timeout)
+        data = bytes(self._rx[:size])
+        del self._rx[:size]
+        return data
+
+    def jtag_init(self, clock: int) -> bool:
+        packet = encode_packet(CH347_CMD_JTAG_INIT, bytes((0, clock, 0, 0, 0, 0)))
+        result = self.write_data(packet, len(packet))
+        if result:
+            reply = self._read(4)
+            result = reply[0] == CH347_CMD_JTAG_INIT and reply[3] == 0
+        self.clock_index = clock if result else None
+        return result
+
+    def jtag_tms_shift(self, tmsvalue: int, step: int, skip: int) -> bool:
+        packets = encode_bit_ops(int(tmsvalue) >> skip, 0, step, self.payload_max)
+        return self.write_data(packets, len(packets))
+
+    def jtag_ioscan(self, data_buffer, data_bits: int, is_read: bool) -> bool:
+        return self._scan(_buffer_view(data_buffer), data_bits, is_read, True)
+
+    def jtag_ioscan_t(self, data_buffer, data_bits: int, is_read: bool, is_last_packge: bool) -> bool:
+        return self._scan(_buffer_view(data_buffer), data_bits, is_read, is_last_packge)
+
+    def _scan(self, view: memoryview, data_bits: int, is_read: bool, exit_on_last: bool) -> bool:
+        if not is_read:
+            packets = encode_scan(view, data_bits, exit_on_last, False, self.payload_max)
+            return self.write_data(packets, len(packets))
+        # TDO is written back into the caller's buffer, one round trip per read_chunk bytes
+        byte_length = (data_bits + 7) // 8
+        for start in range(0, byte_length, self.read_chunk):
+            end = min(start + self.read_chunk, byte_length)
+            bits = min(data_bits - start * 8, (end - start) * 8)
+            last = end == byte_length
+            packets = encode_scan(view[start:end], bits, exit_on_last and last, True, self.payload_max)
+            if not self.write_data(packets, len(packets)):
+                return False
+            tdo = self._decode_tdo(self._read(_response_length(packets)))
+            view[start:end] = tdo.to_bytes(end - start, 'little')
+        return True
+
+    @staticmethod
+    def _decode_tdo(reply: bytes) -> int:
+        """Collect the TDO bits of a scan reply, LSB first."""
+        value = 0
+        bit = 0
+        pos = 0
+        while pos < len(reply):
+            cmd = reply[pos]
+            length = reply[pos + 1] | (reply[pos + 2] << 8)
+            payload = reply[pos + 3:pos + 3 + length]
+            if cmd == CH347_CMD_JTAG_DATA_SHIFT_RD:
+                value |= int.from_bytes(payload, 'little') << bit
+                bit += 8 * length
+            else:
+                for i, sample in enumerate(payload):
+                    value |= (sample & 1) << (bit + i)
+                bit += length
+            pos += 3 + length
+        return value
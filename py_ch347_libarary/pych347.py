@@ -4,8 +4,11 @@ import array
 import cmd
 import os
 import ctypes
+import threading
+import warnings
 from ctypes import *
 from pickle import TRUE
+from typing import List, NamedTuple, Optional
 from weakref import ref
 
 # Define the argument and return types for CH347GetDeviceInfor
@@ -33,9 +36,51 @@ class mDeviceInforS(ctypes.Structure):
                 ("FirewareVer", ctypes.c_ubyte)
     ]
 
+# TCK frequency (Hz) selected by each CH347Jtag_INIT clock index
+JTAG_CLOCK_RATES = (1.875e6, 3.75e6, 7.5e6, 15e6, 30e6, 60e6)
+
+def jtag_clock_index(frequency: float) -> int:
+    """
+    Map a TCK frequency to a CH347Jtag_INIT clock index.
+
+    Returns:
+        int: The fastest index whose rate does not exceed `frequency`,
+        or 0 (with a warning) if even the slowest rate is faster.
+    """
+    if frequency < JTAG_CLOCK_RATES[0]:
+        warnings.warn(f"TCK {frequency / 1e6:.3f} MHz is below the slowest CH347 rate, "
+                      f"using {JTAG_CLOCK_RATES[0] / 1e6:.3f} MHz", RuntimeWarning, stacklevel=2)
+        return 0
+    index = 0
+    for i, rate in enumerate(JTAG_CLOCK_RATES):
+        if rate <= frequency:
+            index = i
+    return index
+
+class CH347DeviceRecord(NamedTuple):
+    """Typed summary of one enumerated adapter."""
+    index: int
+    device_id: str
+    usb_speed: int
+    bulk_out_max: int
+    bulk_in_max: int
+    firmware_version: int
+    product: str
+
+    @classmethod
+    def from_info(cls, index: int, info: mDeviceInforS) -> 'CH347DeviceRecord':
+        return cls(index, info.DeviceID.decode('ascii', 'replace'), info.UsbSpeedType,
+                   info.BulkOutEndpMaxSize, info.BulkInEndpMaxSize, info.FirewareVer,
+                   info.ProductString.decode('ascii', 'replace'))
+
 class ch347:
     MAX_DEVICE_NUMBER = 16
     INVALID_HANDLE_VALUE = ctypes.c_void_p(-1).value
+    # Shared by all instances: enumeration results and indices opened by this process
+    _device_cache = None
+    _open_indices = set()
+    # Guards the two attributes above; gang programming opens adapters from worker threads
+    _registry_lock = threading.Lock()
     
     def __init__(self, device_index=0, dll_path=None):
         if dll_path is None:
@@ -46,6 +91,8 @@ class ch347:
             self.ch347dll = ctypes.WinDLL(dll_path)
 
         self.device_index = device_index
+        self.handle = None
+        self.clock_index = None
         # Define the argument and return types for CH347OpenDevice
         self.ch347dll.CH347OpenDevice.argtypes = [ctypes.c_ulong]
         self.ch347dll.CH347OpenDevice.restype = ctypes.c_void_p
@@ -83,6 +130,49 @@ class ch347:
         print(f"Number of devices: {num_devices}")
         return num_devices
 
+    def enumerate_devices(self, refresh: bool = False) -> List[CH347DeviceRecord]:
+        """
+        Return a record for every connected adapter without printing.
+
+        Results are cached for the process; pass refresh=True to enumerate again.
+        Adapters already opened by this process are queried but not closed.
+        """
+        with ch347._registry_lock:
+            if ch347._device_cache is not None and not refresh:
+                return list(ch347._device_cache)
+            records = []
+            dev_info = mDeviceInforS()
+            for i in range(self.MAX_DEVICE_NUMBER):
+                already_open = i in ch347._open_indices
+                if not already_open and self.ch347dll.CH347OpenDevice(i) == self.INVALID_HANDLE_VALUE:
+                    break
+                if self.ch347dll.CH347GetDeviceInfor(i, ctypes.byref(dev_info)):
+                    records.append(CH347DeviceRecord.from_info(i, dev_info))
+                if not already_open:
+                    self.ch347dll.CH347CloseDevice(i)
+            ch347._device_cache = records
+            return list(records)
+
+    def find_device(self, serial: str, refresh: bool = False) -> Optional[CH347DeviceRecord]:
+        """Look up an adapter by its DeviceID (serial)."""
+        for record in self.enumerate_devices(refresh):
+            if record.device_id == serial:
+                return record
+        return None
+
+    @property
+    def is_open(self) -> bool:
+        return self.handle is not None
+
+    def __enter__(self):
+        if not self.is_open and not self.open_device():
+            raise OSError(f"Failed to open CH347 device {self.device_index}")
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close_device()
+        return False
+
     def open_device(self):
         """
         Open USB device.
@@ -90,11 +180,16 @@ class ch347:
         Returns:
             int: Handle to the opened device if successful, None otherwise.
         """
-        handle = self.ch347dll.CH347OpenDevice(self.device_index)
-        if handle != self.INVALID_HANDLE_VALUE:
-            return handle
-        else:
-            return None
+        if self.handle is not None:
+            return self.handle
+        with ch347._registry_lock:
+            handle = self.ch347dll.CH347OpenDevice(self.device_index)
+            if handle != self.INVALID_HANDLE_VALUE:
+                self.handle = handle
+                ch347._open_indices.add(self.device_index)
+                return handle
+            else:
+                return None
         
     def close_device(self):
         """
@@ -103,7 +198,11 @@ class ch347:
         Returns:
             bool: True if successful, False otherwise.
         """
-        result = self.ch347dll.CH347CloseDevice(self.device_index)
+        with ch347._registry_lock:
+            result = self.ch347dll.CH347CloseDevice(self.device_index)
+            self.handle = None
+            self.clock_index = None
+            ch347._open_indices.discard(self.device_index)
         return result
     
     def write_data(self, buffer: ctypes.c_void_p, length: ctypes.c_ulong) -> bool:
@@ -132,6 +231,7 @@ class ch347:
     def jtag_init(self, clock: int) -> bool:
         clock_index = clock
         result = self.ch347dll.CH347Jtag_INIT(self.device_index, clock_index)
+        self.clock_index = clock_index if result else None
         return result
 
     def jtag_switch_tap(self, state: ctypes.c_ubyte) -> bool:
@@ -153,4 +253,28 @@ class ch347:
     
     def jtag_ioscan(self, data_buffer: ctypes.c_void_p, data_bits: ctypes.c_ulong, is_read: bool) -> bool:
         result = self.ch347dll.CH347Jtag_IoScan(self.device_index, data_buffer, data_bits, is_read)
-        return result
\ No newline at end of file
+        return result
+
+def open_session(serial: Optional[str] = None, device_index: int = 0, clock_index: Optional[int] = None,
+                 dll_path=None) -> ch347:
+    """
+    Open an adapter for use as a context manager, selected by serial or index.
+
+    The returned device keeps its handle (and JTAG init) across several SVF
+    runs and is closed when the `with` block exits:
+
+        with open_session(serial="...") as device:
+            for svf in files:
+                play(Ch347_JTAGInterface(device=device), svf)
+    """
+    if serial is not None:
+        record = ch347(dll_path=dll_path).find_device(serial)
+        if record is None:
+            raise OSError(f"No CH347 device with serial {serial}")
+        device_index = record.index
+    device = ch347(device_index, dll_path)
+    if not device.open_device():
+        raise OSError(f"Failed to open CH347 device {device_index}")
+    if clock_index is not None:
+        device.jtag_init(clock_index)
+    return device
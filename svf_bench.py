@@ -0,0 +1,269 @@
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional, Sequence
+
+from py_ch347_libarary import FakeUSBEndpoints, ch347_usb
+import svf_transcode
+from svf_parse import (TAP_TRANSITIONS, BitVector, JTAGController, JTAGHardwareInterface, SVFCommandType, SVFParser,
+                       SVFPlayer)
+from svf_sim import SimulatedJTAGInterface
+from svf_transcode import hex_to_packed, packed_to_hex
+
+SVF_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "TestFile", "flow_led_bit.svf")
+DEFAULT_SIZES = "1M,16M"
+LINE_WIDTH = 254  # 与 Vivado 导出的 SVF 相同的行宽
+SDR_BITS = 4 << 20  # 生成文件中每条 SDR 的位数
+GOTO_STATE_COUNTS = (10000, 100000, 300000)  # 状态切换基准的切换总数
+GOTO_STATE_BATCH = 4  # 每次发送前的状态切换数，对应 STATE 语句或扫描之间的路径
+
+_SIZE_SUFFIX = {'K': 1 << 10, 'M': 1 << 20, 'G': 1 << 30}
+
+_HEADER = (
+    "TRST OFF;\nENDIR IDLE;\nENDDR IDLE;\nSTATE RESET;\nSTATE IDLE;\n"
+    "FREQUENCY 1.00E+07 HZ;\n"
+    "SIR 6 TDI (09) ;\nSDR 32 TDI (00000000) TDO (0362d093) MASK (0fffffff) ;\n"
+    "SIR 6 TDI (05) ;\n"
+)
+
+
+def parse_size(text: str) -> int:
+    """'16M' -> 16777216"""
+    text = text.strip().upper()
+    if text and text[-1] in _SIZE_SUFFIX:
+        return int(float(text[:-1]) * _SIZE_SUFFIX[text[-1]])
+    return int(text)
+
+
+def format_size(size: int) -> str:
+    for suffix in ('G', 'M', 'K'):
+        if size >= _SIZE_SUFFIX[suffix] and size % _SIZE_SUFFIX[suffix] == 0:
+            return f"{size // _SIZE_SUFFIX[suffix]}{suffix}"
+    return str(size)
+
+
+def generate_svf(filename: str, size: int, seed: int = 0) -> str:
+    """生成约 size 字节、结构与 Vivado 导出文件相同的 SVF：IDCODE 校验后是若干条 CFG_IN 的大 SDR"""
+    rng = random.Random(seed)
+    hex_chars = SDR_BITS // 4
+    written = 0
+    with open(filename, 'w', newline='\n') as f:
+        f.write(_HEADER)
+        written += len(_HEADER)
+        while written < size:
+            chars = min(hex_chars, max(8, (size - written) // 8 * 8))
+            payload = rng.getrandbits(chars * 4).to_bytes(chars // 2, 'little').hex()
+            head = f"SDR {chars * 4} TDI ("
+            lines = [head + payload[:LINE_WIDTH - len(head)]]
+            lines += [payload[i:i + LINE_WIDTH] for i in range(LINE_WIDTH - len(head), len(payload), LINE_WIDTH)]
+            text = "\n".join(lines) + ") ;\n"
+            f.write(text)
+            written += len(text)
+    return filename
+
+
+def ensure_generated(workdir: str, size: int) -> str:
+    filename = os.path.join(workdir, f"bench_{format_size(size)}.svf")
+    if not os.path.exists(filename) or os.path.getsize(filename) < size:
+        generate_svf(filename, size)
+    return filename
+
+
+def _best_of(repeat: int, func: Callable[[], None]) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench_parser(filename: str, repeat: int) -> Dict:
+    size = os.path.getsize(filename)
+
+    def run():
+        for _ in SVFParser().iter_file(filename):
+            pass
+
+    seconds = _best_of(repeat, run)
+    return {"bytes": size, "seconds": seconds, "mb_per_s": size / seconds / 1e6}
+
+
+def bench_transcode(filename: str, repeat: int) -> Dict:
+    """
+    文件中最大数据段（flow_led_bit.svf 为 5 Mbit 的 CFG_IN SDR）的十六进制 <-> LSB-first 字节转换速度，
+    按十六进制字节计；分别测量标准库与 NumPy 实现
+    """
+    payload = max((c.tdi for c in SVFParser().iter_file(filename)
+                   if c.cmd_type == SVFCommandType.SDR), key=lambda bits: bits.length)
+    length = payload.length
+    hex_data = packed_to_hex(payload.data, length).encode('ascii')
+    implementations = {"stdlib": (hex_to_packed, packed_to_hex)}
+    if svf_transcode.np is not None:
+        implementations["numpy"] = (svf_transcode.hex_to_packed_numpy, svf_transcode.packed_to_hex_numpy)
+    result = {"bits": length, "bytes": len(hex_data)}
+    for name, (to_packed, to_hex) in implementations.items():
+        seconds = _best_of(repeat, lambda: to_packed(hex_data, length))
+        result[f"{name}_to_packed_mb_per_s"] = len(hex_data) / seconds / 1e6
+        seconds = _best_of(repeat, lambda: to_hex(payload.data, length))
+        result[f"{name}_to_hex_mb_per_s"] = len(hex_data) / seconds / 1e6
+    return result
+
+
+def bench_goto_state(counts: Sequence[int], repeat: int, batch: int = GOTO_STATE_BATCH) -> Dict:
+    """
+    控制器路径查找与 TMS 合并的稳态速度：与实际播放相同，每 batch 次状态切换后发送一次（相当于一次扫描前的 flush）。
+    按多个切换总数分别测量，每次切换的开销随总数增长时说明有累积状态。
+    """
+    rng = random.Random(2)
+    states = list(TAP_TRANSITIONS)
+    runs = {}
+    for transitions in counts:
+        targets = [rng.choice(states) for _ in range(transitions)]
+        controller = JTAGController(verbose=False)
+        # 空实现的后端：只测控制器的路径查找与 TMS 合并
+        controller.set_hardware_interface(JTAGHardwareInterface())
+
+        def run():
+            for start in range(0, transitions, batch):
+                for state in targets[start:start + batch]:
+                    controller.goto_state(state)
+                controller.flush()
+
+        seconds = _best_of(repeat, run)
+        runs[str(transitions)] = {"transitions": transitions, "seconds": seconds,
+                                  "transitions_per_s": transitions / seconds}
+    return {"batch": batch, "runs": runs}
+
+
+def bench_verify(bits: int, repeat: int) -> Dict:
+    rng = random.Random(3)
+    expected = BitVector.from_int(rng.getrandbits(bits), bits)
+    received = BitVector(bytes(expected), bits)
+    mask = BitVector.ones(bits)
+    controller = JTAGController(verbose=False)
+    seconds = _best_of(repeat, lambda: controller._verify_tdo(received, expected, mask, bits))
+    return {"bits": bits, "seconds": seconds, "bits_per_s": bits / seconds}
+
+
+def bench_usb_transport(bits: int, repeat: int) -> Dict:
+    """原生 USB 传输的命令包编码速度（内存端点，不含 USB 耗时）：一次写出与一次带回读的扫描"""
+    data = bytearray(random.Random(4).getrandbits(bits).to_bytes((bits + 7) // 8, 'little'))
+    device = ch347_usb(endpoints=FakeUSBEndpoints())
+    device.open_device()
+    write_seconds = _best_of(repeat, lambda: device.jtag_ioscan(data, bits, False))
+    read_seconds = _best_of(repeat, lambda: device.jtag_ioscan(data, bits, True))
+    return {"bits": bits, "write_seconds": write_seconds, "read_seconds": read_seconds,
+            "write_mbit_per_s": bits / write_seconds / 1e6, "read_mbit_per_s": bits / read_seconds / 1e6}
+
+
+def bench_playback(filename: str, repeat: int, streaming: bool = False) -> Dict:
+    """对模拟后端（零延迟）端到端播放；耗时全部为主机侧开销"""
+    size = os.path.getsize(filename)
+    result = {}
+
+    def run():
+        hw_iface = SimulatedJTAGInterface(call_latency=0.0, bandwidth=float('inf'))
+        controller = JTAGController(verbose=False)
+        controller.set_hardware_interface(hw_iface)
+        player = SVFPlayer(controller)
+        player.set_streaming(streaming)
+        result["passed"] = player.play_svf(filename)
+        result["bits_shifted"] = hw_iface.bits_shifted
+
+    seconds = _best_of(repeat, run)
+    result.update({"bytes": size, "seconds": seconds, "mb_per_s": size / seconds / 1e6,
+                   "mbit_shifted_per_s": result["bits_shifted"] / seconds / 1e6})
+    return result
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(sizes: List[int], workdir: str, repeat: int = 3, playback: bool = True) -> Dict:
+    inputs = {"flow_led_bit": SVF_FILE}
+    for size in sizes:
+        inputs[format_size(size)] = ensure_generated(workdir, size)
+
+    results = {
+        "parser": {name: bench_parser(path, repeat) for name, path in inputs.items()},
+        "transcode": bench_transcode(SVF_FILE, repeat),
+        "goto_state": bench_goto_state(GOTO_STATE_COUNTS, repeat),
+        "verify_tdo": bench_verify(5140160, repeat),
+        "usb_transport": bench_usb_transport(5140160, repeat),
+    }
+    if playback:
+        results["playback"] = {name: bench_playback(path, repeat) for name, path in inputs.items()}
+        results["playback_stream"] = {name: bench_playback(path, repeat, True) for name, path in inputs.items()}
+
+    try:
+        import numpy
+        numpy_version = numpy.__version__
+    except ImportError:
+        numpy_version = None
+    return {
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "numpy": numpy_version,
+        "repeat": repeat,
+        "results": results,
+    }
+
+
+def print_report(report: Dict):
+    results = report["results"]
+    for name, r in results["parser"].items():
+        print(f"parser      {name:>14}: {r['mb_per_s']:9.2f} MB/s")
+    for key, value in results['transcode'].items():
+        if key.endswith("_mb_per_s"):
+            name = key[:-len("_mb_per_s")].replace("_to_", " -> ")
+            print(f"transcode   {name:>14}: {value:9.2f} MB/s")
+    for name, r in results['goto_state']['runs'].items():
+        print(f"goto_state  {name:>14}: {r['transitions_per_s']:9.0f} transitions/s")
+    print(f"verify_tdo  {'':>14}: {results['verify_tdo']['bits_per_s'] / 1e6:9.1f} Mbit/s")
+    usb = results['usb_transport']
+    print(f"usb_encode  {'write/read':>14}: {usb['write_mbit_per_s']:9.1f} / {usb['read_mbit_per_s']:.1f} Mbit/s")
+    for key in ("playback", "playback_stream"):
+        for name, r in results.get(key, {}).items():
+            status = "" if r["passed"] else "  (FAILED)"
+            print(f"{key:<15} {name:>10}: {r['mb_per_s']:9.2f} MB/s, {r['mbit_shifted_per_s']:8.1f} Mbit/s shifted{status}")
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="svf_bench.py", description="Benchmark SVF parsing, conversion and playback")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES,
+                        help=f"comma separated sizes of generated SVF files, e.g. 1M,64M,1G (default: {DEFAULT_SIZES})")
+    parser.add_argument("--workdir", default=os.path.join(tempfile.gettempdir(), "ch347_svf_bench"),
+                        help="directory for generated SVF files (reused between runs)")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per benchmark, best time is reported (default: 3)")
+    parser.add_argument("--no-playback", action="store_true", help="skip the end-to-end playback benchmarks")
+    parser.add_argument("-o", "--output", help="write results as JSON to this file")
+    args = parser.parse_args()
+
+    os.makedirs(args.workdir, exist_ok=True)
+    sizes = [parse_size(size) for size in args.sizes.split(",") if size.strip()]
+    report = run_suite(sizes, args.workdir, max(1, args.repeat), not args.no_playback)
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
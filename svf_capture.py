@@ -0,0 +1,169 @@
+import mmap
+import struct
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+# TDO 捕获文件：
+#   数据文件  各次扫描的 TDO 依次首尾相接，每段 ceil(bits/8) 字节 LSB-first（第 0 字节 bit0 最先移出），
+#             最后一个字节中超出 bits 的高位清零；不含文件头，可直接按偏移读取
+#   索引文件  <数据文件>.idx：magic(8)，之后每次扫描一条记录 line(u32) kind(u8) bits(u64) offset(u64)
+CAPTURE_MAGIC = b'SVFTDO\x01\x00'
+INDEX_SUFFIX = '.idx'
+
+_RECORD = struct.Struct('<IBQQ')
+_KINDS = ('IR', 'DR')
+
+
+class CaptureRecord(NamedTuple):
+    line: int
+    kind: str
+    bits: int
+    offset: int
+
+
+class TDOCapture:
+    """
+    把回读的 TDO 按扫描顺序写入二进制文件并记录索引，用于配置回读、SPI Flash 转储等离线分析。
+    数据直接写出（缓冲 I/O，无十六进制转换），写完即丢弃，占用内存与回读总量无关。
+
+    默认捕获每条回读了 TDO 的 SDR（include_ir=True 时也包括 SIR）；
+    给出 lines 时只捕获这些 SVF 行号上的扫描，即使命令中没有 TDO 也强制回读。
+    HIR/HDR 等填充位不写入，只保留命令本身的 length 位。
+    分块回读的长扫描经 begin() 逐块写入，整段回读不必先在内存中拼接。
+    """
+
+    def __init__(self, filename: str, lines: Optional[Iterable[int]] = None, include_ir: bool = False,
+                 buffer_size: int = 1 << 20):
+        self.filename = filename
+        self.index_filename = filename + INDEX_SUFFIX
+        self.lines = frozenset(lines) if lines is not None else None
+        self.include_ir = include_ir
+        self.records = 0
+        self.offset = 0
+        self._data = open(filename, 'wb', buffering=buffer_size)
+        self._index = open(self.index_filename, 'wb')
+        self._index.write(CAPTURE_MAGIC)
+
+    def wants(self, kind: str, line: int, is_read: bool) -> bool:
+        """该扫描是否需要捕获；返回 True 时控制器会强制回读 TDO"""
+        if self.lines is not None:
+            return line in self.lines
+        return is_read and (kind == 'DR' or self.include_ir)
+
+    def write(self, line: int, kind: str, data, bits: int):
+        self._write_bits(memoryview(data)[:(bits + 7) // 8], bits)
+        self._add_record(line, kind, bits)
+
+    def begin(self, line: int, kind: str, bits: int, skip: int = 0) -> 'CaptureStream':
+        """开始逐块写入一次扫描：依次传入整个扫描（含填充位）的 TDO，跳过前 skip 位，保留其后 bits 位"""
+        return CaptureStream(self, line, kind, bits, skip)
+
+    def _write_bits(self, view: memoryview, bits: int):
+        if bits & 7:
+            self._data.write(view[:-1])
+            self._data.write(bytes((view[-1] & ((1 << (bits & 7)) - 1),)))
+        else:
+            self._data.write(view)
+
+    def _add_record(self, line: int, kind: str, bits: int):
+        self._index.write(_RECORD.pack(line, _KINDS.index(kind), bits, self.offset))
+        self.offset += (bits + 7) // 8
+        self.records += 1
+
+    def close(self):
+        self._data.close()
+        self._index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+class CaptureStream:
+    """
+    一次扫描的逐块写入，由 TDOCapture.begin() 创建。每块 TDO 到达后立即写入数据文件，
+    内存中最多保留不足一个字节的剩余位；close() 时补齐最后一个字节并写入索引记录。
+    """
+
+    def __init__(self, capture: TDOCapture, line: int, kind: str, bits: int, skip: int = 0):
+        self.capture = capture
+        self.line = line
+        self.kind = kind
+        self.bits = bits
+        self._skip = skip
+        self._remaining = bits
+        self._pending = 0       # 头部跳过位数不是 8 的倍数时，尚未凑满一个字节的位
+        self._pending_bits = 0
+        self._written = 0       # 已写出的字节数
+
+    def write(self, chunk):
+        if self._remaining <= 0:
+            return
+        view = memoryview(chunk).cast('B')
+        if self._skip >= 8:
+            skipped = min(self._skip >> 3, len(view))
+            view = view[skipped:]
+            self._skip -= skipped * 8
+        if not view:
+            return
+        if not self._skip and not self._pending_bits:
+            # 按字节对齐：直接写出，最后一段由 _write_bits 清除多余的高位
+            take = min(len(view) * 8, self._remaining)
+            self.capture._write_bits(view[:(take + 7) // 8], take)
+            self._written += (take + 7) // 8
+            self._remaining -= take
+            return
+        value = int.from_bytes(view, 'little') >> self._skip
+        count = len(view) * 8 - self._skip
+        self._skip = 0
+        value = self._pending | value << self._pending_bits
+        count = min(count + self._pending_bits, self._remaining)
+        whole = count >> 3
+        self.capture._data.write((value & ((1 << (whole * 8)) - 1)).to_bytes(whole, 'little'))
+        self._pending = (value >> (whole * 8)) & ((1 << (count & 7)) - 1)
+        self._pending_bits = count & 7
+        self._written += whole
+        self._remaining -= whole * 8
+
+    def close(self):
+        if self._pending_bits:
+            self.capture._data.write(bytes((self._pending,)))
+            self._written += 1
+            self._pending_bits = 0
+        missing = (self.bits + 7) // 8 - self._written
+        if missing > 0:
+            # 回读不足 bits 位（扫描中途出错），以 0 补齐，保持索引与数据对应
+            self.capture._data.write(bytes(missing))
+        self._remaining = 0
+        self.capture._add_record(self.line, self.kind, self.bits)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+def read_index(filename: str) -> List[CaptureRecord]:
+    """读取 <filename>.idx 中的全部记录"""
+    with open(filename + INDEX_SUFFIX, 'rb') as f:
+        if f.read(len(CAPTURE_MAGIC)) != CAPTURE_MAGIC:
+            raise ValueError(f"{filename + INDEX_SUFFIX}: not a TDO capture index")
+        body = f.read()
+    usable = len(body) - len(body) % _RECORD.size
+    return [CaptureRecord(line, _KINDS[kind], bits, offset)
+            for line, kind, bits, offset in _RECORD.iter_unpack(body[:usable])]
+
+
+def iter_capture(filename: str) -> Iterator[Tuple[CaptureRecord, bytes]]:
+    """依次返回 (记录, TDO 字节)；数据文件以 mmap 映射，每次只复制当前一段，内存占用与文件大小无关"""
+    records = read_index(filename)
+    with open(filename, 'rb') as f:
+        if not records or f.seek(0, 2) == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            for record in records:
+                yield record, mapped[record.offset:record.offset + (record.bits + 7) // 8]
@@ -0,0 +1,59 @@
+import argparse
+import json
+import os
+import socket
+import sys
+from typing import Dict
+
+from svf_daemon import DEFAULT_SOCKET
+
+
+def request(message: Dict, socket_path: str = DEFAULT_SOCKET, timeout: float = None) -> Dict:
+    """向 svf_daemon 发送一条请求并等待响应"""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(socket_path)
+        sock.sendall(json.dumps(message).encode('utf-8') + b"\n")
+        with sock.makefile('rb') as f:
+            line = f.readline()
+    if not line:
+        raise ConnectionError("daemon closed the connection")
+    return json.loads(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="svf_client.py", description="Submit jobs to a running svf_daemon.py")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET, help=f"Unix socket path (default: {DEFAULT_SOCKET})")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    program = sub.add_parser("program", help="program one board")
+    program.add_argument("svf_file", help="SVF file to play")
+    program.add_argument("--device", type=int, default=0, help="CH347 device index (default: 0)")
+    program.add_argument("--max-errors", type=int, default=1, help="abort after this many TDO errors (default: 1)")
+    sub.add_parser("status", help="show open adapters and cached programs")
+    sub.add_parser("shutdown", help="stop the daemon")
+    args = parser.parse_args()
+
+    message = {"cmd": args.cmd}
+    if args.cmd == "program":
+        message.update(svf=os.path.abspath(args.svf_file), device=args.device, max_errors=args.max_errors)
+    try:
+        response = request(message, args.socket)
+    except OSError as e:
+        print(f"Error: cannot reach daemon at {args.socket}: {e}")
+        return 2
+
+    if not response.get("ok"):
+        print(f"Error: {response.get('error')}")
+        return 1
+    if args.cmd == "program":
+        status = "PASS" if response["passed"] else "FAIL"
+        cache = "cached" if response["cache_hit"] else "compiled"
+        print(f"adapter {response['device']}: {status}, errors {response['errors']}, "
+              f"{response['seconds']:.2f} s ({cache}, load {response['load_seconds'] * 1e3:.1f} ms)")
+        return 0 if response["passed"] else 1
+    print(json.dumps(response, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
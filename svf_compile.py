@@ -0,0 +1,305 @@
+import argparse
+import hashlib
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import time
+from typing import Iterator, Optional
+
+from svf_parse import DEFAULT_CACHE_DIR, BitVector, SVFCommand, SVFCommandType, SVFParser, TapState
+
+# .svfc 编译文件格式（小端）：
+#   文件头  magic(4) version(u16) reserved(u16) sha256(32) command_count(u32)
+#   每条命令 opcode(u8) flags(u8) line_num(u32) raw_len(u16) raw_line(raw_len) 参数...
+# 扫描类命令的 TDI/TDO/MASK/SMASK 已按 jtag_ioscan 需要的 LSB-first 字节序打包，
+# 每段长度为 ceil(length/8)，加载时以 mmap 切片构造 BitVector，无需再转换。
+SVFC_MAGIC = b'SVFC'
+SVFC_VERSION = 2
+SVFC_SUFFIX = '.svfc'
+# 缓存目录中 .svfc 的总大小上限与最长未使用时间，编译新文件后按最近使用时间淘汰
+DEFAULT_CACHE_MAX_BYTES = 4 << 30
+DEFAULT_CACHE_MAX_AGE = 30 * 24 * 3600
+
+_HEADER = struct.Struct('<4sHH32sI')
+_RECORD = struct.Struct('<BBIH')
+_U8 = struct.Struct('<B')
+_U64 = struct.Struct('<Q')
+_F64 = struct.Struct('<d')
+_RUNTEST = struct.Struct('<QddB')
+
+_SCAN_TYPES = (SVFCommandType.SIR, SVFCommandType.SDR, SVFCommandType.HIR,
+               SVFCommandType.TIR, SVFCommandType.HDR, SVFCommandType.TDR)
+_PAYLOAD_KEYS = ('tdi', 'tdo', 'mask', 'smask')
+
+# flags 位定义
+_HAS_LENGTH = 0x10
+_HAS_VALUE = 0x20  # FREQUENCY 频率 / RUNTEST 的 max_time / ENDIR、ENDDR 的状态
+
+
+def file_digest(filename: str, block_size: int = 1 << 20) -> bytes:
+    """计算源文件的 SHA-256，用作缓存键"""
+    digest = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.digest()
+
+
+def _encode_command(command: SVFCommand) -> bytes:
+    flags = 0
+    body = []
+    cmd_type = command.cmd_type
+
+    if cmd_type in _SCAN_TYPES and command.length is not None:
+        flags |= _HAS_LENGTH
+        body.append(_U64.pack(command.length))
+        for bit, key in enumerate(_PAYLOAD_KEYS):
+            data = getattr(command, key)
+            if data is not None:
+                flags |= 1 << bit
+                body.append(bytes(data.data))
+
+    elif cmd_type in (SVFCommandType.ENDIR, SVFCommandType.ENDDR):
+        if command.state is not None:
+            flags |= _HAS_VALUE
+            body.append(_U8.pack(command.state.value))
+
+    elif cmd_type == SVFCommandType.STATE:
+        states = command.states or []
+        body.append(_U8.pack(len(states)))
+        body.append(bytes(state.value for state in states))
+
+    elif cmd_type == SVFCommandType.FREQUENCY:
+        if command.frequency is not None:
+            flags |= _HAS_VALUE
+            body.append(_F64.pack(command.frequency))
+
+    elif cmd_type == SVFCommandType.RUNTEST:
+        if command.max_time is not None:
+            flags |= _HAS_VALUE
+        body.append(_RUNTEST.pack(command.run_count, command.min_time,
+                                  command.max_time or 0.0, command.end_state.value))
+
+    elif cmd_type == SVFCommandType.TRST:
+        mode = (command.mode or '').encode('ascii')
+        body.append(_U8.pack(len(mode)))
+        body.append(mode)
+
+    raw = command.raw_line.encode('utf-8')[:0xFFFF]
+    return _RECORD.pack(cmd_type.value, flags, command.line_num, len(raw)) + raw + b''.join(body)
+
+
+def compile_svf(source: str, output: str, parser: Optional[SVFParser] = None, digest: Optional[bytes] = None) -> int:
+    """将 SVF 编译为 .svfc 文件，返回写入的命令数；先写临时文件再原子替换"""
+    if parser is None:
+        parser = SVFParser()
+    if digest is None:
+        digest = file_digest(source)
+
+    out_dir = os.path.dirname(os.path.abspath(output))
+    os.makedirs(out_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(suffix=SVFC_SUFFIX + '.tmp', dir=out_dir)
+    count = 0
+    try:
+        with os.fdopen(fd, 'wb', buffering=1 << 20) as f:
+            f.write(_HEADER.pack(SVFC_MAGIC, SVFC_VERSION, 0, digest, 0))
+            for command in parser.iter_file(source):
+                # 注释不影响执行，不写入编译文件
+                if command.cmd_type == SVFCommandType.COMMENT:
+                    continue
+                f.write(_encode_command(command))
+                count += 1
+            f.seek(0)
+            f.write(_HEADER.pack(SVFC_MAGIC, SVFC_VERSION, 0, digest, count))
+        os.replace(tmp_path, output)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return count
+
+
+class CompiledSVF:
+    """
+    以 mmap 打开的 .svfc 文件；命令按需解码，扫描数据为 mmap 的零拷贝切片。
+    用完后调用 close()（或用 with）解除映射，Windows 上映射期间文件无法删除或替换。
+    """
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        with open(filename, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mm)
+        if len(self._mm) < _HEADER.size:
+            raise ValueError(f"{filename}: truncated SVFC header")
+        magic, version, _, self.digest, self.command_count = _HEADER.unpack_from(self._mm, 0)
+        if magic != SVFC_MAGIC or version != SVFC_VERSION:
+            raise ValueError(f"{filename}: not an SVFC v{SVFC_VERSION} file")
+
+    def __len__(self):
+        return self.command_count
+
+    def close(self):
+        """解除映射；已解码的命令仍引用扫描数据时，映射在最后一个引用释放后自动解除"""
+        if self._mm is None:
+            return
+        self._view.release()
+        try:
+            self._mm.close()
+        except BufferError:
+            pass
+        self._view = None
+        self._mm = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def __iter__(self) -> Iterator[SVFCommand]:
+        return self.iter_commands()
+
+    def iter_commands(self) -> Iterator[SVFCommand]:
+        view = self._view
+        pos = _HEADER.size
+        for _ in range(self.command_count):
+            opcode, flags, line_num, raw_len = _RECORD.unpack_from(view, pos)
+            pos += _RECORD.size
+            raw_line = bytes(view[pos:pos + raw_len]).decode('utf-8')
+            pos += raw_len
+            cmd_type = SVFCommandType(opcode)
+            command = SVFCommand(cmd_type, line_num, raw_line)
+
+            if flags & _HAS_LENGTH:
+                (length,) = _U64.unpack_from(view, pos)
+                pos += _U64.size
+                byte_length = (length + 7) // 8
+                command.length = length
+                for bit, key in enumerate(_PAYLOAD_KEYS):
+                    if flags & (1 << bit):
+                        setattr(command, key, BitVector(view[pos:pos + byte_length], length))
+                        pos += byte_length
+
+            elif cmd_type in (SVFCommandType.ENDIR, SVFCommandType.ENDDR):
+                if flags & _HAS_VALUE:
+                    command.state = TapState(view[pos])
+                    pos += 1
+
+            elif cmd_type == SVFCommandType.STATE:
+                count = view[pos]
+                command.states = [TapState(value) for value in view[pos + 1:pos + 1 + count]]
+                pos += 1 + count
+
+            elif cmd_type == SVFCommandType.FREQUENCY:
+                if flags & _HAS_VALUE:
+                    (command.frequency,) = _F64.unpack_from(view, pos)
+                    pos += _F64.size
+
+            elif cmd_type == SVFCommandType.RUNTEST:
+                run_count, min_time, max_time, end_state = _RUNTEST.unpack_from(view, pos)
+                pos += _RUNTEST.size
+                command.run_count = run_count
+                command.min_time = min_time
+                command.end_state = TapState(end_state)
+                if flags & _HAS_VALUE:
+                    command.max_time = max_time
+
+            elif cmd_type == SVFCommandType.TRST:
+                size = view[pos]
+                command.mode = bytes(view[pos + 1:pos + 1 + size]).decode('ascii')
+                pos += 1 + size
+
+            yield command
+
+
+class SVFCache:
+    """
+    按源文件 SHA-256 缓存编译结果。命中时把访问时间更新为当前时间（修改时间不变）作为最近使用时间；
+    每次编译新文件后删除超过 max_age 秒未使用的 .svfc，并从最久未使用的开始删除直到总大小不超过 max_bytes。
+    """
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, verbose: bool = False,
+                 max_bytes: int = DEFAULT_CACHE_MAX_BYTES, max_age: float = DEFAULT_CACHE_MAX_AGE):
+        self.cache_dir = cache_dir
+        self.verbose = verbose
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+
+    def path_for(self, digest: bytes) -> str:
+        return os.path.join(self.cache_dir, digest.hex() + SVFC_SUFFIX)
+
+    def load(self, source: str, parser: Optional[SVFParser] = None) -> CompiledSVF:
+        """命中缓存则直接映射，否则先编译再映射"""
+        if source.endswith(SVFC_SUFFIX):
+            return CompiledSVF(source)
+
+        digest = file_digest(source)
+        path = self.path_for(digest)
+        if os.path.exists(path):
+            try:
+                compiled = CompiledSVF(path)
+                if compiled.digest == digest:
+                    if self.verbose:
+                        print(f"Using compiled SVF cache: {path}")
+                    os.utime(path, (time.time(), os.stat(path).st_mtime))
+                    return compiled
+            except (ValueError, struct.error) as e:
+                if self.verbose:
+                    print(f"Ignoring invalid SVF cache {path}: {e}")
+
+        if self.verbose:
+            print(f"Compiling SVF to cache: {path}")
+        compile_svf(source, path, parser, digest)
+        self.prune(keep=path)
+        return CompiledSVF(path)
+
+    def prune(self, keep: Optional[str] = None) -> int:
+        """按大小上限与未使用时间淘汰缓存文件（不删除 keep），返回删除的文件数"""
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith(SVFC_SUFFIX) and entry.is_file():
+                stat = entry.stat()
+                entries.append((max(stat.st_atime, stat.st_mtime), stat.st_size, entry.path))
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        expire = time.time() - self.max_age
+        removed = 0
+        for used, size, path in entries:
+            if total <= self.max_bytes and used >= expire:
+                continue
+            if keep is not None and os.path.abspath(path) == os.path.abspath(keep):
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            if self.verbose:
+                print(f"Removed SVF cache {path}")
+            total -= size
+            removed += 1
+        return removed
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="svf_compile.py", description="Compile an SVF file to the binary .svfc format")
+    parser.add_argument("svf_file", help="SVF file to compile")
+    parser.add_argument("-o", "--output", help="output file (default: <cache dir>/<sha256>.svfc)")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help=f"cache directory (default: {DEFAULT_CACHE_DIR})")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.svf_file):
+        print(f"Error: File '{args.svf_file}' not found")
+        return 1
+
+    digest = file_digest(args.svf_file)
+    output = args.output or SVFCache(args.cache_dir).path_for(digest)
+    count = compile_svf(args.svf_file, output, digest=digest)
+    print(f"Compiled {count} commands: {args.svf_file} -> {output} ({os.path.getsize(output)} bytes)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
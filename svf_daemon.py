@@ -0,0 +1,238 @@
+import argparse
+import collections
+import json
+import os
+import socketserver
+import sys
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from svf_parse import (DEFAULT_CACHE_DIR, JTAGController, JTAGHardwareInterface, SVFCommand, SVFPlayer,
+                       TapState)
+
+DEFAULT_SOCKET = os.path.join(DEFAULT_CACHE_DIR, "svf_daemon.sock")
+DEFAULT_CACHE_BYTES = 512 << 20
+
+# 协议：每个请求/响应为一行 JSON
+#   {"cmd": "program", "svf": "/abs/path.svf", "device": 0, "max_errors": 1}
+#   {"cmd": "status"}
+#   {"cmd": "shutdown"}
+
+
+class ProgramCache:
+    """
+    已编译 SVF 的 LRU 缓存，按编译文件大小计算占用，超过 max_bytes 时淘汰最久未用的程序。
+    以 (路径, mtime, 大小) 为键，命中时无需读取源文件；未命中时经 SVFCache 按 SHA-256 编译或映射。
+    淘汰或 clear() 时关闭对应的 .svfc 映射。
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_CACHE_BYTES, cache_dir: str = DEFAULT_CACHE_DIR):
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()  # key -> (commands, size, CompiledSVF)
+        self._lock = threading.Lock()
+
+    def get(self, svf_file: str) -> Tuple[List[SVFCommand], bool]:
+        stat = os.stat(svf_file)
+        key = (os.path.abspath(svf_file), stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0], True
+
+        from svf_compile import SVFCache
+        compiled = SVFCache(self.cache_dir).load(svf_file)
+        commands = list(compiled.iter_commands())
+        size = os.path.getsize(compiled.filename)
+
+        evicted = []
+        with self._lock:
+            self.misses += 1
+            if key in self._entries:
+                evicted.append(compiled)
+            else:
+                self._entries[key] = (commands, size, compiled)
+                self.total_bytes += size
+                while self.total_bytes > self.max_bytes and len(self._entries) > 1:
+                    _, (_, evicted_size, evicted_program) = self._entries.popitem(last=False)
+                    self.total_bytes -= evicted_size
+                    evicted.append(evicted_program)
+        # 正在执行的任务仍引用其命令时，映射在任务结束后解除
+        for program in evicted:
+            program.close()
+        return commands, False
+
+    def clear(self):
+        """清空缓存并关闭全部映射"""
+        with self._lock:
+            entries = list(self._entries.values())
+            self._entries.clear()
+            self.total_bytes = 0
+        for _, _, compiled in entries:
+            compiled.close()
+
+    def status(self) -> Dict:
+        with self._lock:
+            return {"programs": [key[0] for key in self._entries], "bytes": self.total_bytes,
+                    "max_bytes": self.max_bytes, "hits": self.hits, "misses": self.misses}
+
+
+def open_ch347(device_index: int, batch: bool = False) -> JTAGHardwareInterface:
+    from svf_gang import open_ch347 as open_device
+    return open_device(device_index, batch)
+
+
+class SVFDaemon:
+    """
+    常驻烧录服务：适配器打开并完成 jtag_init 后一直保持，编译好的程序保存在 LRU 缓存中。
+    每个适配器同一时间只执行一个任务，不同适配器的任务可并行；服务停止时关闭全部适配器。
+    未给出 open_interface 时打开 CH347，batch 为 True 时启用批量模式。
+    """
+
+    def __init__(self, socket_path: str = DEFAULT_SOCKET,
+                 open_interface: Optional[Callable[[int], JTAGHardwareInterface]] = None,
+                 cache: Optional[ProgramCache] = None, batch: bool = False):
+        self.socket_path = socket_path
+        if open_interface is None:
+            open_interface = lambda device_index: open_ch347(device_index, batch)
+        self.open_interface = open_interface
+        self.cache = cache if cache is not None else ProgramCache()
+        self.jobs = 0
+        self._devices = {}  # device_index -> (hw_iface, lock)
+        self._devices_lock = threading.Lock()
+        self._server = None
+
+    def _device(self, device_index: int):
+        with self._devices_lock:
+            entry = self._devices.get(device_index)
+            if entry is None:
+                entry = self._devices[device_index] = (self.open_interface(device_index), threading.Lock())
+            return entry
+
+    def program(self, svf_file: str, device_index: int = 0, max_errors: int = 1) -> Dict:
+        start = time.perf_counter()
+        commands, cache_hit = self.cache.get(svf_file)
+        load_time = time.perf_counter() - start
+        hw_iface, lock = self._device(device_index)
+        with lock:
+            # 接口被复用：不沿用上一个任务的 FREQUENCY，TAP 也从复位状态开始
+            hw_iface.reset_clock()
+            controller = JTAGController(verbose=False)
+            controller.set_hardware_interface(hw_iface)
+            controller.current_state = TapState.UNKNOWN
+            controller.goto_state(TapState.RESET)
+            player = SVFPlayer(controller)
+            player.set_max_errors(max_errors)
+            passed = player.play_commands(commands, len(commands))
+        with self._devices_lock:
+            self.jobs += 1
+        return {"ok": True, "passed": passed, "errors": controller.error_count, "device": device_index,
+                "cache_hit": cache_hit, "load_seconds": load_time, "seconds": time.perf_counter() - start}
+
+    def handle_request(self, request: Dict) -> Dict:
+        cmd = request.get("cmd")
+        try:
+            if cmd == "program":
+                return self.program(request["svf"], int(request.get("device", 0)), int(request.get("max_errors", 1)))
+            if cmd == "status":
+                with self._devices_lock:
+                    devices = sorted(self._devices)
+                return {"ok": True, "devices": devices, "jobs": self.jobs, "cache": self.cache.status()}
+            if cmd == "shutdown":
+                threading.Thread(target=self.shutdown, daemon=True).start()
+                return {"ok": True}
+            return {"ok": False, "error": f"unknown command: {cmd}"}
+        except Exception as e:
+            return {"ok": False, "error": str(e)}
+
+    def _make_server(self):
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        os.makedirs(os.path.dirname(os.path.abspath(self.socket_path)), exist_ok=True)
+        daemon = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                for line in self.rfile:
+                    try:
+                        request = json.loads(line)
+                    except ValueError as e:
+                        response = {"ok": False, "error": f"invalid request: {e}"}
+                    else:
+                        response = daemon.handle_request(request)
+                    self.wfile.write(json.dumps(response).encode('utf-8') + b"\n")
+
+        server = socketserver.ThreadingUnixStreamServer(self.socket_path, Handler)
+        server.daemon_threads = True
+        return server
+
+    def serve_forever(self):
+        self._server = self._make_server()
+        self._serve()
+
+    def start(self) -> threading.Thread:
+        """在后台线程中运行服务，返回后即可连接"""
+        self._server = self._make_server()
+        thread = threading.Thread(target=self._serve, daemon=True)
+        thread.start()
+        return thread
+
+    def _serve(self):
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+            self.close_devices()
+            self.cache.clear()
+
+    def close_devices(self):
+        """等待各适配器上的任务结束后关闭它们；之后的任务会重新打开适配器"""
+        with self._devices_lock:
+            devices, self._devices = self._devices, {}
+        for hw_iface, lock in devices.values():
+            with lock:
+                close = getattr(hw_iface, 'close', None)
+                if close is not None:
+                    close()
+
+    def shutdown(self):
+        if self._server is not None:
+            self._server.shutdown()
+        self.close_devices()
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="svf_daemon.py", description="Keep CH347 adapters open and serve programming jobs")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET, help=f"Unix socket path (default: {DEFAULT_SOCKET})")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR,
+                        help=f"directory for compiled .svfc files (default: {DEFAULT_CACHE_DIR})")
+    parser.add_argument("--cache-mb", type=int, default=DEFAULT_CACHE_BYTES >> 20,
+                        help=f"size limit of compiled programs kept in memory (default: {DEFAULT_CACHE_BYTES >> 20})")
+    parser.add_argument("--batch", action="store_true",
+                        help="queue JTAG operations into large USB bulk writes, flushing only for TDO readback")
+    parser.add_argument("--simulate", action="store_true", help="serve simulated targets instead of CH347 adapters")
+    args = parser.parse_args()
+
+    open_interface = None
+    if args.simulate:
+        from svf_sim import SimulatedJTAGInterface
+        open_interface = lambda device_index: SimulatedJTAGInterface()
+    daemon = SVFDaemon(args.socket, open_interface, ProgramCache(args.cache_mb << 20, args.cache_dir), args.batch)
+    print(f"Listening on {args.socket}")
+    try:
+        daemon.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,152 @@
+import argparse
+import concurrent.futures
+import os
+import sys
+import time
+from typing import Callable, List, Optional, Sequence
+
+from svf_parse import (DEFAULT_CACHE_DIR, Ch347_JTAGInterface, JTAGController, JTAGHardwareInterface, SVFCommand,
+                       SVFParser, SVFPlayer, ch347)
+
+
+class GangResult:
+    """单个适配器的烧录结果"""
+    __slots__ = ('device_index', 'passed', 'errors', 'seconds', 'message')
+
+    def __init__(self, device_index: int, passed: bool = False, errors: int = 0, seconds: float = 0.0,
+                 message: str = ""):
+        self.device_index = device_index
+        self.passed = passed
+        self.errors = errors
+        self.seconds = seconds
+        self.message = message
+
+    def __str__(self):
+        status = "PASS" if self.passed else "FAIL"
+        text = f"adapter {self.device_index:>2}: {status}  errors {self.errors:<3} {self.seconds:8.2f} s"
+        return f"{text}  {self.message}" if self.message else text
+
+
+def load_program(svf_file: str, cache_dir: Optional[str] = DEFAULT_CACHE_DIR) -> List[SVFCommand]:
+    """
+    解析（或从编译缓存映射）一次，返回供所有工作线程共享的只读命令列表。
+    使用缓存时扫描数据为 mmap 切片，不随适配器数量复制。
+    """
+    if cache_dir is not None or svf_file.endswith('.svfc'):
+        from svf_compile import SVFCache
+        return list(SVFCache(cache_dir or DEFAULT_CACHE_DIR).load(svf_file).iter_commands())
+    parser = SVFParser()
+    if not parser.parse_file(svf_file):
+        raise ValueError(f"failed to parse {svf_file}")
+    return parser.commands
+
+
+def open_ch347(device_index: int, batch: bool = False) -> JTAGHardwareInterface:
+    try:
+        hw_iface = Ch347_JTAGInterface(verbose=False, device=ch347(device_index))
+    except SystemExit:
+        # Ch347_JTAGInterface 打开失败时调用 exit()，在工作线程中转换为普通异常
+        raise RuntimeError("failed to open CH347 device")
+    if batch:
+        hw_iface.enable_batching()
+    return hw_iface
+
+
+def find_devices(serials: Optional[Sequence[str]] = None) -> List[int]:
+    """返回已连接适配器的设备序号；给出 serials 时只选择这些 DeviceID 的适配器"""
+    records = ch347().enumerate_devices()
+    if serials is None:
+        return [record.index for record in records]
+    by_serial = {record.device_id: record.index for record in records}
+    missing = [serial for serial in serials if serial not in by_serial]
+    if missing:
+        raise ValueError(f"adapters not found: {', '.join(missing)}")
+    return [by_serial[serial] for serial in serials]
+
+
+def _program_one(device_index: int, commands: Sequence[SVFCommand],
+                 open_interface: Callable[[int], JTAGHardwareInterface], max_errors: int) -> GangResult:
+    result = GangResult(device_index)
+    start = time.perf_counter()
+    hw_iface = None
+    try:
+        hw_iface = open_interface(device_index)
+        controller = JTAGController(verbose=False)
+        controller.set_hardware_interface(hw_iface)
+        player = SVFPlayer(controller)
+        player.set_max_errors(max_errors)
+        result.passed = player.play_commands(commands, len(commands))
+        result.errors = controller.error_count
+    except Exception as e:
+        result.message = str(e)
+    finally:
+        close = getattr(hw_iface, 'close', None)
+        if close is not None:
+            close()
+    result.seconds = time.perf_counter() - start
+    return result
+
+
+def run_gang(commands: Sequence[SVFCommand], device_indices: Sequence[int],
+             open_interface: Callable[[int], JTAGHardwareInterface] = open_ch347,
+             max_errors: int = 1) -> List[GangResult]:
+    """
+    每个适配器一个工作线程，各自拥有 JTAGController 与错误计数，共享同一份命令列表。
+    DLL 调用期间释放 GIL，因此 N 块板的总时间接近单块板的时间。
+    """
+    if not device_indices:
+        return []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=len(device_indices)) as pool:
+        futures = [pool.submit(_program_one, index, commands, open_interface, max_errors)
+                   for index in device_indices]
+        return [future.result() for future in futures]
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="svf_gang.py", description="Program several boards in parallel from one SVF")
+    parser.add_argument("svf_file", help="SVF file to play")
+    parser.add_argument("--devices", help="comma separated CH347 device indices (default: all connected adapters)")
+    parser.add_argument("--serials", help="comma separated adapter DeviceIDs to program")
+    parser.add_argument("--batch", action="store_true", help="queue JTAG operations into large USB bulk writes")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR,
+                        help=f"directory for compiled .svfc files (default: {DEFAULT_CACHE_DIR})")
+    parser.add_argument("--no-cache", action="store_true", help="parse the SVF instead of using the compiled cache")
+    parser.add_argument("--simulate", type=int, metavar="N", default=0,
+                        help="program N simulated targets instead of CH347 adapters")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.svf_file):
+        print(f"Error: File '{args.svf_file}' not found")
+        return 1
+
+    start = time.perf_counter()
+    commands = load_program(args.svf_file, None if args.no_cache else args.cache_dir)
+    print(f"Loaded {len(commands)} commands in {time.perf_counter() - start:.2f} s")
+
+    if args.simulate:
+        from svf_sim import SimulatedJTAGInterface
+        device_indices = list(range(args.simulate))
+        open_interface = lambda device_index: SimulatedJTAGInterface()
+    else:
+        if args.devices:
+            device_indices = [int(index) for index in args.devices.split(",")]
+        else:
+            device_indices = find_devices(args.serials.split(",") if args.serials else None)
+        open_interface = lambda device_index: open_ch347(device_index, args.batch)
+    if not device_indices:
+        print("No CH347 adapters found")
+        return 1
+
+    start = time.perf_counter()
+    results = run_gang(commands, device_indices, open_interface)
+    elapsed = time.perf_counter() - start
+
+    for result in results:
+        print(result)
+    passed = sum(result.passed for result in results)
+    print(f"{passed}/{len(results)} passed, total time {elapsed:.2f} s")
+    return 0 if passed == len(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,14 +1,60 @@
-import pytest
+import argparse
+import collections
+import concurrent.futures
+import gzip
+import json
+import math
 import re
 import sys
 import time
 import os
+import mmap
+import queue
+import threading
 from enum import Enum
-from typing import List, Tuple, Optional, Dict, Callable
+from typing import List, Tuple, Optional, Dict, Callable, Iterator
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
+try:
+    import lzma
+except ImportError:
+    lzma = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
 from py_ch347_libarary import *
+from svf_transcode import hex_to_packed, packed_to_hex
+from svf_verify import TDOVerifyResult, verify_tdo
+
+# 编译缓存等持久化数据的默认目录
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "ch347_svf")
+
+# 压缩格式的文件头；按文件内容识别，不依赖扩展名
+_COMPRESSION_MAGIC = ((b'\x1f\x8b', 'gzip'), (b'\xfd7zXZ\x00', 'xz'), (b'\x28\xb5\x2f\xfd', 'zstd'))
+
+
+def open_decompressed(f):
+    """f 为 gzip/xz/zstd 压缩数据时返回解压流（按需读取，不落盘），否则返回 None"""
+    magic = f.read(6)
+    f.seek(0)
+    for prefix, kind in _COMPRESSION_MAGIC:
+        if magic.startswith(prefix):
+            break
+    else:
+        return None
+    if kind == 'gzip':
+        return gzip.GzipFile(fileobj=f, mode='rb')
+    if kind == 'xz':
+        if lzma is None:
+            raise ValueError("xz compressed SVF requires Python built with lzma support")
+        return lzma.LZMAFile(f, 'rb')
+    if zstandard is None:
+        raise ValueError("zstd compressed SVF requires the 'zstandard' package")
+    return zstandard.ZstdDecompressor().stream_reader(f)
 
 # 更新 TAP 控制器状态
 class TapState(Enum):
@@ -53,6 +99,48 @@ class TapState(Enum):
         state_str_upper = state_str.upper().rstrip(';')
         return state_map.get(state_str_upper, TapState.UNKNOWN)
 
+# TAP 状态转移表：state -> {tms: next_state}
+TAP_TRANSITIONS = {
+    TapState.RESET: {0: TapState.IDLE, 1: TapState.RESET},
+    TapState.IDLE: {0: TapState.IDLE, 1: TapState.DRSELECT},
+    TapState.DRSELECT: {0: TapState.DRCAPTURE, 1: TapState.IRSELECT},
+    TapState.DRCAPTURE: {0: TapState.DRSHIFT, 1: TapState.DREXIT1},
+    TapState.DRSHIFT: {0: TapState.DRSHIFT, 1: TapState.DREXIT1},
+    TapState.DREXIT1: {0: TapState.DRPAUSE, 1: TapState.DRUPDATE},
+    TapState.DRPAUSE: {0: TapState.DRPAUSE, 1: TapState.DREXIT2},
+    TapState.DREXIT2: {0: TapState.DRSHIFT, 1: TapState.DRUPDATE},
+    TapState.DRUPDATE: {0: TapState.IDLE, 1: TapState.DRSELECT},
+    TapState.IRSELECT: {0: TapState.IRCAPTURE, 1: TapState.RESET},
+    TapState.IRCAPTURE: {0: TapState.IRSHIFT, 1: TapState.IREXIT1},
+    TapState.IRSHIFT: {0: TapState.IRSHIFT, 1: TapState.IREXIT1},
+    TapState.IREXIT1: {0: TapState.IRPAUSE, 1: TapState.IRUPDATE},
+    TapState.IRPAUSE: {0: TapState.IRPAUSE, 1: TapState.IREXIT2},
+    TapState.IREXIT2: {0: TapState.IRSHIFT, 1: TapState.IRUPDATE},
+    TapState.IRUPDATE: {0: TapState.IDLE, 1: TapState.DRSELECT}
+}
+
+def _build_tap_paths() -> List[List[Tuple[int, int]]]:
+    """预先用BFS计算任意两状态间最短TMS序列，得到 16x16 表，元素为 (tms_bits, bit_count)，bit0 最先发送"""
+    table = [[(0, 0)] * len(TAP_TRANSITIONS) for _ in TAP_TRANSITIONS]
+    for start in TAP_TRANSITIONS:
+        paths = {start: (0, 0)}
+        frontier = collections.deque([start])
+        while frontier:
+            state = frontier.popleft()
+            tms_bits, bit_count = paths[state]
+            for tms in (0, 1):
+                next_state = TAP_TRANSITIONS[state][tms]
+                if next_state not in paths:
+                    paths[next_state] = (tms_bits | (tms << bit_count), bit_count + 1)
+                    frontier.append(next_state)
+        for target, path in paths.items():
+            table[start.value][target.value] = path
+        # 进入RESET统一发送 5 个 TMS=1，与当前状态无关
+        table[start.value][TapState.RESET.value] = (0x1F, 5)
+    return table
+
+TAP_PATHS = _build_tap_paths()
+
 # 增强 SVF 指令类型
 class SVFCommandType(Enum):
     ENDIR = 1
@@ -72,124 +160,439 @@ class SVFCommandType(Enum):
     COMMENT = 15
     UNKNOWN = 99
 
+# 带 length/TDI/TDO/MASK/SMASK 参数的命令
+_SCAN_COMMANDS = (SVFCommandType.SIR, SVFCommandType.SDR, SVFCommandType.HIR,
+                  SVFCommandType.TIR, SVFCommandType.HDR, SVFCommandType.TDR)
+# 头/尾填充命令；IR 填充默认全 1（其余器件处于 BYPASS），DR 填充默认全 0
+_PADDING_COMMANDS = (SVFCommandType.HIR, SVFCommandType.TIR, SVFCommandType.HDR, SVFCommandType.TDR)
+
 # 增强 SVF 指令解析
 class SVFCommand:
-    def __init__(self, cmd_type: SVFCommandType, params: Dict, line_num: int, raw_line: str):
+    """
+    已解析的 SVF 命令。参数直接存为槽位，未给出的参数为 None，不再为每条命令分配参数字典：
+      扫描类   length tdi tdo mask smask（TDI/TDO/MASK/SMASK 为打包后的 BitVector）
+      ENDIR/ENDDR  state；STATE  states；FREQUENCY  frequency；TRST  mode；注释  comment
+      RUNTEST  run_count min_time max_time end_state
+    """
+    PARAM_FIELDS = ('length', 'tdi', 'tdo', 'mask', 'smask', 'state', 'states', 'frequency',
+                    'run_count', 'min_time', 'max_time', 'end_state', 'mode', 'comment')
+    __slots__ = ('cmd_type', 'line_num', 'raw_line') + PARAM_FIELDS
+
+    def __init__(self, cmd_type: SVFCommandType, line_num: int, raw_line: str,
+                 length: Optional[int] = None, tdi: Optional['BitVector'] = None, tdo: Optional['BitVector'] = None,
+                 mask: Optional['BitVector'] = None, smask: Optional['BitVector'] = None,
+                 state: Optional['TapState'] = None, states: Optional[List['TapState']] = None,
+                 frequency: Optional[float] = None, run_count: Optional[int] = None,
+                 min_time: Optional[float] = None, max_time: Optional[float] = None,
+                 end_state: Optional['TapState'] = None, mode: Optional[str] = None, comment: Optional[str] = None):
         self.cmd_type = cmd_type
-        self.params = params
         self.line_num = line_num
         self.raw_line = raw_line
-        
+        self.length = length
+        self.tdi = tdi
+        self.tdo = tdo
+        self.mask = mask
+        self.smask = smask
+        self.state = state
+        self.states = states
+        self.frequency = frequency
+        self.run_count = run_count
+        self.min_time = min_time
+        self.max_time = max_time
+        self.end_state = end_state
+        self.mode = mode
+        self.comment = comment
+
+    @property
+    def params(self) -> Dict:
+        """已给出的参数（每次调用新建字典，供打印与比较；执行路径直接读取槽位）"""
+        return {name: getattr(self, name) for name in self.PARAM_FIELDS if getattr(self, name) is not None}
+
     def __str__(self):
         return f"{self.cmd_type.name} (line {self.line_num}): {self.params}"
 
+def _place_bits(buf: bytearray, offset: int, bits: 'BitVector'):
+    """把 bits 写入 buf 的第 offset 位起；buf 中 offset 之后的位须为 0"""
+    length = bits.length
+    if not length:
+        return
+    data = bits.data
+    start = offset >> 3
+    shift = offset & 7
+    if not shift:
+        # 字节对齐：整字节直接切片复制
+        whole = length >> 3
+        buf[start:start + whole] = data[:whole]
+        if length & 7:
+            buf[start + whole] |= data[whole] & ((1 << (length & 7)) - 1)
+        return
+    end = (offset + length + 7) >> 3
+    value = (int.from_bytes(data[:(length + 7) >> 3], 'little') & ((1 << length) - 1)) << shift
+    buf[start:end] = (value | buf[start]).to_bytes(end - start, 'little')
+
+# 定长位向量：TDI/TDO/MASK/SMASK 的统一表示
+class BitVector:
+    """data 为 LSB-first 字节（第 0 字节的 bit0 最先移位），长度 ceil(length/8)"""
+    __slots__ = ('data', 'length')
+
+    def __init__(self, data, length: int):
+        self.data = data
+        self.length = length
+
+    @classmethod
+    def from_hex(cls, hex_data, length: int) -> 'BitVector':
+        return cls(hex_to_packed(hex_data, length), length)
+
+    @classmethod
+    def from_int(cls, value: int, length: int) -> 'BitVector':
+        value &= (1 << length) - 1
+        return cls(value.to_bytes((length + 7) // 8, 'little'), length)
+
+    @classmethod
+    def zeros(cls, length: int) -> 'BitVector':
+        return cls(bytes((length + 7) // 8), length)
+
+    @classmethod
+    def ones(cls, length: int) -> 'BitVector':
+        return cls.from_int(-1, length)
+
+    @classmethod
+    def join(cls, parts: List['BitVector']) -> 'BitVector':
+        """按移位顺序拼接（parts[0] 最先移出），各段直接写入预分配的缓冲区"""
+        length = sum(part.length for part in parts)
+        buf = bytearray((length + 7) // 8)
+        offset = 0
+        for part in parts:
+            _place_bits(buf, offset, part)
+            offset += part.length
+        return cls(bytes(buf), length)
+
+    def slice(self, offset: int, length: int) -> 'BitVector':
+        """取第 offset 位起的 length 位（offset 为 0 时为最先移出的位）"""
+        if not offset & 7:
+            start = offset >> 3
+            return BitVector(self.data[start:start + (length + 7) // 8], length)
+        value = int.from_bytes(self.data[offset >> 3:(offset + length + 7) >> 3], 'little') >> (offset & 7)
+        return BitVector.from_int(value, length)
+
+    def to_int(self) -> int:
+        return int.from_bytes(self.data, 'little') & ((1 << self.length) - 1)
+
+    def to_hex(self) -> str:
+        return packed_to_hex(self.data, self.length)
+
+    def __len__(self):
+        return self.length
+
+    def __bytes__(self):
+        return bytes(self.data)
+
+    def __eq__(self, other):
+        if not isinstance(other, BitVector):
+            return NotImplemented
+        return self.length == other.length and self.to_int() == other.to_int()
+
+    def __hash__(self):
+        return hash((self.length, self.to_int()))
+
+    def __str__(self):
+        return self.to_hex()
+
+    def __repr__(self):
+        hex_str = self.to_hex()
+        if len(hex_str) > 32:
+            hex_str = hex_str[:16] + '...' + hex_str[-16:]
+        return f"BitVector({self.length}, {hex_str})"
+
+# SVF 词法分析器：按字节单遍扫描，定位语句边界和 ( ... ) 数据段
+_LEX_SPECIAL = re.compile(rb'[;(!/]')
+_LEX_NON_WS = re.compile(rb'\S')
+_WHITESPACE = b' \t\r\n\v\f'
+_PAYLOAD_MARK = b' () '
+
+class SVFStatement:
+    """一条完整语句；数据段以 (start, end) 偏移引用 buffer，在取下一条语句之前有效"""
+    __slots__ = ('line_num', 'text', 'buffer', 'spans', 'is_comment')
+
+    def __init__(self, line_num: int, text: str, buffer, spans: List[Tuple[int, int]], is_comment: bool = False):
+        self.line_num = line_num
+        self.text = text
+        self.buffer = buffer
+        self.spans = spans
+        self.is_comment = is_comment
+
+    def payload(self, index: int) -> bytes:
+        """返回第 index 个数据段去除空白后的原始字节"""
+        start, end = self.spans[index]
+        return self.buffer[start:end].translate(None, _WHITESPACE)
+
+class SVFLexer:
+    def __init__(self, block_size: int = 1 << 20, verbose: bool = False):
+        self.block_size = block_size
+        self.verbose = verbose
+        self.bytes_scanned = 0
+        self._line = 1
+        self._line_pos = 0
+        self._resume = 0
+
+    def iter_statements(self, filename: str) -> Iterator[SVFStatement]:
+        """
+        优先用 mmap 映射整个文件扫描；无法映射（空文件、管道等）时按块读取。
+        gzip/xz/zstd 压缩文件边解压边按块扫描，bytes_scanned 为解压后的字节数。
+        """
+        self.bytes_scanned = 0
+        self._line = 1
+        self._line_pos = 0
+        with open(filename, 'rb') as f:
+            stream = open_decompressed(f)
+            if stream is not None:
+                with stream:
+                    yield from self._iter_blocks(stream)
+                return
+            try:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except (ValueError, OSError):
+                mm = None
+            if mm is None:
+                yield from self._iter_blocks(f)
+                return
+            try:
+                if hasattr(mm, 'madvise') and hasattr(mmap, 'MADV_SEQUENTIAL'):
+                    mm.madvise(mmap.MADV_SEQUENTIAL)
+                yield from self._scan(mm, 0, True)
+                self.bytes_scanned = len(mm)
+            finally:
+                mm.close()
+
+    def iter_stream(self, stream) -> Iterator[SVFStatement]:
+        """从二进制流按块读取并扫描"""
+        self.bytes_scanned = 0
+        self._line = 1
+        self._line_pos = 0
+        yield from self._iter_blocks(stream)
+
+    def _iter_blocks(self, stream) -> Iterator[SVFStatement]:
+        buf = bytearray()
+        read_size = self.block_size
+        while True:
+            block = stream.read(read_size)
+            final = not block
+            buf += block
+            self.bytes_scanned += len(block)
+            yield from self._scan(buf, 0, final)
+            if final:
+                return
+            # 丢弃已完成的部分；未完成的语句下次从头重新扫描
+            consumed = self._resume
+            if consumed:
+                if self._line_pos < consumed:
+                    self._line += buf[self._line_pos:consumed].count(b'\n')
+                    self._line_pos = consumed
+                self._line_pos -= consumed
+                del buf[:consumed]
+            # 未完成语句跨越多个块时按倍数放大读取量，保证总扫描量线性
+            read_size = max(self.block_size, len(buf))
+
+    def _line_of(self, buf, pos: int) -> int:
+        if pos > self._line_pos:
+            # mmap 不支持 count()，切片后计数；每段只计一次，总量线性
+            self._line += buf[self._line_pos:pos].count(b'\n')
+            self._line_pos = pos
+        return self._line
+
+    def _scan(self, buf, pos: int, final: bool) -> Iterator[SVFStatement]:
+        end = len(buf)
+        search = _LEX_SPECIAL.search
+        non_ws = _LEX_NON_WS.search
+        parts = []
+        spans = []
+        started = False
+        seg = pos
+        p = pos
+        self._resume = pos
+        while True:
+            m = search(buf, p)
+            if m is None:
+                if final:
+                    parts.append(buf[seg:end])
+                    if started or non_ws(buf, seg, end):
+                        if self.verbose:
+                            print("Warning: Unfinished command at end of file")
+                        yield self._statement(buf, parts, spans)
+                    self._resume = end
+                return
+            i = m.start()
+            c = buf[i]
+            if c == 0x3B:  # ';' 语句结束
+                parts.append(buf[seg:i])
+                if started or non_ws(buf, seg, i):
+                    yield self._statement(buf, parts, spans)
+                parts = []
+                spans = []
+                started = False
+                p = seg = self._resume = i + 1
+            elif c == 0x28:  # '(' 数据段
+                close = buf.find(b')', i + 1)
+                if close < 0:
+                    if not final:
+                        return
+                    if self.verbose:
+                        print(f"Warning: Unmatched '(' in command at line {self._line_of(buf, i)}")
+                    close = end
+                parts.append(buf[seg:i])
+                parts.append(_PAYLOAD_MARK)
+                spans.append((i + 1, close))
+                started = True
+                p = seg = close + 1
+            elif c == 0x21 or buf[i + 1:i + 2] == b'/':  # '!' 或 '//' 注释到行尾
+                eol = buf.find(b'\n', i)
+                if eol < 0:
+                    if not final:
+                        return
+                    eol = end
+                if started or non_ws(buf, seg, i):
+                    # 语句内部的注释直接跳过
+                    parts.append(buf[seg:i])
+                    started = True
+                else:
+                    if c == 0x2F:
+                        line_num = self._line_of(buf, i)
+                        text = bytes(buf[i:eol]).decode('ascii', 'replace').strip()
+                        yield SVFStatement(line_num, text, buf, [], True)
+                    self._resume = eol
+                p = seg = eol
+            elif i + 1 >= end and not final:
+                return  # 块末尾的单个 '/'，等待下一块
+            else:
+                p = i + 1
+
+    def _statement(self, buf, parts, spans) -> SVFStatement:
+        text = b''.join(parts).decode('ascii', 'replace')
+        first = _LEX_NON_WS.search(buf, self._resume)
+        line_num = self._line_of(buf, first.start()) if first else self._line
+        return SVFStatement(line_num, text, buf, spans)
+
 # 增强 SVF 解析器
 class SVFParser:
-    def __init__(self, verbose: bool = False):
+    # 映射字符串到命令类型
+    CMD_MAP = {
+        "ENDIR": SVFCommandType.ENDIR,
+        "ENDDR": SVFCommandType.ENDDR,
+        "STATE": SVFCommandType.STATE,
+        "FREQUENCY": SVFCommandType.FREQUENCY,
+        "HIR": SVFCommandType.HIR,
+        "TIR": SVFCommandType.TIR,
+        "HDR": SVFCommandType.HDR,
+        "TDR": SVFCommandType.TDR,
+        "SIR": SVFCommandType.SIR,
+        "SDR": SVFCommandType.SDR,
+        "RUNTEST": SVFCommandType.RUNTEST,
+        "TRST": SVFCommandType.TRST,
+        "PIOMAP": SVFCommandType.PIOMAP,
+        "PIO": SVFCommandType.PIO
+    }
+    RAW_PAYLOAD_LIMIT = 64  # raw_line 中只展开不超过该长度的数据段
+    PAYLOAD_CACHE_SIZE = 1024  # 短数据段转换结果的缓存条数（轮询类 SIR/SDR 反复出现相同数据）
+
+    def __init__(self, verbose: bool = False, block_size: int = 1 << 20):
         self.commands = []
+        self._payload_cache = {}
         self.current_line = 1
-        self.current_command = ""
         self.verbose = verbose
-        self.in_multiline = False
+        self.lexer = SVFLexer(block_size, verbose)
+        self.parse_time = 0.0
+        self.bytes_parsed = 0
     
     def parse_file(self, filename: str):
         try:
-            with open(filename, 'r') as f:
-                for line in f:
-                    self._process_line(line)
-                    self.current_line += 1
-            
-            # 处理最后未完成的命令
-            if self.current_command.strip():
-                if self.verbose:
-                    print(f"Warning: Unfinished command at end of file: {self.current_command}")
-                self._parse_command(self.current_command, "end of file")
+            self.commands.extend(self.iter_file(filename))
             return True
         except Exception as e:
             print(f"Error parsing SVF file: {e}")
             return False
+
+    def iter_file(self, filename: str) -> Iterator[SVFCommand]:
+        """逐条生成命令：每个以 ; 结束的语句解析完成后立即 yield，不在内存中累积"""
+        return self._iter_statements(self.lexer.iter_statements(filename))
+
+    def _iter_statements(self, statements: Iterator[SVFStatement]) -> Iterator[SVFCommand]:
+        # 只统计解析本身耗时，不含调用方处理命令的时间
+        self.parse_time = 0.0
+        self.bytes_parsed = 0
+        t0 = time.perf_counter()
+        for statement in statements:
+            self.current_line = statement.line_num
+            command = self._parse_statement(statement)
+            if command is None:
+                continue
+            self.parse_time += time.perf_counter() - t0
+            yield command
+            t0 = time.perf_counter()
+        self.parse_time += time.perf_counter() - t0
+        self.bytes_parsed = self.lexer.bytes_scanned
+
+    def throughput(self) -> float:
+        """最近一次解析的吞吐量（MB/s）"""
+        if self.parse_time <= 0:
+            return 0.0
+        return self.bytes_parsed / self.parse_time / (1024 * 1024)
+
+    def _payload_hex(self, statement: SVFStatement, index: int) -> bytes:
+        data = statement.payload(index)
+        # 处理十六进制数据
+        if data[:2] in (b'0x', b'0X'):
+            data = data[2:]
+        return data
+
+    def _payload_bits(self, data: bytes, length: int) -> BitVector:
+        """十六进制转位向量；短数据段复用已转换的结果"""
+        if len(data) > self.RAW_PAYLOAD_LIMIT:
+            return BitVector.from_hex(data, length)
+        key = (bytes(data), length)
+        bits = self._payload_cache.get(key)
+        if bits is None:
+            if len(self._payload_cache) >= self.PAYLOAD_CACHE_SIZE:
+                self._payload_cache.clear()
+            bits = self._payload_cache[key] = BitVector.from_hex(data, length)
+        return bits
+
+    def _raw_line(self, statement: SVFStatement) -> str:
+        text = statement.text
+        if not statement.spans:
+            return text.strip()
+        pieces = text.split(_PAYLOAD_MARK.decode())
+        out = [pieces[0]]
+        for (start, end), piece in zip(statement.spans, pieces[1:]):
+            if end - start <= self.RAW_PAYLOAD_LIMIT:
+                out.append(f" ({bytes(statement.buffer[start:end]).decode('ascii', 'replace').strip()}) ")
+            else:
+                out.append(" (...) ")
+            out.append(piece)
+        return ' '.join(''.join(out).split())
+
+    def _parse_number(self, token: str, what: str) -> Optional[float]:
+        try:
+            return float(token)
+        except ValueError:
+            if self.verbose:
+                print(f"Warning: Invalid {what} value '{token}' at line {self.current_line}")
+            return None
     
-    def _process_line(self, line: str):
-        # 保存原始行用于调试
-        raw_line = line.rstrip()
-        
-        # 检查整行注释（以 // 开头）
-        if re.match(r'^\s*//', line):
-            # 创建注释命令对象
-            self.commands.append(SVFCommand(
-                SVFCommandType.COMMENT,
-                {'comment': line.strip()},
-                self.current_line,
-                raw_line
-            ))
-            return
-        
-        # 移除行内注释（以 ! 开头）
-        line = re.sub(r'!.*', '', line)
-        
-        # 检查是否为空行
-        if not line.strip():
-            return
-        
-        # 处理多行命令
-        if self.in_multiline:
-            self.current_command += line
-            if ';' in line:
-                self.in_multiline = False
-                full_command = self.current_command.strip()
-                if full_command:
-                    self._parse_command(full_command, raw_line)
-                self.current_command = ""
-            return
-        
-        # 检查是否以分号结束
-        if ';' in line:
-            # 处理单行命令
-            self._parse_command(line, raw_line)
-        else:
-            # 开始多行命令
-            self.current_command = line
-            self.in_multiline = True
-    
-    def _parse_command(self, command_str: str, raw_line: str):
-        # 移除命令末尾的分号
-        command_str = command_str.rstrip(';').strip()
-        if not command_str:
-            return
-        
-        tokens = command_str.split()
+    def _parse_statement(self, statement: SVFStatement) -> Optional[SVFCommand]:
+        if statement.is_comment:
+            return SVFCommand(SVFCommandType.COMMENT, statement.line_num, statement.text, comment=statement.text)
+
+        tokens = statement.text.split()
         if not tokens:
-            return
+            return None
         
-        cmd_type_str = tokens[0].upper()
-        cmd_type = SVFCommandType.UNKNOWN
-        
-        # 映射字符串到命令类型
-        cmd_map = {
-            "ENDIR": SVFCommandType.ENDIR,
-            "ENDDR": SVFCommandType.ENDDR,
-            "STATE": SVFCommandType.STATE,
-            "FREQUENCY": SVFCommandType.FREQUENCY,
-            "HIR": SVFCommandType.HIR,
-            "TIR": SVFCommandType.TIR,
-            "HDR": SVFCommandType.HDR,
-            "TDR": SVFCommandType.TDR,
-            "SIR": SVFCommandType.SIR,
-            "SDR": SVFCommandType.SDR,
-            "RUNTEST": SVFCommandType.RUNTEST,
-            "TRST": SVFCommandType.TRST,
-            "PIOMAP": SVFCommandType.PIOMAP,
-            "PIO": SVFCommandType.PIO
-        }
-        
-        cmd_type = cmd_map.get(cmd_type_str, SVFCommandType.UNKNOWN)
-        params = {}
+        cmd_type = self.CMD_MAP.get(tokens[0].upper(), SVFCommandType.UNKNOWN)
+        command = SVFCommand(cmd_type, statement.line_num, self._raw_line(statement))
         
         # 特定命令的解析
         if cmd_type == SVFCommandType.ENDIR or cmd_type == SVFCommandType.ENDDR:
             if len(tokens) > 1:
-                state_str = tokens[1]
-                params['state'] = TapState.from_string(state_str)
+                command.state = TapState.from_string(tokens[1])
         
         elif cmd_type == SVFCommandType.STATE:
             states = []
@@ -197,144 +600,132 @@ class SVFParser:
                 state = TapState.from_string(token)
                 if state != TapState.UNKNOWN:
                     states.append(state)
-            params['states'] = states
+            command.states = states
         
         elif cmd_type == SVFCommandType.FREQUENCY:
+            # 格式: FREQUENCY [cycles HZ]
             if len(tokens) > 1:
-                freq_str = tokens[1]
-                # 移除单位和非数字字符
-                freq_str = re.sub(r'[^0-9.]', '', freq_str)
-                try:
-                    params['frequency'] = float(freq_str)
-                except ValueError:
-                    if self.verbose:
-                        print(f"Warning: Invalid frequency value '{tokens[1]}' at line {self.current_line}")
+                command.frequency = self._parse_number(tokens[1], "frequency")
         
-        elif cmd_type in [SVFCommandType.SIR, SVFCommandType.SDR]:
+        elif cmd_type in _SCAN_COMMANDS:
             # 格式: SIR length [TDI (tdi_data)] [TDO (tdo_data)] [MASK (mask_data)] [SMASK (smask_data)]
-            params['length'] = 0
-            params['tdi'] = None
-            params['tdo'] = None
-            params['mask'] = None
-            params['smask'] = None
-            
-            idx = 1
-            while idx < len(tokens):
-                token = tokens[idx]
+            # HIR/TIR/HDR/TDR 格式相同
+            length = 0
+            payloads = {}
+            payload_index = 0
+            for token in tokens[1:]:
                 if token.isdigit():
-                    params['length'] = int(token)
+                    length = int(token)
                 elif token.upper() in ['TDI', 'TDO', 'MASK', 'SMASK']:
-                    key = token.lower()
-                    idx += 1
-                    if idx < len(tokens):
-                        data_str = tokens[idx]
-                        
-                        # 处理带括号的数据
-                        if data_str.startswith('(') and data_str.endswith(')'):
-                            data_str = data_str[1:-1]
-                        elif data_str.startswith('('):
-                            # 处理跨多个token的数据
-                            data_parts = [data_str[1:]]
-                            idx += 1
-                            while idx < len(tokens):
-                                next_token = tokens[idx]
-                                if next_token.endswith(')'):
-                                    data_parts.append(next_token[:-1])
-                                    break
-                                elif next_token == ')':
-                                    break
-                                else:
-                                    data_parts.append(next_token)
-                                idx += 1
-                            else:
-                                if self.verbose:
-                                    print(f"Warning: Unmatched '(' in command at line {self.current_line}")
-                            data_str = ''.join(data_parts)
-                        
-                        # 处理十六进制数据
-                        if data_str.upper().startswith('0X'):
-                            data_str = data_str[2:]
-                        
-                        params[key] = data_str
-                idx += 1
+                    if payload_index < len(statement.spans):
+                        payloads[token.lower()] = self._payload_hex(statement, payload_index)
+                        payload_index += 1
+                    elif self.verbose:
+                        print(f"Warning: Missing data for {token} at line {statement.line_num}")
             
             # 如果长度未指定，尝试从数据推断
-            if params['length'] == 0 and params['tdi'] is not None:
-                hex_len = len(params['tdi'])
-                params['length'] = hex_len * 4  # 每个十六进制字符4位
+            if length == 0 and 'tdi' in payloads:
+                length = len(payloads['tdi']) * 4  # 每个十六进制字符4位
+            command.length = length
+
+            # 直接转换为打包后的位向量，不保留十六进制串
+            for key, data in payloads.items():
+                setattr(command, key, self._payload_bits(data, length))
         
         elif cmd_type == SVFCommandType.RUNTEST:
-            # 格式: RUNTEST run_count run_clock min_time [MAXIMUM max_time] [ENDSTATE state]
-            params['run_count'] = 0
-            params['min_time'] = 0.0
-            params['end_state'] = TapState.IDLE
+            # 格式: RUNTEST [run_state] [run_count TCK|SCK] [min_time SEC [MAXIMUM max_time SEC]] [ENDSTATE state]
+            command.run_count = 0
+            command.min_time = 0.0
+            command.end_state = TapState.IDLE
             
             idx = 1
             while idx < len(tokens):
-                token = tokens[idx]
-                if token.isdigit():
-                    params['run_count'] = int(token)
-                elif token.upper() == "MAXIMUM":
-                    idx += 1
-                    if idx < len(tokens):
-                        max_time_str = re.sub(r'[^0-9.]', '', tokens[idx])
-                        try:
-                            params['max_time'] = float(max_time_str)
-                        except ValueError:
-                            if self.verbose:
-                                print(f"Warning: Invalid max_time value '{tokens[idx]}' at line {self.current_line}")
-                elif token.upper() == "ENDSTATE":
-                    idx += 1
-                    if idx < len(tokens):
-                        state_str = tokens[idx]
-                        params['end_state'] = TapState.from_string(state_str)
-                elif re.match(r'^\d+\.?\d*[Ee]?[-+]?\d*$', token):
-                    min_time_str = re.sub(r'[^0-9.]', '', token)
-                    try:
-                        params['min_time'] = float(min_time_str)
-                    except ValueError:
-                        if self.verbose:
-                            print(f"Warning: Invalid min_time value '{token}' at line {self.current_line}")
+                token = tokens[idx].upper()
+                unit = tokens[idx + 1].upper() if idx + 1 < len(tokens) else ""
+                if token == "MAXIMUM":
+                    if idx + 1 < len(tokens):
+                        command.max_time = self._parse_number(tokens[idx + 1], "max_time")
+                    idx += 2
+                    continue
+                elif token == "ENDSTATE":
+                    if idx + 1 < len(tokens):
+                        command.end_state = TapState.from_string(tokens[idx + 1])
+                    idx += 2
+                    continue
+                elif unit in ("TCK", "SCK"):
+                    run_count = self._parse_number(tokens[idx], "run_count")
+                    if run_count is not None:
+                        command.run_count = int(run_count)
+                    idx += 2
+                    continue
+                elif unit == "SEC":
+                    min_time = self._parse_number(tokens[idx], "min_time")
+                    if min_time is not None:
+                        command.min_time = min_time
+                    idx += 2
+                    continue
                 idx += 1
         
         elif cmd_type == SVFCommandType.TRST:
             # 格式: TRST (ON|OFF|Z|ABSENT)
             if len(tokens) > 1:
-                mode = tokens[1].upper()
-                params['mode'] = mode
+                command.mode = tokens[1].upper()
         
-        self.commands.append(SVFCommand(cmd_type, params, self.current_line, raw_line))
+        return command
+
+def runtest_cycles(run_count: int, min_time: float, frequency: float, max_cycles: int) -> int:
+    """RUNTEST 实际产生的 TCK 周期数：最短时间按 frequency 折算为周期；超过 max_cycles 时只产生 run_count 个周期，剩余时间由主机延时补足"""
+    cycles = max(run_count, math.ceil(min_time * frequency - 1e-6))
+    return run_count if cycles > max_cycles else cycles
 
 # 增强 JTAG 控制器
 class JTAGController:
+    VERBOSE_HEX_BITS = 256  # 校验失败时不超过该位数才打印完整十六进制
+    MAX_RUNTEST_CYCLES = 1 << 23  # RUNTEST 由时钟产生延时的周期上限（约 1MB 命令包），超过时改用主机延时
+    DEFAULT_FREQUENCY = 1e6  # 收到 FREQUENCY 之前按 1 MHz 折算
+
     def __init__(self, verbose: bool = True):
         self.current_state = TapState.RESET
         self.endir_state = TapState.IDLE
         self.enddr_state = TapState.IDLE
-        self.frequency = 1e6  # 1 MHz
+        self.frequency = None  # SVF 指定的频率；第一条 FREQUENCY 总是下发给硬件接口
         self.verbose = verbose
         self.hw_iface = None
         self.error_count = 0
+        self.max_mismatch_offsets = 8  # 校验失败时报告的出错位数量
+        self.last_verify_result = None
+        self.command_index = 0
+        self.current_line = 0
+        self._error_lock = threading.Lock()
+
+        # 异步校验：TDO 交给后台线程比较，错误计数最多滞后 verify_lag 条命令
+        self.verify_lag = 0  # 0 表示按顺序同步校验
+        self._verify_queue = None
+        self._verify_thread = None
+        self._verify_cond = threading.Condition()
+        self._verify_submitted = 0
+        self._verify_done = 0
+        self._verify_pending = collections.deque()  # (提交序号, 命令序号)
+        self._verify_error = None  # 后台校验抛出的第一个异常，由 drain_verification 重新抛出
+        
+        # TDO 捕获（如 svf_capture.TDOCapture）：选中的扫描强制回读并写出 TDO
+        self.capture = None
+
+        # HIR/TIR/HDR/TDR 填充：(length, tdi, tdo, mask, zeros)，长度为 0 时为 None；
+        # zeros 为预先生成的全 0 向量，填充段没有 TDO 时用作其 TDO/MASK
+        self.padding = {cmd_type: None for cmd_type in _PADDING_COMMANDS}
+        self._padding_cache = {}  # is_dr -> (header, trailer, tdi, tdo, mask, 结果)，相同对象时直接复用
+
+        # SVF 规范的参数沿用：长度不变时省略的 TDI/MASK/SMASK 取上一条同类命令的值
+        self._scan_defaults = {}  # cmd_type -> (length, tdi, mask, smask)；mask/smask 为 None 表示全 1
+        self._smask_cache = {}  # cmd_type -> (tdi, smask, 结果)，相同对象时跳过重新计算
+
+        # 尚未发送的 TMS 位：连续的状态转移合并为一次 pulse_tms
+        self._tms_bits = 0
+        self._tms_count = 0
         
         # 状态转移表
-        self.state_transitions = {
-            TapState.RESET: {0: TapState.IDLE, 1: TapState.RESET},
-            TapState.IDLE: {0: TapState.IDLE, 1: TapState.DRSELECT},
-            TapState.DRSELECT: {0: TapState.DRCAPTURE, 1: TapState.IRSELECT},
-            TapState.DRCAPTURE: {0: TapState.DRSHIFT, 1: TapState.DREXIT1},
-            TapState.DRSHIFT: {0: TapState.DRSHIFT, 1: TapState.DREXIT1},
-            TapState.DREXIT1: {0: TapState.DRPAUSE, 1: TapState.DRUPDATE},
-            TapState.DRPAUSE: {0: TapState.DRPAUSE, 1: TapState.DREXIT2},
-            TapState.DREXIT2: {0: TapState.DRSHIFT, 1: TapState.DRUPDATE},
-            TapState.DRUPDATE: {0: TapState.IDLE, 1: TapState.DRSELECT},
-            TapState.IRSELECT: {0: TapState.IRCAPTURE, 1: TapState.RESET},
-            TapState.IRCAPTURE: {0: TapState.IRSHIFT, 1: TapState.IREXIT1},
-            TapState.IRSHIFT: {0: TapState.IRSHIFT, 1: TapState.IREXIT1},
-            TapState.IREXIT1: {0: TapState.IRPAUSE, 1: TapState.IRUPDATE},
-            TapState.IRPAUSE: {0: TapState.IRPAUSE, 1: TapState.IREXIT2},
-            TapState.IREXIT2: {0: TapState.IRSHIFT, 1: TapState.IRUPDATE},
-            TapState.IRUPDATE: {0: TapState.IDLE, 1: TapState.DRSELECT}
-        }
+        self.state_transitions = TAP_TRANSITIONS
     
     def set_hardware_interface(self, hw_iface):
         self.hw_iface = hw_iface
@@ -343,54 +734,67 @@ class JTAGController:
         self.verbose = verbose
     
     def goto_state(self, target_state: TapState):
-        bit_count = 0
-        current_byte = 0
-
         if self.current_state == target_state:
             return
+
+        if target_state == TapState.UNKNOWN:
+            if self.verbose:
+                print("Warning: Ignoring transition to UNKNOWN TAP state")
+            return
         
         if self.verbose:
             print(f"TAP State Transition: {self.current_state.name} -> {target_state.name}")
         
-        # 特殊处理：从任何状态到RESET
-        if target_state == TapState.RESET:
-            self.hw_iface.pulse_tms(255, 5)
+        # 当前状态未知时先复位
+        if self.current_state == TapState.UNKNOWN:
+            self._queue_tms(*TAP_PATHS[TapState.RESET.value][TapState.RESET.value])
             self.current_state = TapState.RESET
-            return
-        
-        # 计算最短路径
-        path = self._find_path(self.current_state, target_state)
-        
-        # 执行状态转移
-        for tms in path:
-            current_byte = current_byte | (tms << bit_count)
-            bit_count += 1
-            # self.hw_iface.pulse_tms(tms, 1)
-            self.current_state = self.state_transitions[self.current_state][tms]
-
-        self.hw_iface.pulse_tms(current_byte, bit_count)
+            if target_state == TapState.RESET:
+                return
+
+        # 查表得到最短路径，暂存到下一次硬件操作前统一发送
+        self._queue_tms(*TAP_PATHS[self.current_state.value][target_state.value])
+        self.current_state = target_state
+
+    def _queue_tms(self, tms_bits: int, bit_count: int):
+        # 凑满 8 位即发送，暂存的位数始终少于 8，连续的状态切换不会累积成大整数
+        bits = self._tms_bits | tms_bits << self._tms_count
+        count = self._tms_count + bit_count
+        while count >= 8:
+            self.hw_iface.pulse_tms(bits & 0xFF, 8)
+            bits >>= 8
+            count -= 8
+        self._tms_bits = bits
+        self._tms_count = count
+
+    def flush(self):
+        """发送暂存的 TMS 序列并让硬件接口写出所有缓冲的操作"""
+        self._flush_tms()
+        if self.hw_iface is not None:
+            self.hw_iface.flush()
+
+    def _flush_tms(self):
+        """发送暂存的不足 8 位的 TMS 序列"""
+        if self._tms_count:
+            self.hw_iface.pulse_tms(self._tms_bits, self._tms_count)
+            self._tms_bits = 0
+            self._tms_count = 0
         
     def _find_path(self, current: TapState, target: TapState) -> List[int]:
-        """使用BFS找到最短的TMS序列"""
-        queue = [(current, [])]
-        visited = set([current])
-        
-        while queue:
-            state, path = queue.pop(0)
-            
-            if state == target:
-                return path
-            
-            for tms in [0, 1]:
-                next_state = self.state_transitions[state][tms]
-                if next_state not in visited:
-                    visited.add(next_state)
-                    queue.append((next_state, path + [tms]))
-        
-        # 找不到路径（理论上不应该发生）
-        return []
+        """返回预计算的最短TMS序列"""
+        tms_bits, bit_count = TAP_PATHS[current.value][target.value]
+        return [(tms_bits >> i) & 1 for i in range(bit_count)]
     
-    def shift_ir(self, tdi_data: str, length: int, tdo_expected: str = None, mask: str = None):
+    def shift_ir(self, tdi_data: BitVector, length: int, tdo_expected: BitVector = None, mask: BitVector = None):
+        tdi_data = self._as_bits(tdi_data, length)
+        tdo_expected = self._as_bits(tdo_expected, length)
+        mask = self._as_bits(mask, length)
+        header, trailer = self.padding[SVFCommandType.HIR], self.padding[SVFCommandType.TIR]
+        capture = self.capture is not None and self.capture.wants("IR", self.current_line, bool(tdo_expected))
+        capture_offset, capture_length = (header[0] if header else 0), length
+        if header or trailer:
+            tdi_data, tdo_expected, mask, length = self._pad_scan(False, header, trailer, tdi_data, length,
+                                                                  tdo_expected, mask)
         if self.verbose:
             print(f"Shifting IR: {length} bits, TDI: {tdi_data}")
             if tdo_expected:
@@ -407,7 +811,13 @@ class JTAGController:
         else:
             is_read = False
         # 执行移位操作
-        tdo_received = self.hw_iface.shift_data(tdi_data, length, False, is_read)
+        self._flush_tms()
+        if capture and not is_read:
+            tdo_received = self._shift_to_capture("IR", tdi_data, length, capture_offset, capture_length)
+        else:
+            tdo_received = self.hw_iface.shift_data(tdi_data, length, False, is_read or capture)
+            if capture:
+                self._capture_tdo("IR", tdo_received, capture_offset, capture_length)
         self.current_state = TapState.IREXIT1
 
         # 转换到endir_state
@@ -415,16 +825,19 @@ class JTAGController:
         
         # 验证TDO（如果提供期望值）
         if tdo_expected and mask:
-            if not self._verify_tdo(tdo_received, tdo_expected, mask, length):
-                self.error_count += 1
-                if self.verbose:
-                    print(f"  Error: TDO mismatch! Expected {tdo_expected}, got {tdo_received}")
-            else:
-                if self.verbose:
-                    print(f"  Info: TDO match! Expected {tdo_expected}, got {tdo_received}")
+            self._submit_tdo_check("IR", tdo_received, tdo_expected, mask, length)
         return tdo_received
     
-    def shift_dr(self, tdi_data: str, length: int, tdo_expected: str = None, mask: str = None):
+    def shift_dr(self, tdi_data: BitVector, length: int, tdo_expected: BitVector = None, mask: BitVector = None):
+        tdi_data = self._as_bits(tdi_data, length)
+        tdo_expected = self._as_bits(tdo_expected, length)
+        mask = self._as_bits(mask, length)
+        header, trailer = self.padding[SVFCommandType.HDR], self.padding[SVFCommandType.TDR]
+        capture = self.capture is not None and self.capture.wants("DR", self.current_line, bool(tdo_expected))
+        capture_offset, capture_length = (header[0] if header else 0), length
+        if header or trailer:
+            tdi_data, tdo_expected, mask, length = self._pad_scan(True, header, trailer, tdi_data, length,
+                                                                  tdo_expected, mask)
         if self.verbose:
             print(f"Shifting DR: {length} bits, TDI: {tdi_data}")
             if tdo_expected:
@@ -440,7 +853,13 @@ class JTAGController:
             is_read = True
         else:
             is_read = False
-        tdo_received = self.hw_iface.shift_data(tdi_data, length, True, is_read)
+        self._flush_tms()
+        if capture and not is_read:
+            tdo_received = self._shift_to_capture("DR", tdi_data, length, capture_offset, capture_length)
+        else:
+            tdo_received = self.hw_iface.shift_data(tdi_data, length, True, is_read or capture)
+            if capture:
+                self._capture_tdo("DR", tdo_received, capture_offset, capture_length)
         self.current_state = TapState.DREXIT1
 
         # 转换到enddr_state
@@ -448,36 +867,228 @@ class JTAGController:
         
         # 验证TDO（如果提供期望值）
         if tdo_expected and mask:
-            if not self._verify_tdo(tdo_received, tdo_expected, mask, length):
-                self.error_count += 1
-                if self.verbose:
-                    print(f"  Error: TDO mismatch! Expected {tdo_expected}, got {tdo_received}")
-            else:
-                if self.verbose:
-                    print(f"[DR]  Info: TDO match! Expected {tdo_expected}, got {tdo_received}")
+            self._submit_tdo_check("DR", tdo_received, tdo_expected, mask, length)
         
         return tdo_received
+
+    def set_capture(self, capture):
+        """设置 TDO 捕获对象（需提供 wants/write，见 svf_capture.TDOCapture）；None 表示关闭"""
+        self.capture = capture
+
+    def _capture_tdo(self, kind: str, tdo_received: BitVector, offset: int, length: int):
+        # 去掉头部填充位，尾部填充位于高位，按 length 截断即可
+        tdo = tdo_received.slice(offset, length) if offset else tdo_received
+        self.capture.write(self.current_line, kind, tdo.data, length)
+
+    def _shift_to_capture(self, kind: str, tdi_data: BitVector, length: int, offset: int, capture_length: int) -> BitVector:
+        # 只为捕获而回读（无 TDO 校验）：回读数据按块直接写入捕获文件，不在内存中拼接整段 TDO
+        with self.capture.begin(self.current_line, kind, capture_length, offset) as stream:
+            shift_stream = getattr(self.hw_iface, 'shift_data_stream', None)
+            if shift_stream is not None:
+                return shift_stream(tdi_data, length, kind == "DR", stream.write)
+            tdo_received = self.hw_iface.shift_data(tdi_data, length, kind == "DR", True)
+            stream.write(tdo_received.data)
+            return tdo_received
+
+    def set_padding(self, cmd_type: SVFCommandType, length: int, tdi: BitVector = None,
+                    tdo: BitVector = None, mask: BitVector = None):
+        """设置 HIR/TIR/HDR/TDR 填充；length 为 0 时取消"""
+        if not length:
+            self.padding[cmd_type] = None
+            return
+        if tdi is None:
+            is_ir = cmd_type in (SVFCommandType.HIR, SVFCommandType.TIR)
+            tdi = BitVector.ones(length) if is_ir else BitVector.zeros(length)
+        if tdo is not None and mask is None:
+            mask = BitVector.ones(length)
+        self.padding[cmd_type] = (length, tdi, tdo, mask, BitVector.zeros(length))
+
+    def _resolve_scan(self, command: SVFCommand):
+        """
+        按 SVF 规范解析扫描参数，返回 (length, tdi, tdo, mask)：
+          - 长度与上一条同类命令相同时，省略的 TDI/MASK/SMASK 沿用上一条（直接复用已转换的位向量）
+          - 长度变化时 MASK/SMASK 恢复为全 1；TDO 不沿用，只在给出时校验
+          - SMASK 为 0 的 TDI 位无关，以 0 驱动
+        """
+        cmd_type = command.cmd_type
+        length = command.length or 0
+        tdi = command.tdi
+        mask = command.mask
+        smask = command.smask
+        previous = self._scan_defaults.get(cmd_type)
+        if previous is not None and previous[0] == length:
+            if tdi is None:
+                tdi = previous[1]
+            if mask is None:
+                mask = previous[2]
+            if smask is None:
+                smask = previous[3]
+        elif tdi is None and cmd_type not in _PADDING_COMMANDS:
+            if length and self.verbose:
+                print(f"Warning: {cmd_type.name} length changed to {length} without TDI at line {command.line_num}, using zeros")
+            tdi = BitVector.zeros(length)
+        self._scan_defaults[cmd_type] = (length, tdi, mask, smask)
+
+        if smask is not None and tdi is not None:
+            cached = self._smask_cache.get(cmd_type)
+            if cached is not None and cached[0] is tdi and cached[1] is smask:
+                tdi = cached[2]
+            else:
+                masked = BitVector.from_int(tdi.to_int() & smask.to_int(), length)
+                self._smask_cache[cmd_type] = (tdi, smask, masked)
+                tdi = masked
+        tdo = command.tdo
+        if tdo is not None and mask is None:
+            mask = BitVector.ones(length)
+        return length, tdi, tdo, mask
+
+    def _pad_scan(self, is_dr: bool, header, trailer, tdi: BitVector, length: int, tdo: Optional[BitVector],
+                  mask: Optional[BitVector]):
+        # 填充与扫描参数都是上一次的同一对象时（如沿用 TDI 的重复扫描）直接复用拼接结果
+        key = (header, trailer, tdi, tdo, mask)
+        cached = self._padding_cache.get(is_dr)
+        if cached is not None and all(a is b for a, b in zip(cached, key)):
+            return cached[5]
+        padded = self._apply_padding(header, trailer, tdi, length, tdo, mask)
+        self._padding_cache[is_dr] = key + (padded,)
+        return padded
+
+    @staticmethod
+    def _apply_padding(header, trailer, tdi: BitVector, length: int, tdo: Optional[BitVector],
+                       mask: Optional[BitVector]):
+        """
+        头部填充最先移入（位于最低位、靠近 TDO 一侧），尾部填充最后移入；长度为 0 的填充不参与拼接。
+        命令或填充给出 TDO 时才拼接 TDO/MASK；填充段未给出 TDO 时使用其预先生成的全 0 向量，MASK 为 0，不参与校验。
+        """
+        pads = [pad for pad in (header, trailer) if pad and pad[0]]
+        if not pads:
+            return tdi, tdo, mask, length
+        segments = [pad for pad in (header, (length, tdi, tdo, mask, None), trailer) if pad and pad[0]]
+        total = sum(segment[0] for segment in segments)
+
+        tdi_full = BitVector.join([segment[1] for segment in segments])
+        if tdo is None and all(pad[2] is None for pad in pads):
+            return tdi_full, None, None, total
+        tdo_parts, mask_parts = [], []
+        for segment in segments:
+            if segment[4] is None:
+                # 命令本身：没有 TDO 时整段不校验
+                if tdo is None:
+                    zeros = BitVector.zeros(length)
+                    tdo_parts.append(zeros)
+                    mask_parts.append(zeros)
+                else:
+                    tdo_parts.append(tdo)
+                    mask_parts.append(mask if mask is not None else BitVector.ones(length))
+            elif segment[2] is None:
+                tdo_parts.append(segment[4])
+                mask_parts.append(segment[4])
+            else:
+                tdo_parts.append(segment[2])
+                mask_parts.append(segment[3])
+        return tdi_full, BitVector.join(tdo_parts), BitVector.join(mask_parts), total
+
+    def set_deferred_verify(self, enabled: bool, max_lag: int = 16):
+        """
+        异步校验模式：移位后立即继续，TDO 比较在后台线程完成。
+        错误计数最多滞后 max_lag 条命令；默认（关闭）为严格按顺序校验。
+        """
+        self.drain_verification()
+        if self._verify_thread is not None:
+            self._verify_queue.put(None)
+            self._verify_thread.join()
+            self._verify_thread = None
+            self._verify_queue = None
+        self.verify_lag = max(1, max_lag) if enabled else 0
+        if enabled:
+            self._verify_queue = queue.Queue(maxsize=self.verify_lag)
+            self._verify_thread = threading.Thread(target=self._verify_worker, name="tdo-verify", daemon=True)
+            self._verify_thread.start()
+
+    def drain_verification(self):
+        """等待所有已提交的异步校验完成；后台校验出现异常时重新抛出第一个异常"""
+        with self._verify_cond:
+            while self._verify_done < self._verify_submitted:
+                self._verify_cond.wait()
+            self._verify_pending.clear()
+            error, self._verify_error = self._verify_error, None
+        if error is not None:
+            raise error
+
+    def _wait_verify_lag(self):
+        # 保证 verify_lag 条命令之前提交的校验都已计入错误计数
+        pending = self._verify_pending
+        while pending and pending[0][1] <= self.command_index - self.verify_lag:
+            seq, _ = pending.popleft()
+            with self._verify_cond:
+                while self._verify_done < seq:
+                    self._verify_cond.wait()
+
+    def _verify_worker(self):
+        while True:
+            item = self._verify_queue.get()
+            if item is None:
+                return
+            error = None
+            try:
+                self._check_tdo(*item)
+            except Exception as e:
+                # 计为校验错误并继续处理队列，工作线程退出会使提交方永远阻塞
+                self._add_error()
+                print(f"[{item[0]}]  Error: TDO check failed at line {item[5]}: {e}")
+                error = e
+            with self._verify_cond:
+                if error is not None and self._verify_error is None:
+                    self._verify_error = error
+                self._verify_done += 1
+                self._verify_cond.notify_all()
+
+    def _submit_tdo_check(self, register: str, received: BitVector, expected: BitVector, mask: BitVector, length: int):
+        if not self.verify_lag:
+            self._check_tdo(register, received, expected, mask, length, self.current_line)
+            return
+        self._verify_submitted += 1
+        self._verify_pending.append((self._verify_submitted, self.command_index))
+        self._verify_queue.put((register, received, expected, mask, length, self.current_line))
+
+    def _add_error(self):
+        with self._error_lock:
+            self.error_count += 1
+
+    def _check_tdo(self, register: str, received: BitVector, expected: BitVector, mask: BitVector, length: int,
+                   line_num: int = 0):
+        result = self._verify_tdo(received, expected, mask, length)
+        self.last_verify_result = result
+        if not result:
+            self._add_error()
+            # 只给出出错位统计和位置，不再打印整段十六进制
+            print(f"[{register}]  Error: TDO mismatch at line {line_num}! {result}")
+            if self.verbose and length <= self.VERBOSE_HEX_BITS:
+                print(f"[{register}]  Expected {expected}, got {received}, Mask {mask}")
+        elif self.verbose:
+            print(f"[{register}]  Info: TDO match! Expected {expected!r}, got {received!r}")
     
-    def _verify_tdo(self, received: str, expected: str, mask: str, length: int) -> bool:
-        """验证TDO数据是否符合预期"""
-        # 确保所有字符串长度一致
-        hex_chars = (length + 3) // 4
-        received = received.zfill(hex_chars)
-        expected = expected.zfill(hex_chars)
-        mask = mask.zfill(hex_chars)
-        
-        # 转换为二进制进行比较
-        for i in range(hex_chars):
-            r_byte = int(received[i], 16)
-            e_byte = int(expected[i], 16)
-            m_byte = int(mask[i], 16)
-            
-            # 应用掩码
-            if (r_byte & m_byte) != (e_byte & m_byte):
-                return False
-        
-        return True
+    @staticmethod
+    def _as_bits(data, length: int) -> Optional[BitVector]:
+        """兼容直接传入十六进制串的调用方"""
+        if isinstance(data, str):
+            return BitVector.from_hex(data, length)
+        return data
+
+    def _verify_tdo(self, received: BitVector, expected: BitVector, mask: BitVector, length: int) -> TDOVerifyResult:
+        """验证TDO数据是否符合预期；结果可直接当作 bool 使用，失败时包含出错位的位置"""
+        return verify_tdo(received.data, expected.data, mask.data, length, self.max_mismatch_offsets)
     
+    def tck_frequency(self, frequency: Optional[float] = None) -> float:
+        """
+        实际的 TCK 频率：硬件接口选定的时钟档位优先，否则为 SVF 指定的频率。
+        给出 frequency 时返回执行 FREQUENCY frequency 之后硬件将使用的频率（用于预先估算工作量）
+        """
+        if frequency is None:
+            return getattr(self.hw_iface, 'frequency', None) or self.frequency or self.DEFAULT_FREQUENCY
+        tck_rate = getattr(self.hw_iface, 'tck_rate', None)
+        return tck_rate(frequency) if tck_rate is not None else frequency
+
     def run_test(self, run_count: int, min_time: float, end_state: TapState):
         if self.verbose:
             print(f"Run Test: {run_count} cycles, min {min_time*1e6:.1f} μs")
@@ -485,18 +1096,23 @@ class JTAGController:
         # 确保在IDLE状态
         self.goto_state(TapState.IDLE)
         
-        # 计算需要运行的时间
-        cycle_time = 1.0 / self.frequency
-        required_time = max(min_time, run_count * cycle_time)
-        
+        # 按实际 TCK 频率把最短时间换算为周期数，由适配器产生时钟完成延时，不占用主机 sleep；
+        # 周期数过多（命令包过大）时只产生 run_count 个周期，剩余时间由接口在主机侧补足
+        cycles = runtest_cycles(run_count, min_time, self.tck_frequency(), self.MAX_RUNTEST_CYCLES)
+
         # 执行运行
-        self.hw_iface.pulse_tck(0, run_count, required_time)
+        self._flush_tms()
+        self.hw_iface.pulse_tck(0, cycles, min_time)
         
         # 转换到结束状态
         self.goto_state(end_state)
     
     def execute_command(self, command: SVFCommand) -> bool:
         """执行单个命令，返回是否成功"""
+        self.command_index += 1
+        self.current_line = command.line_num
+        if self.verify_lag:
+            self._wait_verify_lag()
         try:
             if self.verbose and command.cmd_type != SVFCommandType.COMMENT:
                 print(f"Executing: {command.raw_line}")
@@ -504,48 +1120,48 @@ class JTAGController:
             if command.cmd_type == SVFCommandType.COMMENT:
                 # 注释行，只记录不执行
                 if self.verbose:
-                    print(f"Comment: {command.params['comment']}")
+                    print(f"Comment: {command.comment}")
             
             elif command.cmd_type == SVFCommandType.ENDIR:
-                self.endir_state = command.params.get('state', TapState.IDLE)
+                self.endir_state = command.state if command.state is not None else TapState.IDLE
             
             elif command.cmd_type == SVFCommandType.ENDDR:
-                self.enddr_state = command.params.get('state', TapState.IDLE)
+                self.enddr_state = command.state if command.state is not None else TapState.IDLE
             
             elif command.cmd_type == SVFCommandType.STATE:
-                for state in command.params.get('states', []):
+                for state in command.states or ():
                     self.goto_state(state)
             
             elif command.cmd_type == SVFCommandType.FREQUENCY:
-                new_freq = command.params.get('frequency', self.frequency)
-                if new_freq != self.frequency:
+                new_freq = command.frequency if command.frequency is not None else self.frequency
+                if new_freq is not None and new_freq != self.frequency:
                     self.frequency = new_freq
                     if self.hw_iface:
+                        self._flush_tms()
                         self.hw_iface.set_frequency(self.frequency)
             
             elif command.cmd_type == SVFCommandType.SIR:
-                length = command.params.get('length', 0)
-                tdi = command.params.get('tdi', "0")
-                tdo = command.params.get('tdo', None)
-                mask = command.params.get('mask', None)
+                length, tdi, tdo, mask = self._resolve_scan(command)
                 self.shift_ir(tdi, length, tdo, mask)
             
             elif command.cmd_type == SVFCommandType.SDR:
-                length = command.params.get('length', 0)
-                tdi = command.params.get('tdi', "0")
-                tdo = command.params.get('tdo', None)
-                mask = command.params.get('mask', None)
+                length, tdi, tdo, mask = self._resolve_scan(command)
                 self.shift_dr(tdi, length, tdo, mask)
             
+            elif command.cmd_type in _PADDING_COMMANDS:
+                length, tdi, tdo, mask = self._resolve_scan(command)
+                self.set_padding(command.cmd_type, length, tdi, tdo, mask)
+            
             elif command.cmd_type == SVFCommandType.RUNTEST:
-                run_count = command.params.get('run_count', 0)
-                min_time = command.params.get('min_time', 0.0)
-                end_state = command.params.get('end_state', self.enddr_state)
+                run_count = command.run_count or 0
+                min_time = command.min_time or 0.0
+                end_state = command.end_state if command.end_state is not None else self.enddr_state
                 self.run_test(run_count, min_time, end_state)
             
             elif command.cmd_type == SVFCommandType.TRST:
-                mode = command.params.get('mode', 'OFF')
+                mode = command.mode or 'OFF'
                 if self.hw_iface:
+                    self._flush_tms()
                     self.hw_iface.set_trst(mode)
             
             # 其他命令处理...
@@ -557,7 +1173,7 @@ class JTAGController:
         
         except Exception as e:
             print(f"Error executing command (line {command.line_num}): {e}")
-            self.error_count += 1
+            self._add_error()
             return False
 
 # 增强硬件接口抽象类
@@ -566,6 +1182,14 @@ class JTAGHardwareInterface:
         """设置TCK频率"""
         pass
     
+    def tck_rate(self, frequency: float) -> float:
+        """set_frequency(frequency) 之后实际使用的 TCK 频率，默认与请求相同"""
+        return frequency
+
+    def reset_clock(self):
+        """恢复打开时的 TCK 频率（复用同一接口执行新任务前调用）"""
+        pass
+    
     def set_trst(self, mode: str):
         """设置TRST信号状态"""
         pass
@@ -578,29 +1202,193 @@ class JTAGHardwareInterface:
         """生成TCK脉冲"""
         pass
     
-    def shift_data(self, tdi_data_in: str, w_length: int, is_dr: bool, is_read: bool) -> str:
+    def shift_data(self, tdi_data_in: BitVector, w_length: int, is_dr: bool, is_read: bool) -> BitVector:
         """移位数据并返回TDO"""
-        return ""
+        return BitVector.zeros(w_length)
+
+    def shift_data_stream(self, tdi_data_in: BitVector, w_length: int, is_dr: bool,
+                          sink: Callable[[bytes], None]) -> BitVector:
+        """回读移位，TDO 按 LSB-first 字节顺序交给 sink（可分多次）；分块传输的接口可逐块交付，不保留整段 TDO"""
+        tdo = self.shift_data(tdi_data_in, w_length, is_dr, True)
+        sink(tdo.data)
+        return tdo
+
+    def flush(self):
+        """发送所有尚未写出的操作"""
+        pass
 
 # 增强模拟JTAG接口
+class CtypesBufferPool:
+    """
+    按 2 的幂分级复用的 ctypes 扫描缓冲区。TDI 经 memoryview 原地写入、TDO 原地读出，
+    相同大小级别的扫描不再重复分配，长时间烧录时内存占用保持平稳。
+    每个级别最多保留 max_per_class 个空闲缓冲区；不是线程安全的，每个接口一个。
+    """
+    MIN_SIZE = 64
+
+    def __init__(self, max_per_class: int = 2):
+        self.max_per_class = max_per_class
+        self.allocations = 0
+        self._free: Dict[int, list] = {}
+
+    def acquire(self, size: int):
+        """返回至少 size 字节的 (ctypes 数组, 字节 memoryview)"""
+        size_class = max(self.MIN_SIZE, 1 << (size - 1).bit_length())
+        free = self._free.get(size_class)
+        if free:
+            return free.pop()
+        self.allocations += 1
+        buf = (ctypes.c_ubyte * size_class)()
+        return buf, memoryview(buf).cast('B')
+
+    def release(self, entry):
+        free = self._free.setdefault(len(entry[1]), [])
+        if len(free) < self.max_per_class:
+            free.append(entry)
+
+
 class Ch347_JTAGInterface(JTAGHardwareInterface):
-    def __init__(self, verbose: bool = True):
-        self.frequency = 1e6
+    IDCODE_PROBE_SAMPLES = 8  # 自动探测时每个时钟档位读取 IDCODE 的次数
+
+    def __init__(self, verbose: bool = True, device=None, clock_index: int = 1, owns_device: Optional[bool] = None):
         self.trst_state = 'OFF'
         self.verbose = verbose
-        self.ch347 = ch347()
+        # device 可传入已创建的 ch347 实例（或接口兼容的对象）；已打开的设备（如 open_session）直接复用。
+        # owns_device 为 True 时由本接口在 close() 时关闭设备；默认只关闭由本接口打开的设备
+        self.ch347 = device if device is not None else ch347()
+        if owns_device is None:
+            owns_device = not getattr(self.ch347, 'is_open', False)
+        self.owns_device = owns_device
         self.device_opened = self.ch347.open_device()
         if not self.device_opened:
             print("Failed to open CH347 device")
             exit()
-        self.ch347.jtag_init(1)
+        self.clock_index = clock_index
+        self.default_clock_index = clock_index
+        self.frequency = JTAG_CLOCK_RATES[clock_index]
+        # 会话中已按相同时钟初始化过则不再重复 jtag_init
+        if getattr(self.ch347, 'clock_index', None) != clock_index:
+            self.ch347.jtag_init(clock_index)
+        self.auto_max_index = None  # 自动探测得到的最高可靠时钟档位
+        self.batch = None  # 批量模式下的命令缓冲
+        self.chunk_bytes = 64 * 1024  # 超过该大小的扫描分块流水发送
+        self._prep_pool = None
+        self.buffers = CtypesBufferPool()
+
+    def close(self):
+        """发送剩余操作；设备由本接口打开时关闭句柄"""
+        self.flush()
+        if self._prep_pool is not None:
+            self._prep_pool.shutdown()
+            self._prep_pool = None
+        if self.owns_device and self.device_opened:
+            self.ch347.close_device()
+            self.device_opened = False
+
+    def set_chunk_size(self, chunk_bytes: int):
+        """设置大扫描的分块大小（字节），0 表示不分块"""
+        self.chunk_bytes = max(0, chunk_bytes)
+
+    def enable_batching(self, bulk_size: int = 8 * CH347_USB_PACKET_SIZE):
+        """批量模式：TMS/TCK/无需回读的移位组装成 CH347 命令包，缓冲区满或需要回读TDO时才写出"""
+        self.batch = CH347CommandBatch(self.ch347.write_data, bulk_size)
+
+    def flush(self):
+        if self.batch is not None:
+            self.batch.flush()
     
     def set_frequency(self, frequency: float):
-        self.frequency = frequency
-        if self.device_opened:
-            self.ch347.jtag_init(1)
+        """选择不超过 frequency 的最快时钟档位；启用 auto-max 时使用探测结果"""
+        clock_index = self._clock_index_for(frequency)
+        self._set_clock_index(clock_index)
         if self.verbose:
-            print(f"Setting TCK frequency: {frequency/1e6:.1f} MHz")
+            print(f"Setting TCK frequency: {frequency/1e6:.1f} MHz -> {self.frequency/1e6:.3f} MHz (clock index {clock_index})")
+
+    def tck_rate(self, frequency: float) -> float:
+        return JTAG_CLOCK_RATES[self._clock_index_for(frequency)]
+
+    def reset_clock(self):
+        """恢复默认时钟档位；启用 auto-max 时为探测结果"""
+        self._set_clock_index(self.auto_max_index if self.auto_max_index is not None else self.default_clock_index)
+
+    def _clock_index_for(self, frequency: float) -> int:
+        if self.auto_max_index is not None:
+            return self.auto_max_index
+        return jtag_clock_index(frequency)
+
+    def _set_clock_index(self, clock_index: int):
+        if clock_index != self.clock_index and self.device_opened:
+            self.flush()
+            self.ch347.jtag_init(clock_index)
+        self.clock_index = clock_index
+        self.frequency = JTAG_CLOCK_RATES[clock_index]
+
+    def read_idcode(self) -> int:
+        """复位 TAP 后读取扫描链第一个器件的 IDCODE，结束时 TAP 回到 RESET"""
+        self.flush()
+        self.ch347.jtag_tms_shift(0x1F, 5, 0)   # -> RESET
+        self.ch347.jtag_tms_shift(0b0010, 4, 0)  # RESET -> IDLE -> DRSELECT -> DRCAPTURE -> DRSHIFT
+        buf = ctypes.create_string_buffer(4)
+        self.ch347.jtag_ioscan(ctypes.byref(buf), 32, True)
+        self.ch347.jtag_tms_shift(0x1F, 5, 0)   # DREXIT1 -> RESET
+        return int.from_bytes(buf.raw[:4], 'little')
+
+    def _adapter_id(self) -> str:
+        get_info = getattr(self.ch347, 'get_device_info', None)
+        info = get_info() if get_info else None
+        if info is not None and info.DeviceID:
+            return info.DeviceID.decode('ascii', 'replace')
+        return f"index{getattr(self.ch347, 'device_index', 0)}"
+
+    def probe_max_clock(self, samples: int = IDCODE_PROBE_SAMPLES) -> Tuple[int, int]:
+        """
+        从最低档位开始逐级升高时钟，每档读取 samples 次 IDCODE，
+        返回 (与最低档一致的最高档位, IDCODE)。结束时保持在该档位。
+        """
+        self._set_clock_index(0)
+        idcode = self.read_idcode()
+        best = 0
+        if idcode in (0, 0xFFFFFFFF) or not idcode & 1:
+            print(f"Warning: No valid IDCODE at the lowest clock (0x{idcode:08x}), keeping clock index 0")
+            return best, idcode
+        for clock_index in range(1, len(JTAG_CLOCK_RATES)):
+            self._set_clock_index(clock_index)
+            if any(self.read_idcode() != idcode for _ in range(samples)):
+                break
+            best = clock_index
+        self._set_clock_index(best)
+        return best, idcode
+
+    def enable_auto_max(self, cache_file: Optional[str] = os.path.join(DEFAULT_CACHE_DIR, "clock_cache.json")):
+        """
+        auto-max 模式：用探测到的最快可靠时钟代替 SVF 中的 FREQUENCY。
+        结果按 适配器/目标IDCODE 缓存到 cache_file，命中时只在最低档读取一次 IDCODE。
+        """
+        self._set_clock_index(0)
+        idcode = self.read_idcode()
+        key = f"{self._adapter_id()}:{idcode:08x}"
+        cache = {}
+        if cache_file and os.path.exists(cache_file):
+            try:
+                with open(cache_file, 'r') as f:
+                    cache = json.load(f)
+            except (OSError, ValueError):
+                cache = {}
+
+        if key in cache:
+            clock_index = int(cache[key])
+            if self.verbose:
+                print(f"Using cached max clock index {clock_index} for {key}")
+        else:
+            clock_index, idcode = self.probe_max_clock()
+            cache[key] = clock_index
+            if cache_file:
+                os.makedirs(os.path.dirname(os.path.abspath(cache_file)), exist_ok=True)
+                with open(cache_file, 'w') as f:
+                    json.dump(cache, f, indent=2)
+        self.auto_max_index = clock_index
+        self._set_clock_index(clock_index)
+        return clock_index
 
     def set_trst(self, mode: str):
         self.trst_state = mode
@@ -612,130 +1400,388 @@ class Ch347_JTAGInterface(JTAGHardwareInterface):
         if self.verbose:
             print(f"Pulsing TMS={tms} for {count} cycles")
         
-        if self.device_opened:
+        if self.batch is not None:
+            self.batch.tms(tms, count)
+        elif self.device_opened:
             self.ch347.jtag_tms_shift(tms, count, 0)
         
         # time.sleep(count / self.frequency)
     
     def pulse_tck(self, tms: int, count: int, min_time: float = 0.0):
-        # 情况1：TCK周期数有效（count > 0）- 按周期处理
+        # 按周期产生 TCK：整字节部分为 0xD3 全零数据包（每字节 8 个周期），余数为 0xD1 位操作包，
+        # 周期数与 count 严格一致，RUNTEST 的延时随命令流在适配器上完成
         if count > 0:
-            nb8 = (count + 7) // 8
-            nb1 = count % 8
-            cmd_pack = (ctypes.c_byte * ((nb1 * 2) + 3))
-            cmd_length = 3
-            # 计算周期对应的时间
-            cycle_time = count / self.frequency
-            sleep_time = max(cycle_time, min_time)  # 取周期时间和最小时间的最大值
-            
             if self.verbose:
-                print(f"Pulsing TCK (TMS={tms}) for {count} cycles ({sleep_time*1e6:.1f} μs)")
-            
-            if self.device_opened:
-                tck_value = (ctypes.c_ubyte * ((count + 7) // 8))()  # 创建周期数据数组
-                self.ch347.jtag_ioscan_t(ctypes.byref(tck_value), (nb8 * 8), False, False)  # 硬件周期脉冲
-                cmd_pack = [0xD1, nb1 * 2 + 1, 0x00]
-                for i in range(nb1):
-                    cmd_pack.append(0)
-                    cmd_pack.append(1)
-                    cmd_length += 2
-                cmd_pack.append(0)
-                cmd_length += 1
-
-                result = self.ch347.write_data(bytes(cmd_pack), cmd_length)
-            # 如需额外延时可取消注释
-            # time.sleep(sleep_time - cycle_time)
-        
-        # 情况2：TCK周期数无效（count <= 0）但指定了最小时间 - 按时间处理
-        elif min_time > 0:
-            if self.verbose:
-                print(f"Delaying TCK (TMS={tms}) for {min_time*1e6:.1f} μs (no cycles)")
-            
-            # 直接延时，不产生TCK脉冲
-            time.sleep(min_time)
-        
-        # 情况3：周期数和时间均无效 - 跳过
-        else:
+                print(f"Pulsing TCK (TMS={tms}) for {count} cycles ({count / self.frequency * 1e6:.1f} μs)")
+
+            if self.batch is not None:
+                self.batch.clock(count, tms)
+            elif self.device_opened:
+                clocks = CH347CommandBatch(self.ch347.write_data)
+                clocks.clock(count, tms)
+                clocks.flush()
+
+        # count 个周期不足 min_time 时（周期数超过上限或未指定周期）才在主机侧补足剩余时间
+        remaining = min_time - count / self.frequency
+        if remaining > 0:
             if self.verbose:
-                print(f"Skipping TCK operation: count={count}, min_time={min_time}")
+                print(f"Delaying TCK (TMS={tms}) for {remaining*1e6:.1f} μs on the host")
+
+            # 延时前先让已排队的操作执行完
+            self.flush()
+            time.sleep(remaining)
+
+    def shift_data(self, tdi_data_in: BitVector, w_length: int, is_dr: bool, is_read: bool) -> BitVector:
+        if self.batch is not None:
+            if not is_read:
+                # 不需要TDO的移位直接排队，TDO 与不回读时一样返回原TDI
+                self.batch.shift(tdi_data_in.data, w_length)
+                return tdi_data_in
+            self.batch.flush()
 
-    def shift_data(self, tdi_data_in: str, w_length: int, is_dr: bool, is_read: bool) -> str:
         if self.device_opened:
-            try:
-                # 将十六进制字符串转换为字节数组（自动处理2字符→1字节）
-                # tdi_data_in = tdi_data_in[::-1]
-                tdi_bytes = bytes.fromhex(tdi_data_in)
-                tdi_bytes = tdi_bytes[::-1]
-            except ValueError as e:
-                if self.verbose:
-                    print(f"Error converting TDI data: {e}")  # 处理无效十六进制（如奇数长度、非十六进制字符）
-                return ""
-            
             total_length = w_length
             byte_length = (w_length + 7) // 8
-            tdo_result = b''  
+            if self.chunk_bytes and byte_length > self.chunk_bytes:
+                return self._shift_chunked(tdi_data_in.data, w_length, is_read)
+
+            # 位向量本身就是 LSB-first 字节，直接写入复用的缓冲区；DLL 把 TDO 原地写回同一缓冲区
+            entry = self.buffers.acquire(byte_length)
+            buf, view = entry
+            try:
+                view[:byte_length] = tdi_data_in.data[:byte_length]
+                self.ch347.jtag_ioscan(ctypes.byref(buf), total_length, is_read)
+                if not is_read:
+                    return BitVector(tdi_data_in.data, w_length)
+                # 返回的TDO需独立于缓冲区（延迟校验时在后台线程比较）
+                return BitVector(bytes(view[:byte_length]), w_length)
+            finally:
+                self.buffers.release(entry)
+
+    def shift_data_stream(self, tdi_data_in: BitVector, w_length: int, is_dr: bool,
+                          sink: Callable[[bytes], None]) -> BitVector:
+        if self.device_opened and self.chunk_bytes and (w_length + 7) // 8 > self.chunk_bytes:
+            if self.batch is not None:
+                self.batch.flush()
+            return self._shift_chunked(tdi_data_in.data, w_length, True, sink)
+        return super().shift_data_stream(tdi_data_in, w_length, is_dr, sink)
 
-            tdi_buf = ctypes.create_string_buffer(tdi_bytes)  # TDI缓冲区
-            tdo_buf = ctypes.create_string_buffer(byte_length)
+    def _shift_chunked(self, data, w_length: int, is_read: bool,
+                       sink: Optional[Callable[[bytes], None]] = None) -> BitVector:
+        """
+        双缓冲分块移位：第 N 块通过 jtag_ioscan_t 发送时，工作线程把第 N-1 块的TDO取出
+        并把第 N+1 块填入另一个缓冲区。只有最后一块 is_last_packge=True，在最后一位退出到 Exit1。
+        给出 sink 时每块 TDO 取出后直接交给 sink，不拼接整段 TDO，返回原 TDI。
+        """
+        chunk_bytes = self.chunk_bytes
+        byte_length = (w_length + 7) // 8
+        offsets = range(0, byte_length, chunk_bytes)
+        src = memoryview(data)
+        entries = [self.buffers.acquire(chunk_bytes) for _ in range(2)]
+        buffers = [buf for buf, _ in entries]
+        views = [view[:chunk_bytes] for _, view in entries]
+        tdo = bytearray(byte_length) if is_read and sink is None else None
+        if self._prep_pool is None:
+            self._prep_pool = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="ch347-prep")
 
-            self.ch347.jtag_ioscan(ctypes.byref(tdi_buf), total_length, is_read)
-            tdo_result = tdi_buf.raw
-            tdo_result = tdo_result[:-1]
+        def prepare(index: int):
+            view = views[index % 2]
+            # 取出上一次使用该缓冲区的块的TDO
+            if index >= 2:
+                if sink is not None:
+                    sink(view)
+                elif tdo is not None:
+                    done = offsets[index - 2]
+                    tdo[done:done + chunk_bytes] = view
+            if index < len(offsets):
+                start = offsets[index]
+                size = min(chunk_bytes, byte_length - start)
+                view[:size] = src[start:start + size]
 
-            # 转换为十六进制字符串返回
-            tdo_data = tdo_result[::-1].hex().upper()
-            return tdo_data
+        try:
+            prepare(0)
+            for index, start in enumerate(offsets):
+                pending = self._prep_pool.submit(prepare, index + 1)
+                is_last = index == len(offsets) - 1
+                bits = w_length - start * 8 if is_last else chunk_bytes * 8
+                self.ch347.jtag_ioscan_t(ctypes.byref(buffers[index % 2]), bits, is_read, is_last)
+                pending.result()
+
+            # 最后一块的TDO
+            last = len(offsets) - 1
+            start = offsets[last]
+            if sink is not None:
+                sink(views[last % 2][:byte_length - start])
+            if tdo is None:
+                return BitVector(data, w_length)
+            tdo[start:] = views[last % 2][:byte_length - start]
+            return BitVector(tdo, w_length)
+        finally:
+            for entry in entries:
+                self.buffers.release(entry)
 
 # 增强 SVF 播放器
+def command_work(command: SVFCommand, frequency: float,
+                 max_cycles: int = JTAGController.MAX_RUNTEST_CYCLES) -> int:
+    """命令的工作量：移位位数或 TCK 周期数（RUNTEST 与 JTAGController.run_test 相同，按实际 TCK 频率折算并受周期上限约束）"""
+    cmd_type = command.cmd_type
+    if cmd_type in (SVFCommandType.SIR, SVFCommandType.SDR):
+        return command.length or 0
+    if cmd_type == SVFCommandType.RUNTEST:
+        return runtest_cycles(command.run_count or 0, command.min_time or 0.0,
+                              frequency, max_cycles)
+    return 0
+
+
+class PlaybackProgress:
+    """进度报告：按位数+周期数计量，rate 为最近区间的 Mbit/s，eta 为剩余秒数（总量未知时为 None）"""
+    __slots__ = ('commands', 'total_commands', 'work_done', 'total_work', 'errors', 'should_abort',
+                 'elapsed', 'rate', 'eta')
+
+    def __init__(self):
+        self.commands = 0
+        self.total_commands = 0
+        self.work_done = 0
+        self.total_work = 0
+        self.errors = 0
+        self.should_abort = False
+        self.elapsed = 0.0
+        self.rate = 0.0
+        self.eta = None
+
+    @property
+    def percent(self) -> Optional[float]:
+        return self.work_done * 100.0 / self.total_work if self.total_work else None
+
+    def __str__(self):
+        if self.total_work:
+            text = f"{self.percent:5.1f}% ({self.work_done/1e6:.2f}/{self.total_work/1e6:.2f} Mbit)"
+        else:
+            text = f"{self.work_done/1e6:.2f} Mbit"
+        text += f", {self.rate:.2f} Mbit/s"
+        if self.eta is not None:
+            text += f", ETA {self.eta:.1f} s"
+        return f"{text}, commands {self.commands}, errors {self.errors}"
+
+
 class SVFPlayer:
+    _END_OF_STREAM = object()
+    RATE_SMOOTHING = 0.3  # 吞吐率指数平滑系数
+
     def __init__(self, jtag_controller: JTAGController):
         self.jtag = jtag_controller
         self.parser = SVFParser(verbose=jtag_controller.verbose)
         self.progress_callback = None
         self.max_errors = 1  # 最大允许错误数
+        self.streaming = False
+        self.queue_depth = 32  # 流式模式下解析线程最多领先执行的命令数
+        self.cache_dir = None  # 编译缓存目录，None 表示不使用缓存
+        self.progress_reporter = None
+        self.progress_interval = 0.5
     
     def set_progress_callback(self, callback: Callable[[int, int, int, bool], None]):
+        """每条命令执行后回调 (current, total, errors, should_abort)"""
         self.progress_callback = callback
+
+    def set_progress_reporter(self, reporter: Callable[[PlaybackProgress], None], interval: float = 0.5):
+        """
+        按工作量（移位位数 + TCK 周期数）报告进度，最多每 interval 秒回调一次；
+        结束或中止时总会回调最后一次。
+        """
+        self.progress_reporter = reporter
+        self.progress_interval = interval
     
     def set_max_errors(self, max_errors: int):
         """设置最大允许错误数，0表示无限制"""
         self.max_errors = max_errors
+
+    def set_streaming(self, streaming: bool, queue_depth: int = 32):
+        """流式模式：边解析边执行，解析线程通过有界队列领先执行线程"""
+        self.streaming = streaming
+        self.queue_depth = max(1, queue_depth)
+    
+    def set_cache_dir(self, cache_dir: Optional[str] = DEFAULT_CACHE_DIR):
+        """
+        启用编译缓存（.svfc），再次播放同一文件时直接映射编译结果；None 表示关闭。
+        流式模式不使用缓存：计算摘要和编译都要先读完整个文件，会推迟第一次移位。
+        """
+        self.cache_dir = cache_dir
     
     def play_svf(self, filename: str) -> bool:
+        if filename.endswith('.svfc') or (self.cache_dir is not None and not self.streaming):
+            # svf_compile 依赖本模块，在此处延迟导入
+            from svf_compile import SVFCache
+            try:
+                compiled = SVFCache(self.cache_dir or DEFAULT_CACHE_DIR, self.jtag.verbose).load(filename, self.parser)
+            except Exception as e:
+                print(f"Error loading compiled SVF: {e}")
+                return False
+            with compiled:
+                total_work = self._total_work(compiled.iter_commands()) if self.progress_reporter else 0
+                return self._play_commands(compiled.iter_commands(), len(compiled), total_work)
+
+        if self.streaming:
+            return self._play_commands(self._stream_commands(filename), 0)
+
         if not self.parser.parse_file(filename):
             print("Failed to parse SVF file")
             return False
         
-        total_commands = len(self.parser.commands)
+        total_work = self._total_work(self.parser.commands) if self.progress_reporter else 0
+        return self._play_commands(self.parser.commands, len(self.parser.commands), total_work)
+
+    def play_commands(self, commands, total_commands: int = 0) -> bool:
+        """执行已解析/编译好的命令序列（只读，可由多个播放器共享）"""
+        total_work = self._total_work(commands) if self.progress_reporter and total_commands else 0
+        return self._play_commands(iter(commands), total_commands, total_work)
+
+    def _total_work(self, commands) -> int:
+        """预先累计全部命令的工作量，跟随 FREQUENCY 按硬件实际采用的 TCK 频率折算 RUNTEST"""
+        frequency = self.jtag.tck_frequency()
+        total = 0
+        for cmd in commands:
+            if cmd.cmd_type == SVFCommandType.FREQUENCY and cmd.frequency is not None:
+                frequency = self.jtag.tck_frequency(cmd.frequency)
+            total += command_work(cmd, frequency, self.jtag.MAX_RUNTEST_CYCLES)
+        return total
+
+    def _report_progress(self, progress: PlaybackProgress, now: float, last_time: float, last_work: int):
+        progress.elapsed = now - self._start_time
+        interval = now - last_time
+        if interval > 0:
+            rate = (progress.work_done - last_work) / interval / 1e6
+            progress.rate = rate if not progress.rate else \
+                self.RATE_SMOOTHING * rate + (1 - self.RATE_SMOOTHING) * progress.rate
+        if progress.total_work and progress.rate > 0:
+            progress.eta = (progress.total_work - progress.work_done) / (progress.rate * 1e6)
+        self.progress_reporter(progress)
+
+    def _play_commands(self, commands, total_commands: int, total_work: int = 0) -> bool:
+        """执行命令序列；total_commands/total_work 为 0 表示总数未知（流式模式）"""
         executed_commands = 0
         should_abort = False
+        reporter = self.progress_reporter
+        if reporter:
+            progress = PlaybackProgress()
+            progress.total_commands = total_commands
+            progress.total_work = total_work
+            self._start_time = last_time = time.perf_counter()
+            last_work = 0
+        # 出错时区分：正在处理的命令、命令全部执行后的写出与后台校验（均为播放错误），其余为取下一条命令时的解析错误
+        current = None
+        last_line = 0
+        finishing = False
         
-        for i, cmd in enumerate(self.parser.commands):
-            # 执行当前命令
-            success = self.jtag.execute_command(cmd)
-            executed_commands += 1
-            
-            # 检查错误计数是否超过阈值
-            if self.max_errors > 0 and self.jtag.error_count >= self.max_errors:
-                should_abort = True
-                # if self.verbose:
-                #     print(f"\nAborting due to {self.jtag.error_count} errors (max allowed: {self.max_errors})")
-            
-            # 调用进度回调
-            if self.progress_callback:
-                self.progress_callback(
-                    i + 1, 
-                    total_commands, 
-                    self.jtag.error_count,
-                    should_abort
-                )
-            
-            # 如果需要中止，跳出循环
-            if should_abort:
-                break
+        try:
+            for cmd in commands:
+                current = cmd
+                last_line = cmd.line_num
+                # 执行当前命令
+                success = self.jtag.execute_command(cmd)
+                executed_commands += 1
+                
+                # 检查错误计数是否超过阈值
+                if self.max_errors > 0 and self.jtag.error_count >= self.max_errors:
+                    should_abort = True
+                    # if self.verbose:
+                    #     print(f"\nAborting due to {self.jtag.error_count} errors (max allowed: {self.max_errors})")
+                
+                # 调用进度回调
+                if self.progress_callback:
+                    self.progress_callback(
+                        executed_commands, 
+                        total_commands, 
+                        self.jtag.error_count,
+                        should_abort
+                    )
+
+                if reporter:
+                    progress.commands = executed_commands
+                    progress.work_done += command_work(cmd, self.jtag.tck_frequency(),
+                                                       self.jtag.MAX_RUNTEST_CYCLES)
+                    now = time.perf_counter()
+                    if now - last_time >= self.progress_interval or should_abort:
+                        progress.errors = self.jtag.error_count
+                        progress.should_abort = should_abort
+                        self._report_progress(progress, now, last_time, last_work)
+                        last_time, last_work = now, progress.work_done
+                
+                # 如果需要中止，跳出循环
+                if should_abort:
+                    break
+                current = None
+            else:
+                finishing = True
+                if reporter:
+                    # 最后一次报告：等待写出与校验完成后再计算
+                    self.jtag.flush()
+                    self.jtag.drain_verification()
+                    progress.errors = self.jtag.error_count
+                    self._report_progress(progress, time.perf_counter(), last_time, last_work)
+            # 后台校验中的异常在这里抛出
+            current = None
+            finishing = True
+            self.jtag.flush()
+            self.jtag.drain_verification()
+        except Exception as e:
+            if current is not None:
+                print(f"Error playing SVF at line {current.line_num}: {e}")
+            elif finishing:
+                print(f"Error playing SVF after line {last_line}: {e}")
+            else:
+                print(f"Error parsing SVF file: {e}")
+            return False
+        finally:
+            # 正常结束时已在上面写出并等待校验；这里只在出错后尽量收尾，错误已经报告过
+            try:
+                self.jtag.flush()
+                self.jtag.drain_verification()
+            except Exception:
+                pass
+            # 提前退出时通知解析线程停止
+            close = getattr(commands, 'close', None)
+            if close is not None:
+                close()
         
         return self.jtag.error_count == 0
 
+    def _stream_commands(self, filename: str) -> Iterator[SVFCommand]:
+        """后台线程解析文件并放入有界队列，当前线程按顺序取出命令"""
+        cmd_queue = queue.Queue(maxsize=self.queue_depth)
+        stop = threading.Event()
+
+        def put(item) -> bool:
+            while not stop.is_set():
+                try:
+                    cmd_queue.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def producer():
+            try:
+                for command in self.parser.iter_file(filename):
+                    if not put(command):
+                        return
+                put(self._END_OF_STREAM)
+            except Exception as e:
+                put(e)
+
+        worker = threading.Thread(target=producer, name="svf-parser", daemon=True)
+        worker.start()
+        try:
+            while True:
+                item = cmd_queue.get()
+                if item is self._END_OF_STREAM:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            stop.set()
+            worker.join()
+
 def format_speed(bytes_per_sec):
     """格式化下载速率，自动选择合适的单位"""
     if bytes_per_sec >= 1024 * 1024:
@@ -747,11 +1793,37 @@ def format_speed(bytes_per_sec):
 
 # 主函数
 def main():
-    if len(sys.argv) < 2:
-        print("Usage: python svf_player.py <svf_file>")
-        return
+    parser = argparse.ArgumentParser(prog="svf_player.py", description="Play an SVF file through a CH347 adapter")
+    parser.add_argument("svf_file", help="SVF file to play")
+    parser.add_argument("--stream", action="store_true",
+                        help="parse and execute concurrently instead of parsing the whole file first")
+    parser.add_argument("--queue-depth", type=int, default=32,
+                        help="max commands the parser may run ahead in --stream mode (default: 32)")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR,
+                        help=f"directory for compiled .svfc files (default: {DEFAULT_CACHE_DIR}; not used with --stream)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="always parse the SVF instead of using the compiled cache")
+    parser.add_argument("--deferred-verify", type=int, metavar="LAG", default=0,
+                        help="verify TDO on a background thread; errors may be noticed up to LAG commands late")
+    parser.add_argument("--serial", help="use the CH347 adapter with this DeviceID instead of the first one")
+    parser.add_argument("--usb", action="store_true",
+                        help="talk to the adapter directly through libusb (pyusb) instead of CH347DLL, e.g. on Linux")
+    parser.add_argument("--auto-max", action="store_true",
+                        help="probe the fastest TCK that reads IDCODE back reliably and use it instead of SVF FREQUENCY")
+    parser.add_argument("--batch", action="store_true",
+                        help="queue JTAG operations into large USB bulk writes, flushing only for TDO readback")
+    parser.add_argument("--progress-interval", type=float, default=0.5, metavar="SECONDS",
+                        help="minimum time between progress updates (default: 0.5)")
+    parser.add_argument("--profile", metavar="TRACE_JSON",
+                        help="time every command, interface method and DLL call; print a summary and write a Chrome trace")
+    parser.add_argument("--capture", metavar="FILE",
+                        help="write the TDO of every SDR that reads back to FILE, indexed in FILE.idx")
+    parser.add_argument("--capture-lines", metavar="LINES",
+                        help="comma separated SVF line numbers of the scans to capture; readback is forced for them")
+    parser.add_argument("--capture-ir", action="store_true", help="also capture SIR readback")
+    args = parser.parse_args()
     
-    svf_file = sys.argv[1]
+    svf_file = args.svf_file
 
     # 检查文件是否存在
     if not os.path.exists(svf_file):
@@ -768,35 +1840,70 @@ def main():
         exit(-1)
     
     # 创建硬件接口和控制器
-    hw_iface = Ch347_JTAGInterface(verbose=False)
+    if args.usb:
+        # 原生 USB 传输：不依赖 Windows DLL，--serial 对应 USB 序列号字符串
+        hw_iface = Ch347_JTAGInterface(verbose=False, device=ch347_usb(serial=args.serial))
+    elif args.serial:
+        try:
+            device = open_session(serial=args.serial)
+        except OSError as e:
+            print(f"Error: {e}")
+            return 1
+        # 会话由本次运行独占，播放结束时随接口一起关闭
+        hw_iface = Ch347_JTAGInterface(verbose=False, device=device, owns_device=True)
+    else:
+        hw_iface = Ch347_JTAGInterface(verbose=False)
+    if args.auto_max:
+        clock_index = hw_iface.enable_auto_max()
+        print(f"Auto-max TCK: {JTAG_CLOCK_RATES[clock_index]/1e6:.3f} MHz (clock index {clock_index})")
+    if args.batch:
+        hw_iface.enable_batching()
     jtag_controller = JTAGController(verbose=False)
     jtag_controller.set_hardware_interface(hw_iface)
+    if args.deferred_verify > 0:
+        jtag_controller.set_deferred_verify(True, args.deferred_verify)
+    profiler = None
+    if args.profile:
+        from svf_profile import PlaybackProfiler
+        profiler = PlaybackProfiler(trace=True).attach(jtag_controller)
+    capture = None
+    if args.capture:
+        from svf_capture import TDOCapture
+        lines = [int(line) for line in args.capture_lines.split(",")] if args.capture_lines else None
+        capture = TDOCapture(args.capture, lines, args.capture_ir)
+        jtag_controller.set_capture(capture)
     
     # 创建SVF播放器
     player = SVFPlayer(jtag_controller)
     player.set_max_errors(1)  # 设置最大允许错误数为1
+    player.set_streaming(args.stream, args.queue_depth)
+    player.set_cache_dir(None if args.no_cache else args.cache_dir)
     
-    # 设置进度回调
-    def progress_callback(current, total, errors, should_abort):
-        percent = (current / total) * 100
-        status = f"Processing: {current}/{total} commands ({percent:.1f}%), Errors: {errors}"
-        
-        if should_abort:
+    # 设置进度回调：按移位位数+TCK周期计量，限频刷新同一行
+    def progress_reporter(progress: PlaybackProgress):
+        status = f"Processing: {progress}"
+        if progress.should_abort:
             status += " [ABORTING]"
-        
-        print(f"\r{status}\n", end='')
-        if current == total or should_abort:
-            print()
+        print(f"\r{status}\033[K", end='', flush=True)
     
-    player.set_progress_callback(progress_callback)
+    player.set_progress_reporter(progress_reporter, args.progress_interval)
     
     # 播放SVF文件
     print(f"Playing SVF file: {svf_file}")
     start_time = time.time()
     
     success = player.play_svf(svf_file)
+    print()
     
     elapsed = time.time() - start_time
+    if profiler is not None:
+        print(profiler.summary_table())
+        profiler.write_trace(args.profile)
+        print(f"Profile trace written to {args.profile}")
+    if capture is not None:
+        capture.close()
+        print(f"Captured {capture.records} scans ({capture.offset} bytes) to {args.capture}")
+    hw_iface.close()
     
     if success:
         print("SVF playback completed successfully.")
@@ -810,6 +1917,10 @@ def main():
     elapsed = time.time() - start_time
     dnSpeed = file_size / elapsed
     print(f"Total time: {elapsed:.2f} seconds, Download Speed: {format_speed(dnSpeed)}")
+    if player.parser.bytes_parsed:
+        print(f"Parse throughput: {player.parser.throughput():.2f} MB/s")
+    if hw_iface.batch is not None:
+        print(f"Batching: {hw_iface.batch.summary()}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,213 @@
+import collections
+import json
+import threading
+import time
+from typing import Deque, Dict, Optional
+
+from svf_parse import SVFCommand
+
+# 需要计时的硬件接口方法（包含 pulse_tck 中按时间的 sleep）；shift_data_stream 为只为捕获而回读的大扫描的分块路径，
+# read_idcode/probe_max_clock 为 --auto-max 的时钟探测。各项为含内部调用的总耗时
+HW_METHODS = ('set_frequency', 'set_trst', 'pulse_tms', 'pulse_tck', 'shift_data', 'shift_data_stream', 'flush',
+              'read_idcode', 'probe_max_clock')
+
+# DLL 调用的数据量估算：jtag_ioscan/jtag_ioscan_t 按位数，write_data 按长度，jtag_tms_shift 每周期 2 字节加包头
+_SCAN_APIS = ('jtag_ioscan', 'jtag_ioscan_t')
+
+# 时间线最多保留的事件数（每个约 300 字节），超过后丢弃最早的事件
+DEFAULT_MAX_EVENTS = 1 << 20
+
+
+class _Stat:
+    __slots__ = ('count', 'seconds')
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+
+class InstrumentedCH347:
+    """ch347 对象的代理：统计每个 DLL API 的调用次数、耗时、移位位数与传输字节数"""
+
+    def __init__(self, device, profiler: 'PlaybackProfiler'):
+        self._device = device
+        self._profiler = profiler
+
+    def __getattr__(self, name):
+        attr = getattr(self._device, name)
+        if not callable(attr):
+            return attr
+        profiler = self._profiler
+
+        def call(*args):
+            start = time.perf_counter()
+            try:
+                return attr(*args)
+            finally:
+                profiler.record_api(name, args, start, time.perf_counter())
+
+        # 缓存包装后的方法，之后的调用不再经过 __getattr__
+        setattr(self, name, call)
+        return call
+
+
+class PlaybackProfiler:
+    """
+    播放过程的性能剖析：
+      - 每种 SVFCommandType 的 execute_command 耗时
+      - 每个硬件接口方法的耗时（含主机 sleep）
+      - 每个 DLL API 的调用次数、移位位数、传输字节数
+    attach() 以实例属性替换被测方法，未 attach 时播放路径没有任何额外开销。
+    trace=True 时另外记录每次调用的时间线，可用 write_trace() 导出为 Chrome trace JSON；
+    时间线只保留最近 max_events 个事件，长时间播放时内存占用有上限，汇总统计不受影响。
+    """
+
+    def __init__(self, trace: bool = False, max_events: int = DEFAULT_MAX_EVENTS):
+        self.trace = trace
+        self.commands: Dict[str, _Stat] = collections.defaultdict(_Stat)
+        self.hw_methods: Dict[str, _Stat] = collections.defaultdict(_Stat)
+        self.api_calls: Dict[str, _Stat] = collections.defaultdict(_Stat)
+        self.bits_shifted = 0
+        self.bytes_transferred = 0
+        self.events: Deque[Dict] = collections.deque(maxlen=max_events)
+        self.dropped_events = 0
+        self.start_time = time.perf_counter()
+        self._lock = threading.Lock()
+        self._attached = []
+
+    # ---- 记录 ----
+    def _event(self, category: str, name: str, start: float, end: float, args: Optional[Dict] = None):
+        event = {"name": name, "cat": category, "ph": "X", "pid": 0, "tid": threading.get_ident(),
+                 "ts": (start - self.start_time) * 1e6, "dur": (end - start) * 1e6}
+        if args:
+            event["args"] = args
+        if len(self.events) == self.events.maxlen:
+            self.dropped_events += 1
+        self.events.append(event)
+
+    def record_command(self, command: SVFCommand, start: float, end: float):
+        name = command.cmd_type.name
+        with self._lock:
+            stat = self.commands[name]
+            stat.count += 1
+            stat.seconds += end - start
+            if self.trace:
+                self._event("command", name, start, end, {"line": command.line_num})
+
+    def record_hw(self, name: str, start: float, end: float):
+        with self._lock:
+            stat = self.hw_methods[name]
+            stat.count += 1
+            stat.seconds += end - start
+            if self.trace:
+                self._event("hw", name, start, end)
+
+    def record_api(self, name: str, args: tuple, start: float, end: float):
+        bits = 0
+        transferred = 0
+        if name in _SCAN_APIS and len(args) >= 3:
+            bits = int(args[1])
+            transferred = (bits + 7) // 8 * (2 if args[2] else 1)
+        elif name == 'jtag_tms_shift' and len(args) >= 2:
+            bits = int(args[1])
+            transferred = 3 + 2 * bits + 1
+        elif name == 'write_data' and len(args) >= 2:
+            transferred = int(args[1])
+        with self._lock:
+            stat = self.api_calls[name]
+            stat.count += 1
+            stat.seconds += end - start
+            self.bits_shifted += bits
+            self.bytes_transferred += transferred
+            if self.trace:
+                self._event("dll", name, start, end, {"bits": bits, "bytes": transferred})
+
+    # ---- 安装/卸载 ----
+    def _wrap(self, obj, name: str, record):
+        original = getattr(obj, name)
+
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                record(name, start, time.perf_counter())
+
+        setattr(obj, name, wrapper)
+        self._attached.append((obj, name))
+
+    def attach(self, controller):
+        """为控制器及其硬件接口（以及 CH347 设备对象）安装计时钩子"""
+        original = controller.execute_command
+        profiler = self
+
+        def execute_command(command: SVFCommand) -> bool:
+            start = time.perf_counter()
+            try:
+                return original(command)
+            finally:
+                profiler.record_command(command, start, time.perf_counter())
+
+        controller.execute_command = execute_command
+        self._attached.append((controller, 'execute_command'))
+
+        hw_iface = controller.hw_iface
+        if hw_iface is None:
+            return self
+        for name in HW_METHODS:
+            if hasattr(hw_iface, name):
+                self._wrap(hw_iface, name, self.record_hw)
+
+        device = getattr(hw_iface, 'ch347', None)
+        if device is not None and not isinstance(device, InstrumentedCH347):
+            hw_iface.ch347 = InstrumentedCH347(device, self)
+            self._attached.append((hw_iface, ('ch347', device)))
+            batch = getattr(hw_iface, 'batch', None)
+            if batch is not None:
+                batch.write = hw_iface.ch347.write_data
+                self._attached.append((batch, ('write', device.write_data)))
+        return self
+
+    def detach(self):
+        for obj, item in reversed(self._attached):
+            if isinstance(item, tuple):
+                name, value = item
+                setattr(obj, name, value)
+            else:
+                # 删除实例属性后恢复为类上的方法
+                delattr(obj, item)
+        self._attached = []
+
+    # ---- 输出 ----
+    def to_dict(self) -> Dict:
+        def table(stats: Dict[str, _Stat]) -> Dict:
+            return {name: {"count": s.count, "seconds": s.seconds} for name, s in stats.items()}
+
+        return {
+            "commands": table(self.commands),
+            "hw_methods": table(self.hw_methods),
+            "api_calls": table(self.api_calls),
+            "bits_shifted": self.bits_shifted,
+            "bytes_transferred": self.bytes_transferred,
+            "dropped_events": self.dropped_events,
+        }
+
+    def summary_table(self) -> str:
+        lines = []
+        sections = (("SVF command", self.commands), ("Interface method", self.hw_methods), ("DLL API", self.api_calls))
+        for title, stats in sections:
+            if not stats:
+                continue
+            lines.append(f"{title:<20} {'count':>10} {'total ms':>12} {'avg us':>12}")
+            for name, stat in sorted(stats.items(), key=lambda item: -item[1].seconds):
+                avg = stat.seconds / stat.count * 1e6 if stat.count else 0.0
+                lines.append(f"  {name:<18} {stat.count:>10} {stat.seconds * 1e3:>12.3f} {avg:>12.1f}")
+        lines.append(f"Bits shifted: {self.bits_shifted}, bytes transferred: {self.bytes_transferred}")
+        if self.dropped_events:
+            lines.append(f"Trace kept the last {len(self.events)} events ({self.dropped_events} earlier events dropped)")
+        return "\n".join(lines)
+
+    def write_trace(self, filename: str):
+        """写出 Chrome trace 格式（chrome://tracing / Perfetto 可直接打开），附带汇总数据"""
+        with open(filename, 'w') as f:
+            json.dump({"traceEvents": list(self.events), "displayTimeUnit": "ms", "summary": self.to_dict()}, f)
@@ -0,0 +1,330 @@
+import argparse
+import os
+import sys
+import time
+from typing import List, Optional
+
+from svf_parse import (TAP_TRANSITIONS, BitVector, JTAGController, JTAGHardwareInterface,
+                       SVFPlayer, TapState)
+
+# 默认链路模型：每次硬件调用的 USB 往返延迟与批量传输带宽（CH347 高速 USB 的粗略值）
+DEFAULT_CALL_LATENCY = 125e-6
+DEFAULT_BANDWIDTH = 8e6  # 字节/秒
+DEFAULT_FREQUENCY = 1e6
+
+_SHIFT_STATES = (TapState.IRSHIFT, TapState.DRSHIFT)
+
+
+def _mask(bits: int) -> int:
+    return (1 << bits) - 1
+
+
+class SimDevice:
+    """
+    扫描链上的一个 TAP 器件。
+    IR 捕获值固定为 ...01，复位后指令为 IDCODE；未知指令选择 BYPASS。
+    寄存器值均为整数，bit0 最靠近 TDO（最先移出）。
+    """
+
+    def __init__(self, ir_length: int = 6, idcode: Optional[int] = 0x0362d093, idcode_opcode: int = 0x09):
+        self.ir_length = ir_length
+        self.idcode = idcode
+        self.idcode_opcode = idcode_opcode
+        self.bypass_opcode = _mask(ir_length)
+        self.reset()
+
+    def reset(self):
+        self.instruction = self.idcode_opcode if self.idcode is not None else self.bypass_opcode
+
+    def capture_ir(self) -> int:
+        return 0x01
+
+    def update_ir(self, value: int):
+        self.instruction = value
+
+    def dr_length(self) -> Optional[int]:
+        """当前数据寄存器长度；None 表示不限长度的数据接收端"""
+        if self.instruction == self.idcode_opcode and self.idcode is not None:
+            return 32
+        return 1
+
+    def capture_dr(self) -> int:
+        if self.instruction == self.idcode_opcode and self.idcode is not None:
+            return self.idcode
+        return 0
+
+    def sink_dr(self, value: int, bits: int):
+        """不限长度的数据寄存器接收移入的数据"""
+        pass
+
+    def update_dr(self, value: int):
+        pass
+
+    def idle_clocks(self, count: int):
+        """TAP 停留在 RUN-TEST/IDLE 时经过的 TCK 周期"""
+        pass
+
+
+class Xilinx7Device(SimDevice):
+    """
+    7 系列 FPGA 的配置相关指令模型：
+      JPROGRAM 清除配置，CFG_IN 作为比特流接收端，JSTART 在 IDLE 中运行启动时序后置位 DONE，
+      CFG_OUT 返回状态寄存器（bit27 为 DONE），IR 捕获值 bit4 为 INIT、bit5 为 DONE。
+    """
+    CFG_OUT = 0x04
+    CFG_IN = 0x05
+    IDCODE = 0x09
+    JPROGRAM = 0x0B
+    JSTART = 0x0C
+    ISC_NOOP = 0x14
+
+    STATUS_DONE = 1 << 27
+    STARTUP_CLOCKS = 64
+
+    def __init__(self, idcode: int = 0x0362d093, status: int = 0x3f5e0d40 & ~(1 << 27),
+                 min_bitstream_bits: int = 1):
+        self.status = status
+        self.min_bitstream_bits = min_bitstream_bits
+        self.bitstream_bits = 0
+        self.done = False
+        self._startup_clocks = 0
+        super().__init__(ir_length=6, idcode=idcode, idcode_opcode=self.IDCODE)
+
+    def capture_ir(self) -> int:
+        return 0x11 | (0x20 if self.done else 0)
+
+    def update_ir(self, value: int):
+        super().update_ir(value)
+        if value == self.JPROGRAM:
+            self.done = False
+            self.bitstream_bits = 0
+        elif value == self.JSTART:
+            self._startup_clocks = 0
+
+    def dr_length(self) -> Optional[int]:
+        if self.instruction == self.CFG_IN:
+            return None
+        if self.instruction == self.CFG_OUT:
+            return 32
+        return super().dr_length()
+
+    def capture_dr(self) -> int:
+        if self.instruction == self.CFG_OUT:
+            return self.status | (self.STATUS_DONE if self.done else 0)
+        return super().capture_dr()
+
+    def sink_dr(self, value: int, bits: int):
+        if self.instruction == self.CFG_IN:
+            self.bitstream_bits += bits
+
+    def idle_clocks(self, count: int):
+        if self.instruction == self.JSTART and self.bitstream_bits >= self.min_bitstream_bits:
+            self._startup_clocks += count
+            if self._startup_clocks >= self.STARTUP_CLOCKS:
+                self.done = True
+
+
+class SimulatedJTAGInterface(JTAGHardwareInterface):
+    """
+    纯软件的 JTAG 目标：逐 TCK 跟踪 TAP 状态机，移位经过扫描链上各器件的寄存器。
+    devices[0] 最靠近 TDO，与 SVF 中 HIR/HDR 在前（先移入、后到达 TDO 一侧）的约定一致。
+
+    不实际等待；elapsed 按链路模型累计：每次调用 call_latency + max(传输字节/bandwidth, TCK 周期/频率)。
+    realtime=True 时按模型时间 sleep，用于在无硬件时复现真实节奏。
+    """
+
+    def __init__(self, devices: Optional[List[SimDevice]] = None, call_latency: float = DEFAULT_CALL_LATENCY,
+                 bandwidth: float = DEFAULT_BANDWIDTH, realtime: bool = False, verbose: bool = False):
+        self.devices = devices if devices is not None else [Xilinx7Device()]
+        self.call_latency = call_latency
+        self.bandwidth = bandwidth
+        self.realtime = realtime
+        self.verbose = verbose
+        self.frequency = DEFAULT_FREQUENCY
+        self.trst_state = 'OFF'
+        self.state = TapState.RESET
+        self.tck_cycles = 0
+        self.calls = 0
+        self.bytes_transferred = 0
+        self.bits_shifted = 0
+        self.elapsed = 0.0
+        self._shift_regs = None  # 进入 SHIFT 状态前 CAPTURE 得到的各器件寄存器值
+
+    # ---- 链路模型 ----
+    def _account(self, out_bytes: int, in_bytes: int, cycles: int, min_time: float = 0.0):
+        self.calls += 1
+        self.bytes_transferred += out_bytes + in_bytes
+        self.tck_cycles += cycles
+        cost = self.call_latency + max((out_bytes + in_bytes) / self.bandwidth, cycles / self.frequency, min_time)
+        self.elapsed += cost
+        if self.realtime:
+            time.sleep(cost)
+
+    # ---- TAP 状态机 ----
+    def _reset_chain(self):
+        for device in self.devices:
+            device.reset()
+
+    def _capture(self, is_dr: bool):
+        regs = []
+        for device in self.devices:
+            if is_dr:
+                length = device.dr_length()
+                regs.append([length, device.capture_dr() if length is not None else 0, 0])
+            else:
+                regs.append([device.ir_length, device.capture_ir(), 0])
+        # 每项为 [长度(None 为接收端), 寄存器值, 接收端已移入位数]
+        self._shift_regs = regs
+
+    def _shift_chain(self, tdi: int, count: int) -> int:
+        """在 SHIFT 状态移位 count 位，返回 TDO；数据从 devices[-1] 进入，从 devices[0] 移出"""
+        if self._shift_regs is None:
+            return 0
+        data = tdi
+        for reg, device in zip(reversed(self._shift_regs), reversed(self.devices)):
+            length, value, _ = reg
+            if length is None:
+                # 接收端吸收全部输入，向下游输出 0
+                device.sink_dr(data, count)
+                reg[2] += count
+                data = 0
+                continue
+            stream = value | (data << length)
+            data = stream & _mask(count)
+            reg[1] = (stream >> count) & _mask(length)
+        return data
+
+    def _update(self, is_dr: bool):
+        if self._shift_regs is None:
+            return
+        for reg, device in zip(self._shift_regs, self.devices):
+            length, value, _ = reg
+            if is_dr:
+                if length is not None:
+                    device.update_dr(value)
+            else:
+                device.update_ir(value)
+        self._shift_regs = None
+
+    def _clock(self, tms: int, tdi: int = 0) -> int:
+        """一个 TCK 周期：先执行当前状态的动作，再按 TMS 转移"""
+        state = self.state
+        tdo = 0
+        if state == TapState.IRCAPTURE:
+            self._capture(False)
+        elif state == TapState.DRCAPTURE:
+            self._capture(True)
+        elif state in _SHIFT_STATES:
+            tdo = self._shift_chain(tdi, 1)
+        elif state == TapState.IDLE:
+            for device in self.devices:
+                device.idle_clocks(1)
+        self.state = TAP_TRANSITIONS[state][tms]
+        if self.state == TapState.RESET and state != TapState.RESET:
+            self._reset_chain()
+        elif self.state == TapState.IRUPDATE:
+            self._update(False)
+        elif self.state == TapState.DRUPDATE:
+            self._update(True)
+        return tdo
+
+    def _run_clocks(self, tms: int, count: int):
+        """count 个 TMS 恒定的周期；进入自环状态后整段处理"""
+        while count > 0:
+            state = self.state
+            if TAP_TRANSITIONS[state][tms] == state:
+                if state == TapState.IDLE:
+                    for device in self.devices:
+                        device.idle_clocks(count)
+                elif state in _SHIFT_STATES:
+                    self._shift_chain(0, count)
+                    self.bits_shifted += count
+                elif state == TapState.RESET:
+                    self._reset_chain()
+                return
+            self._clock(tms)
+            count -= 1
+
+    # ---- JTAGHardwareInterface ----
+    def set_frequency(self, frequency: float):
+        self.frequency = frequency
+        if self.verbose:
+            print(f"[sim] TCK frequency: {frequency/1e6:.3f} MHz")
+
+    def reset_clock(self):
+        self.frequency = DEFAULT_FREQUENCY
+
+    def set_trst(self, mode: str):
+        self.trst_state = mode
+        if mode == 'ON':
+            self.state = TapState.RESET
+            self._reset_chain()
+
+    def pulse_tms(self, tms: int, count: int):
+        for i in range(count):
+            self._clock((tms >> i) & 1)
+        self._account(2 * count + 1, 0, count)
+
+    def pulse_tck(self, tms: int, count: int, min_time: float = 0.0):
+        self._run_clocks(tms & 1, count)
+        self._account((count + 7) // 8, 0, count, min_time)
+
+    def shift_data(self, tdi_data_in: BitVector, w_length: int, is_dr: bool, is_read: bool) -> BitVector:
+        if w_length <= 0:
+            return BitVector.zeros(0)
+        tdi = tdi_data_in.to_int() if tdi_data_in is not None else 0
+        if self.state in _SHIFT_STATES:
+            # 前 w_length-1 位 TMS=0 停在 SHIFT，最后一位 TMS=1 进入 EXIT1
+            tdo = self._shift_chain(tdi, w_length)
+            self.state = TAP_TRANSITIONS[self.state][1]
+        else:
+            # 不在 SHIFT 状态时与真实硬件一样逐位按 TMS 序列走状态机
+            tdo = 0
+            for i in range(w_length):
+                tdo |= self._clock(1 if i == w_length - 1 else 0, (tdi >> i) & 1) << i
+        self.bits_shifted += w_length
+        byte_length = (w_length + 7) // 8
+        self._account(byte_length, byte_length if is_read else 0, w_length)
+        return BitVector.from_int(tdo, w_length)
+
+    def summary(self) -> str:
+        return (f"{self.tck_cycles} TCK cycles, {self.bits_shifted} bits shifted, {self.calls} calls, "
+                f"{self.bytes_transferred} bytes, simulated time {self.elapsed:.3f} s")
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="svf_sim.py", description="Play an SVF file against a simulated JTAG target")
+    parser.add_argument("svf_file", help="SVF file to play")
+    parser.add_argument("--stream", action="store_true", help="parse and execute concurrently")
+    parser.add_argument("--latency", type=float, default=DEFAULT_CALL_LATENCY,
+                        help=f"modelled latency per hardware call in seconds (default: {DEFAULT_CALL_LATENCY})")
+    parser.add_argument("--bandwidth", type=float, default=DEFAULT_BANDWIDTH,
+                        help=f"modelled USB bandwidth in bytes/s (default: {DEFAULT_BANDWIDTH:.0f})")
+    parser.add_argument("--idcode", type=lambda value: int(value, 16), default=0x0362d093,
+                        help="IDCODE of the simulated FPGA in hex (default: 0362d093)")
+    parser.add_argument("--realtime", action="store_true", help="sleep for the modelled time of every call")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.svf_file):
+        print(f"Error: File '{args.svf_file}' not found")
+        return 1
+
+    hw_iface = SimulatedJTAGInterface([Xilinx7Device(args.idcode)], args.latency, args.bandwidth, args.realtime)
+    controller = JTAGController(verbose=False)
+    controller.set_hardware_interface(hw_iface)
+    player = SVFPlayer(controller)
+    player.set_max_errors(1)
+    player.set_streaming(args.stream)
+
+    start_time = time.perf_counter()
+    success = player.play_svf(args.svf_file)
+    wall_time = time.perf_counter() - start_time
+
+    print(f"{'PASS' if success else 'FAIL'}: {controller.error_count} errors")
+    print(f"Simulator: {hw_iface.summary()}")
+    print(f"Host time: {wall_time:.3f} s")
+    return 0 if success else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
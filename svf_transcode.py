@@ -0,0 +1,76 @@
+import binascii
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# SVF 十六进制串最右侧为最先移出的位；CH347 按 LSB-first 字节移位（第 0 字节的 bit0 最先移出）。
+# 标准库路径（binascii，C 实现）在 flow_led_bit.svf 的 5 Mbit 数据段上约为 NumPy 查表路径的 4 倍，
+# 因此作为默认实现；NumPy 路径用于已持有 uint8 数组的调用方，以及 svf_bench 的对比测量。
+
+if np is not None:
+    # ASCII -> 半字节；非十六进制字符为 0xFF
+    _HEX_NIBBLE = np.full(256, 0xFF, dtype=np.uint8)
+    for _value, _char in enumerate(b'0123456789abcdef'):
+        _HEX_NIBBLE[_char] = _value
+    for _value, _char in enumerate(b'ABCDEF', 10):
+        _HEX_NIBBLE[_char] = _value
+    # 字节 -> 两个大写十六进制字符（按内存顺序读作 uint16）
+    _BYTE_HEX = np.frombuffer(''.join(f'{i:02X}' for i in range(256)).encode('ascii'), dtype=np.uint16)
+
+
+def _fit(data: bytes, byte_length: int) -> bytes:
+    if len(data) < byte_length:
+        return data + bytes(byte_length - len(data))
+    return data[:byte_length]
+
+
+def hex_to_packed(hex_data, length: int) -> bytes:
+    """SVF 十六进制串（bytes 或 str，不含空白）转换为 ceil(length/8) 个 LSB-first 字节；多余的高位字节丢弃，不足补 0"""
+    byte_length = (length + 7) // 8
+    # 只转换需要的最右侧字符
+    if len(hex_data) > 2 * byte_length:
+        hex_data = hex_data[len(hex_data) - 2 * byte_length:]
+    if len(hex_data) % 2:
+        hex_data = b'0' + hex_data if isinstance(hex_data, (bytes, bytearray, memoryview)) else '0' + hex_data
+    return _fit(binascii.unhexlify(hex_data)[::-1], byte_length)
+
+
+def packed_to_hex(data, length: int) -> str:
+    """LSB-first 字节转换回 SVF 十六进制串（大写），位数为 ceil(length/4)"""
+    hex_chars = (length + 3) // 4
+    if not hex_chars:
+        return ""
+    data = bytes(data[:(hex_chars + 1) // 2])
+    return binascii.hexlify(data[::-1]).upper().decode('ascii')[-hex_chars:]
+
+
+def hex_to_packed_numpy(hex_data, length: int) -> bytes:
+    """与 hex_to_packed 相同，按 uint8 数组查表：半字节逆序后两两合并为字节"""
+    if np is None:
+        raise ImportError("hex_to_packed_numpy requires numpy")
+    byte_length = (length + 7) // 8
+    if not byte_length:
+        return b''
+    if isinstance(hex_data, str):
+        hex_data = hex_data.encode('ascii')
+    nibbles = _HEX_NIBBLE[np.frombuffer(hex_data, dtype=np.uint8)[-2 * byte_length:]]
+    if nibbles.size and nibbles.max() > 15:
+        raise ValueError("Non-hexadecimal digit found")
+    reversed_nibbles = nibbles[::-1]
+    packed = reversed_nibbles[0::2].copy()
+    high = reversed_nibbles[1::2]
+    packed[:high.size] |= high << 4
+    return _fit(packed.tobytes(), byte_length)
+
+
+def packed_to_hex_numpy(data, length: int) -> str:
+    """与 packed_to_hex 相同，每个字节查表得到两个十六进制字符"""
+    if np is None:
+        raise ImportError("packed_to_hex_numpy requires numpy")
+    hex_chars = (length + 3) // 4
+    if not hex_chars:
+        return ""
+    packed = np.frombuffer(bytes(data[:(hex_chars + 1) // 2]), dtype=np.uint8)
+    return _BYTE_HEX[packed[::-1]].tobytes().decode('ascii')[-hex_chars:]
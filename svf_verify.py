@@ -0,0 +1,92 @@
+import re
+from typing import List
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# 小于该字节数时直接用大整数运算，NumPy 的调用开销反而更大
+NUMPY_MIN_BYTES = 4096
+
+_NON_ZERO = re.compile(rb'[^\x00]')
+
+
+class TDOVerifyResult:
+    """TDO 校验结果；mismatch_offsets 为最先出错的若干位偏移（0 为最先移出的位）"""
+    __slots__ = ('passed', 'length', 'mismatch_count', 'mismatch_offsets')
+
+    def __init__(self, passed: bool, length: int, mismatch_count: int = 0, mismatch_offsets: List[int] = None):
+        self.passed = passed
+        self.length = length
+        self.mismatch_count = mismatch_count
+        self.mismatch_offsets = mismatch_offsets or []
+
+    def __bool__(self):
+        return self.passed
+
+    def __str__(self):
+        if self.passed:
+            return f"TDO match ({self.length} bits)"
+        offsets = ", ".join(str(offset) for offset in self.mismatch_offsets)
+        more = ", ..." if self.mismatch_count > len(self.mismatch_offsets) else ""
+        return f"{self.mismatch_count} of {self.length} bits mismatched, first at bit offsets [{offsets}{more}]"
+
+
+def _fit(data, byte_length: int) -> bytes:
+    data = bytes(data[:byte_length])
+    if len(data) < byte_length:
+        data += bytes(byte_length - len(data))
+    return data
+
+
+def _offsets_from_bytes(diff: bytes, max_offsets: int) -> List[int]:
+    offsets = []
+    for match in _NON_ZERO.finditer(diff):
+        index = match.start()
+        value = diff[index]
+        while value and len(offsets) < max_offsets:
+            low = value & -value
+            offsets.append(index * 8 + low.bit_length() - 1)
+            value ^= low
+        if len(offsets) >= max_offsets:
+            break
+    return offsets
+
+
+def _verify_int(received, expected, mask, length: int, max_offsets: int) -> TDOVerifyResult:
+    care = int.from_bytes(mask, 'little') & ((1 << length) - 1)
+    diff = (int.from_bytes(received, 'little') ^ int.from_bytes(expected, 'little')) & care
+    if not diff:
+        return TDOVerifyResult(True, length)
+    count = bin(diff).count('1')
+    offsets = _offsets_from_bytes(diff.to_bytes((length + 7) // 8, 'little'), max_offsets) if max_offsets else []
+    return TDOVerifyResult(False, length, count, offsets)
+
+
+def _verify_numpy(received, expected, mask, length: int, max_offsets: int) -> TDOVerifyResult:
+    byte_length = (length + 7) // 8
+    r = np.frombuffer(_fit(received, byte_length), dtype=np.uint8)
+    e = np.frombuffer(_fit(expected, byte_length), dtype=np.uint8)
+    m = np.frombuffer(_fit(mask, byte_length), dtype=np.uint8).copy()
+    if length % 8:
+        m[-1] &= (1 << (length % 8)) - 1
+    diff = (r ^ e) & m
+    bad = np.flatnonzero(diff)
+    if bad.size == 0:
+        return TDOVerifyResult(True, length)
+    count = int(np.unpackbits(diff[bad]).sum())
+    offsets = []
+    if max_offsets:
+        head = diff[bad[:max_offsets]]
+        bits = np.unpackbits(head, bitorder='little').reshape(-1, 8)
+        rows, cols = np.nonzero(bits)
+        offsets = (bad[rows] * 8 + cols)[:max_offsets].tolist()
+    return TDOVerifyResult(False, length, count, offsets)
+
+
+def verify_tdo(received, expected, mask, length: int, max_offsets: int = 8) -> TDOVerifyResult:
+    """按整段缓冲区比较 (received ^ expected) & mask；参数均为 LSB-first 字节（bytes/memoryview）"""
+    if np is not None and (length + 7) // 8 >= NUMPY_MIN_BYTES:
+        return _verify_numpy(received, expected, mask, length, max_offsets)
+    return _verify_int(received, expected, mask, length, max_offsets)